@@ -0,0 +1,62 @@
+import contextlib
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+PACKAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'fastapi_sso')
+
+
+def load_app(db_file: str = None, **settings):
+    """
+    Import the FastAPI app the way uvicorn would, against a scratch database.
+
+    The app reads ``../.env`` relative to the working directory, so we run from inside the
+    package. ``settings`` override config values through the environment.
+    """
+    if db_file is None:
+        db_file = os.path.join(tempfile.mkdtemp(prefix='fastapi-sso-bench-'), 'user.db')
+    os.environ['DB_FILE'] = db_file
+    os.environ.setdefault('JWT_SECRET_KEY', 'benchmark-secret-key-benchmark-secret-key')
+    for name, value in settings.items():
+        os.environ[name] = str(value)
+    os.chdir(PACKAGE_DIR)
+    sys.path.insert(0, os.path.abspath(os.path.join(PACKAGE_DIR, '..')))
+    from fastapi_sso.app import app as app_module
+    return app_module
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the app's progress prints, so a benchmark's stdout is just its JSON."""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def summarize(latencies: List[float], elapsed: float) -> Dict:
+    """Latencies in seconds -> throughput and percentiles in milliseconds."""
+    ordered = sorted(latencies)
+
+    def pct(p: float) -> float:
+        if not ordered:
+            return 0.0
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 3)
+
+    return {
+        'requests': len(ordered),
+        'elapsed_s': round(elapsed, 4),
+        'throughput_rps': round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3) if ordered else 0.0,
+        'p50_ms': pct(0.50),
+        'p90_ms': pct(0.90),
+        'p99_ms': pct(0.99),
+    }
+
+
+def ops_per_second(func, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return round(iterations / (time.perf_counter() - started), 1)
@@ -0,0 +1,101 @@
+"""
+Latency of /refresh, /admin-only and /user-or-admin on a seeded database, cold and warm.
+
+    python -m benchmarks.http_routes --users 100000 --requests 500 --concurrency 20
+
+Requests go through the full app (middleware, dependencies, the async service) in-process
+over httpx's ASGI transport. Cold is the first batch after startup, with the manager and
+verified-token caches empty; warm is a second batch of the same kind. Every /refresh call
+consumes its token, so each one gets its own, minted before the clock starts.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import timedelta
+from typing import Dict, List
+
+import httpx
+
+from fastapi_sso.managers.group_manager_sqlite import GroupManagerSQLite
+
+from .common import load_app, quiet, summarize
+from .seed import ADMIN_EVERY, DEFAULT_SEED_DIR, seeded_copy
+
+ROUTES = ('/refresh', '/admin-only', '/user-or-admin')
+
+
+async def drive(app, calls: List[tuple], concurrency: int) -> Dict:
+    """Send ``(method, path, kwargs)`` calls over ``concurrency`` workers; every one must succeed."""
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+    pending = iter(calls)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        async def worker():
+            for method, path, kwargs in pending:
+                started = time.perf_counter()
+                response = await client.request(method, path, **kwargs)
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200, f'{path}: {response.status_code} {response.text}'
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return summarize(latencies, time.perf_counter() - started)
+
+
+def access_token(app_module, setup: GroupManagerSQLite, user_id: str) -> str:
+    user = setup.get_user_by_id(user_id)
+    return app_module.create_access_token(app_module.access_token_claims(user, setup.get_user_roles(user_id)),
+                                          expires_delta=timedelta(minutes=30))
+
+
+def prepare_calls(app_module, setup: GroupManagerSQLite, route: str, users: int, requests: int,
+                  rng: random.Random) -> List[tuple]:
+    if route == '/refresh':
+        tokens = [setup.create_refresh_token(str(rng.randint(1, users)))['refresh_token'] for _ in range(requests)]
+        return [('POST', route, {'params': {'refresh_token': token}}) for token in tokens]
+    if route == '/admin-only':
+        user_ids = [str(rng.randint(1, max(users // ADMIN_EVERY, 1)) * ADMIN_EVERY) for _ in range(requests)]
+    else:
+        user_ids = [str(rng.randint(1, users)) for _ in range(requests)]
+    # one token per distinct user, like real traffic: the token cache only helps repeat callers
+    tokens = {user_id: access_token(app_module, setup, user_id) for user_id in set(user_ids)}
+    return [('GET', route, {'headers': {'Authorization': f'Bearer {tokens[user_id]}'}}) for user_id in user_ids]
+
+
+async def run(db_file: str, users: int, requests: int, concurrency: int, seed: int = 0) -> Dict:
+    rng = random.Random(seed)
+    results = {}
+    with quiet():
+        app_module = load_app(db_file)
+        # the module reads DB_FILE once at import; a suite run moves it between seeded copies
+        app_module.DB_FILE = db_file
+        for route in ROUTES:
+            # arguments are built through a separate manager, so the app's caches start empty
+            # (and a new one each time: app shutdown closes every pool)
+            setup = GroupManagerSQLite(db_file)
+            cold_calls = prepare_calls(app_module, setup, route, users, requests, rng)
+            warm_calls = prepare_calls(app_module, setup, route, users, requests, rng)
+            setup.close()
+            app_module.token_cache.clear()
+            async with app_module.app.router.lifespan_context(app_module.app):
+                cold = await drive(app_module.app, cold_calls, concurrency)
+                warm = await drive(app_module.app, warm_calls, concurrency)
+            results[route] = {'cold': cold, 'warm': warm}
+    return {'routes': results, 'concurrency': concurrency}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=500, help="requests per route and phase")
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--seed-dir', default=DEFAULT_SEED_DIR)
+    args = parser.parse_args()
+    work_file = os.path.join(tempfile.mkdtemp(prefix='fastapi-sso-bench-'), 'user.db')
+    with quiet():
+        seed_info = seeded_copy(args.users, work_file, args.seed_dir)
+    results = asyncio.run(run(work_file, args.users, args.requests, args.concurrency))
+    print(json.dumps(dict(seed=seed_info, **results), indent=2))
@@ -0,0 +1,136 @@
+"""
+End-to-end login load: concurrent login -> provider -> callback -> /refresh -> protected call flows.
+
+    python -m benchmarks.login_flows --flows 1000 --concurrency 50 --users 500 --latency 0.02
+
+Each flow is a fresh browser session: GET /login/<provider>, follow the redirect to the
+stub provider's authorize endpoint (which approves at once), bring the code back to
+/auth/<provider>, rotate the refresh token it returned, then call /user-or-admin with the
+new access token. The app runs in-process over httpx's ASGI transport and talks to the
+provider over real HTTP, through its own OAuth client stack. Flows pick their user at
+random from ``--users`` identities, so early flows are first logins and later ones mostly
+returning users.
+
+By default the stub runs in a thread of this process; start it on its own
+(``python -m benchmarks.stub_provider``) and pass ``--provider-url`` to keep its CPU out
+of the measurement.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import random
+import time
+from collections import Counter
+from typing import Dict, List
+
+import httpx
+
+from .common import load_app, quiet, summarize
+from .stub_provider import StubServer, app_settings, create_stub_app
+
+STEPS = ('login', 'provider', 'callback', 'refresh', 'protected')
+
+
+class FlowError(Exception):
+    pass
+
+
+def check(response: httpx.Response, step: str, status: int = 200) -> httpx.Response:
+    if response.status_code != status:
+        raise FlowError(f'{step}: {response.status_code}')
+    return response
+
+
+async def login_flow(app_transport, provider_client: httpx.AsyncClient, provider: str, user: int) -> Dict[str, float]:
+    timings = {}
+    # a new client per flow is a new browser: its own session cookie for the OAuth state
+    async with httpx.AsyncClient(transport=app_transport, base_url='http://bench.local') as browser:
+        started = time.perf_counter()
+        response = check(await browser.get(f'/login/{provider}'), 'login', 302)
+        timings['login'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        authorize_url = httpx.URL(response.headers['location']).copy_add_param('login_hint', str(user))
+        response = check(await provider_client.get(authorize_url), 'provider', 302)
+        timings['provider'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        response = check(await browser.get(response.headers['location']), 'callback')
+        tokens = response.json()
+        if 'access_token' not in tokens:
+            raise FlowError(f"callback: {tokens.get('error', tokens)}")
+        timings['callback'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        response = check(await browser.post('/refresh', params={'refresh_token': tokens['refresh_token']}), 'refresh')
+        access_token = response.json()['access_token']
+        timings['refresh'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        check(await browser.get('/user-or-admin', headers={'Authorization': f'Bearer {access_token}'}), 'protected')
+        timings['protected'] = time.perf_counter() - started
+    return timings
+
+
+async def drive(app, provider_url: str, provider: str, flows: int, concurrency: int, users: int, seed: int = 0) -> Dict:
+    app_transport = httpx.ASGITransport(app=app)
+    rng = random.Random(seed)
+    picks = iter([rng.randrange(users) for _ in range(flows)])
+    steps: Dict[str, List[float]] = {step: [] for step in STEPS}
+    totals: List[float] = []
+    errors: Counter = Counter()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=provider_url, limits=limits) as provider_client:
+        async def worker():
+            for user in picks:
+                started = time.perf_counter()
+                try:
+                    timings = await login_flow(app_transport, provider_client, provider, user)
+                except (FlowError, httpx.HTTPError) as e:
+                    errors[str(e) or type(e).__name__] += 1
+                    continue
+                totals.append(time.perf_counter() - started)
+                for step, seconds in timings.items():
+                    steps[step].append(seconds)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return {
+        'flow': summarize(totals, elapsed),
+        'steps': {step: summarize(latencies, elapsed) for step, latencies in steps.items()},
+        'errors': dict(errors),
+    }
+
+
+async def main(flows: int, concurrency: int, users: int, providers: List[str], latency: float,
+               provider_url: str = None) -> Dict:
+    own_stub = provider_url is None
+    with contextlib.ExitStack() as stack:
+        if own_stub:
+            provider_url = stack.enter_context(StubServer(create_stub_app(latency))).url
+        provider_url = provider_url.rstrip('/') + '/'
+        with quiet():
+            app_module = load_app(**app_settings(provider_url))
+        results = {'flows': flows, 'concurrency': concurrency, 'users': users,
+                   'provider_latency_ms': latency * 1000 if own_stub else None, 'providers': {}}
+        with quiet():
+            async with app_module.app.router.lifespan_context(app_module.app):
+                for provider in providers:
+                    results['providers'][provider] = await drive(app_module.app, provider_url, provider,
+                                                                 flows, concurrency, users)
+        return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--flows', type=int, default=500, help="login flows per provider")
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--users', type=int, default=200, help="distinct identities the flows log in as")
+    parser.add_argument('--providers', nargs='+', default=['google', 'github'], choices=['google', 'github'])
+    parser.add_argument('--latency', type=float, default=0.02, help="stub provider delay per response, seconds")
+    parser.add_argument('--provider-url', default=None, help="an already running stub provider")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main(args.flows, args.concurrency, args.users, args.providers, args.latency,
+                                      args.provider_url)), indent=2))
@@ -0,0 +1,186 @@
+"""
+Latency of every public GroupManagerSQLite method on a seeded database, cold and warm.
+
+    python -m benchmarks.manager_methods --users 100000 --ops 200
+
+Cold is the first batch of calls on a freshly built manager, so its caches are empty;
+warm repeats the same calls on that manager for reads, and runs a second batch of new
+calls for writes (which can't be repeated as-is). Arguments are prepared, and anything a
+call depends on (a token to rotate, a group to delete) is created, before the clock starts.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from fastapi_sso.managers.group_manager_sqlite import GroupManagerSQLite, hash_refresh_token
+from fastapi_sso.models.user import UserCreate
+
+from .common import quiet, summarize
+from .seed import DEFAULT_SEED_DIR, group_count, seeded_copy, user_email
+
+# lifecycle only, nothing to measure
+NOT_BENCHMARKED = {'close'}
+
+
+class MethodSpec(NamedTuple):
+    name: str  # "<method>" or "<method>:<variant>"
+    repeatable: bool  # reads: warm repeats the cold calls
+    prepare: Callable[[GroupManagerSQLite], tuple]  # args of one call, built untimed
+    before: Optional[Callable[[GroupManagerSQLite], None]] = None  # untimed, before each call
+
+    @property
+    def method(self) -> str:
+        return self.name.split(':')[0]
+
+
+def method_specs(users: int, seed: int = 0) -> List[MethodSpec]:
+    rng = random.Random(seed)
+    groups = group_count(users)
+    fresh = itertools.count()
+    uid = lambda: str(rng.randint(1, users))
+    gid = lambda: str(rng.randint(1, groups))
+
+    def new_user() -> UserCreate:
+        n = next(fresh)
+        return UserCreate(id=-1, email=f'new{n}@bench.example.com', full_name=f'New {n}', auth_provider='github')
+
+    def token_for(setup: GroupManagerSQLite, user_id: str = None) -> str:
+        return setup.create_refresh_token(user_id or uid())['refresh_token']
+
+    def new_permission(setup: GroupManagerSQLite) -> str:
+        name = f'bench.permission.{next(fresh)}'
+        setup.create_permission(name)
+        return name
+
+    def granted_permission(setup: GroupManagerSQLite) -> tuple:
+        name = new_permission(setup)
+        setup.grant_permission('USER', name)
+        return ('USER', name)
+
+    def new_role(setup: GroupManagerSQLite) -> str:
+        name = f'BENCH_ROLE_{next(fresh)}'
+        setup.create_role(name)
+        return name
+
+    def inherited_role(setup: GroupManagerSQLite) -> tuple:
+        name = new_role(setup)
+        setup.add_role_inheritance('ADMIN', name)
+        return ('ADMIN', name)
+
+    def resync_members(setup: GroupManagerSQLite) -> tuple:
+        group_id = gid()
+        members = [str(user.id) for user in setup.get_group_users(group_id)]
+        return (group_id, members[::2] + [uid() for _ in range(10)])
+
+    def buffer_last_seen(manager: GroupManagerSQLite) -> None:
+        for _ in range(100):
+            manager.last_seen_buffer.record(uid(), '2024-01-01 00:00:00')
+
+    def insert_expired_tokens(manager: GroupManagerSQLite) -> None:
+        with manager.pool.connection() as conn:
+            conn.executemany('INSERT INTO refresh_tokens (token_hash, user_id, expires, family_id) VALUES (?, ?, 0, ?)',
+                             [(hash_refresh_token(f'expired-{next(fresh)}'), uid(), 'expired') for _ in range(500)])
+            conn.commit()
+
+    return [
+        # users
+        MethodSpec('get_user_by_id', True, lambda setup: (uid(),)),
+        MethodSpec('get_users_by_ids', True, lambda setup: ([uid() for _ in range(50)],)),
+        MethodSpec('get_user_by_username', True, lambda setup: (f'user{uid()}',)),
+        MethodSpec('get_user_by_email_and_provider', True, lambda setup: (user_email(int(uid())), 'google')),
+        MethodSpec('get_or_create_user_with_roles:existing', True, lambda setup: (
+            UserCreate(id=-1, email=user_email(int(uid())), full_name='Existing', auth_provider='google'), ['USER'])),
+        MethodSpec('get_or_create_user_with_roles:new', False, lambda setup: (new_user(), ['USER'])),
+        MethodSpec('create_user', False, lambda setup: (new_user(),)),
+        MethodSpec('bulk_create_users', False, lambda setup: ([(new_user(), ['USER'], [f'group-{gid()}']) for _ in range(100)],)),
+        MethodSpec('delete_user', False, lambda setup: (str(setup.create_user(new_user()).id),)),
+        MethodSpec('get_user_last_seen_online', True, lambda setup: (uid(),)),
+        MethodSpec('set_user_last_seen_online', False, lambda setup: (uid(),)),
+        MethodSpec('flush_last_seen', False, lambda setup: (), before=buffer_last_seen),
+        # groups and memberships
+        MethodSpec('get_group_by_id', True, lambda setup: (gid(),)),
+        MethodSpec('get_groups_by_ids', True, lambda setup: ([gid() for _ in range(20)],)),
+        MethodSpec('get_group_by_name', True, lambda setup: (f'group-{gid()}',)),
+        MethodSpec('get_user_groups', True, lambda setup: (uid(),)),
+        MethodSpec('get_group_users', True, lambda setup: (gid(), 100, 0)),
+        MethodSpec('create_group', False, lambda setup: (f'bench-group-{next(fresh)}',)),
+        MethodSpec('delete_group', False, lambda setup: (str(setup.create_group(f'bench-group-{next(fresh)}').group_id),)),
+        MethodSpec('add_user_to_group', False, lambda setup: (uid(), gid())),
+        MethodSpec('remove_user_from_group', False, lambda setup: (uid(), gid())),
+        MethodSpec('add_users_to_group', False, lambda setup: (gid(), [uid() for _ in range(50)])),
+        MethodSpec('remove_users_from_group', False, lambda setup: (gid(), [uid() for _ in range(50)])),
+        MethodSpec('sync_group_members', False, resync_members),
+        # roles and permissions
+        MethodSpec('get_user_roles', True, lambda setup: (uid(),)),
+        MethodSpec('get_roles', True, lambda setup: (uid(),)),
+        MethodSpec('assign_roles', False, lambda setup: (uid(), ['USER', 'ADMIN'])),
+        MethodSpec('create_role', False, lambda setup: (f'BENCH_ROLE_{next(fresh)}',)),
+        MethodSpec('get_role_permission_graph', True, lambda setup: ()),
+        MethodSpec('get_permission_names', True, lambda setup: ()),
+        MethodSpec('create_permission', False, lambda setup: (f'bench.permission.{next(fresh)}',)),
+        MethodSpec('grant_permission', False, lambda setup: ('USER', new_permission(setup))),
+        MethodSpec('revoke_permission', False, granted_permission),
+        MethodSpec('get_role_inheritance', True, lambda setup: ()),
+        MethodSpec('add_role_inheritance', False, lambda setup: ('ADMIN', new_role(setup))),
+        MethodSpec('remove_role_inheritance', False, inherited_role),
+        # refresh tokens
+        MethodSpec('create_refresh_token', False, lambda setup: (uid(),)),
+        MethodSpec('get_refresh_token', True, lambda setup: (token_for(setup),)),
+        MethodSpec('rotate_refresh_token', False, lambda setup: (token_for(setup),)),
+        MethodSpec('delete_refresh_token', False, lambda setup: (token_for(setup),)),
+        MethodSpec('revoke_all_refresh_tokens_for_user', False, lambda setup: (uid(),)),
+        MethodSpec('delete_expired_refresh_tokens', False, lambda setup: (500,), before=insert_expired_tokens),
+        # housekeeping
+        MethodSpec('sync_caches', True, lambda setup: ()),
+        MethodSpec('get_pool_stats', True, lambda setup: ()),
+        MethodSpec('get_cache_stats', True, lambda setup: ()),
+    ]
+
+
+def time_calls(manager: GroupManagerSQLite, spec: MethodSpec, calls: List[tuple]) -> Dict:
+    method = getattr(manager, spec.method)
+    latencies = []
+    for args in calls:
+        if spec.before is not None:
+            spec.before(manager)
+        started = time.perf_counter()
+        method(*args)
+        latencies.append(time.perf_counter() - started)
+    return summarize(latencies, sum(latencies))
+
+
+def run(db_file: str, users: int, ops: int) -> Dict:
+    specs = method_specs(users)
+    covered = {spec.method for spec in specs}
+    public = {name for name in dir(GroupManagerSQLite) if not name.startswith('_') and callable(getattr(GroupManagerSQLite, name))}
+    setup = GroupManagerSQLite(db_file)
+    results: Dict = {'methods': {}, 'not_benchmarked': sorted(public - covered)}
+    # several methods print on every call; keep that out of the report, not out of the timing
+    with quiet():
+        for spec in specs:
+            cold_calls = [spec.prepare(setup) for _ in range(ops)]
+            manager = GroupManagerSQLite(db_file)
+            cold = time_calls(manager, spec, cold_calls)
+            warm_calls = cold_calls if spec.repeatable else [spec.prepare(setup) for _ in range(ops)]
+            warm = time_calls(manager, spec, warm_calls)
+            manager.close()
+            results['methods'][spec.name] = {'cold': cold, 'warm': warm}
+    setup.close()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--ops', type=int, default=200, help="calls per method and phase")
+    parser.add_argument('--seed-dir', default=DEFAULT_SEED_DIR)
+    args = parser.parse_args()
+    work_file = os.path.join(tempfile.mkdtemp(prefix='fastapi-sso-bench-'), 'user.db')
+    with quiet():
+        seed_info = seeded_copy(args.users, work_file, args.seed_dir)
+    print(json.dumps(dict(seed=seed_info, **run(work_file, args.users, args.ops)), indent=2))
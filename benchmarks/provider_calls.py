@@ -0,0 +1,100 @@
+"""
+GitHub login latency against a local stub provider: sequential calls on a fresh client per
+call (before) vs concurrent calls over the shared keep-alive pool (after).
+
+    python -m benchmarks.provider_calls --logins 300 --concurrency 20 --latency 0.02
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+from authlib.integrations.starlette_client import OAuth
+
+from .common import load_app, summarize
+from .stub_provider import StubServer, create_stub_app
+
+
+def register_stub_github(base_url: str) -> OAuth:
+    oauth = OAuth()
+    oauth.register(
+        name='github',
+        client_id='bench',
+        client_secret='bench',
+        access_token_url=base_url + 'login/oauth/access_token',
+        authorize_url=base_url + 'login/oauth/authorize',
+        api_base_url=base_url,
+        client_kwargs={'scope': 'read:user user:email'},
+    )
+    return oauth
+
+
+async def handle_token_sequential(token, client, service):
+    # the GitHub branch of handleToken before the calls were made concurrent
+    resp = await client.get('user', token=token)
+    user_info = resp.json()
+    email_resp = await client.get('user/emails', token=token)
+    email = next(profile['email'] for profile in email_resp.json() if profile['primary'] and profile['verified'])
+    assert user_info['name']
+    return await service.get_user_by_email_and_provider(email, 'github')
+
+
+async def drive(handle, client, service, logins: int, concurrency: int) -> dict:
+    latencies = []
+
+    async def worker(offset: int):
+        for n in range(offset, logins, concurrency):
+            token = {'access_token': f'stub-{n % 1000}', 'token_type': 'bearer'}
+            started = time.perf_counter()
+            user = await handle(token, client, service)
+            latencies.append(time.perf_counter() - started)
+            assert user is not None and not isinstance(user, str), user
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(offset) for offset in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - started)
+
+
+async def main(logins: int, concurrency: int, latency: float) -> dict:
+    app_module = load_app()
+    from fastapi_sso.models.user import UserCreate
+    from fastapi_sso.utils.auth import handleToken
+    from fastapi_sso.utils.http_pool import SharedAsyncTransport, attach_transport, detach_transport
+
+    with StubServer(create_stub_app(latency)) as stub:
+        oauth = register_stub_github(stub.url)
+        client = oauth.create_client('github')
+        async with app_module.app.router.lifespan_context(app_module.app):
+            service = app_module.app.state.group_management_service
+            for n in range(1000):
+                await service.create_user(UserCreate(id=-1, email=f'user{n}@stub.example.com', full_name=f'User {n}', auth_provider='github'))
+
+            results = {'provider_latency_ms': latency * 1000}
+            transport = SharedAsyncTransport()
+            modes = (
+                ('before', handle_token_sequential, False),
+                ('concurrent_calls_only', handleToken, False),
+                ('shared_pool_only', handle_token_sequential, True),
+                ('after', handleToken, True),
+            )
+            for label, handle, pooled in modes:
+                if pooled:
+                    attach_transport(oauth, transport, httpx.Timeout(10.0, connect=5.0))
+                else:
+                    detach_transport(oauth)
+                await drive(handle, client, service, concurrency, concurrency)  # warm up
+                results[label] = await drive(handle, client, service, logins, concurrency)
+            await transport.close()
+    results['p50_speedup'] = round(results['before']['p50_ms'] / results['after']['p50_ms'], 2)
+    results['p99_speedup'] = round(results['before']['p99_ms'] / results['after']['p99_ms'], 2)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--logins', type=int, default=300)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.02, help="stub delay per provider call, seconds")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main(args.logins, args.concurrency, args.latency)), indent=2))
@@ -0,0 +1,78 @@
+"""
+has_role checks against a precomputed role closure vs walking the hierarchy per request.
+
+    python -m benchmarks.role_hierarchy --depth 200 --roles 1000 --roles-per-user 50
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from .common import ops_per_second
+
+
+def naive_has_any_role(graph, roles, required) -> bool:
+    # what a check costs without the closure: walk the inheritance edges every time
+    seen = set()
+    stack = list(roles)
+    while stack:
+        role = stack.pop()
+        if role in required:
+            return True
+        if role not in seen:
+            seen.add(role)
+            stack.extend(graph.get(role, ()))
+    return False
+
+
+def main(depth: int, roles: int, roles_per_user: int, iterations: int) -> dict:
+    from fastapi_sso.services.group_management_service import GroupManagementService
+    from fastapi_sso.services.role_hierarchy import RoleHierarchy
+    from fastapi_sso.services.startup.initialize_database import init_sqlite_database
+
+    db_file = os.path.join(tempfile.mkdtemp(prefix='fastapi-sso-bench-'), 'user.db')
+    init_sqlite_database(db_file)
+    service = GroupManagementService(db_file)
+    names = [f'ROLE_{i}' for i in range(roles)]
+    for name in names:
+        service.create_role(name)
+    # one deep chain ROLE_0 -> ROLE_1 -> ... -> ROLE_depth, the rest inherit random earlier roles
+    for i in range(1, roles):
+        parent = i - 1 if i <= depth else random.randrange(0, i)
+        service.add_role_inheritance(names[parent], names[i])
+
+    hierarchy = RoleHierarchy(service)
+    started = time.perf_counter()
+    hierarchy.load()
+    load_seconds = time.perf_counter() - started
+    graph = service.get_role_inheritance()
+
+    user_roles = random.sample(names[depth + 1:] or names, min(roles_per_user, roles)) + [names[0]]
+    required_deep = frozenset([names[depth]])  # only reachable through the whole chain
+    required_missing = frozenset(['NOT_A_ROLE'])  # worst case: nothing matches
+
+    results = {
+        'depth': depth,
+        'roles': roles,
+        'roles_per_user': len(user_roles),
+        'closure_load_ms': round(load_seconds * 1000, 3),
+        'closure_size': sum(len(implied) for implied in hierarchy.closure.values()),
+    }
+    for label, required in (('deep_match', required_deep), ('no_match', required_missing)):
+        assert hierarchy.has_any_role(user_roles, required) == naive_has_any_role(graph, user_roles, required)
+        results[f'{label}_closure_checks_per_s'] = ops_per_second(lambda: hierarchy.has_any_role(user_roles, required), iterations)
+        results[f'{label}_naive_checks_per_s'] = ops_per_second(lambda: naive_has_any_role(graph, user_roles, required), max(iterations // 100, 10))
+    service.close()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--depth', type=int, default=200)
+    parser.add_argument('--roles', type=int, default=1000)
+    parser.add_argument('--roles-per-user', type=int, default=50)
+    parser.add_argument('--iterations', type=int, default=200000)
+    args = parser.parse_args()
+    print(json.dumps(main(args.depth, args.roles, args.roles_per_user, args.iterations), indent=2))
@@ -0,0 +1,106 @@
+"""
+Seed a SQLite database with N users, N/100 groups and GROUPS_PER_USER memberships per user.
+
+    python -m benchmarks.seed --users 100000 --db /tmp/fastapi-sso-seeds/users-100000.db
+
+Every user has the USER role and one in ADMIN_EVERY is also ADMIN. Row values are
+deterministic (``user<i>@bench.example.com``, group ``group-<j>``) so benchmark runs
+against the same size are comparable. Seeds are kept and reused: building the 1M-user
+database takes a while.
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import time
+
+from fastapi_sso.services.startup.initialize_database import (ensure_file_exists, init_sqlite_database,
+                                                              insert_role_inheritance, insert_roles)
+
+from .common import quiet
+
+USERS_PER_GROUP = 100
+GROUPS_PER_USER = 3
+ADMIN_EVERY = 100
+BATCH_SIZE = 50000
+DEFAULT_SEED_DIR = os.path.join('/tmp', 'fastapi-sso-seeds')
+
+
+def user_email(i: int) -> str:
+    return f'user{i}@bench.example.com'
+
+
+def group_count(users: int) -> int:
+    return max(users // USERS_PER_GROUP, 1)
+
+
+def seed(db_file: str, users: int) -> dict:
+    """Build a fresh seeded database at ``db_file``; returns its row counts and build time."""
+    started = time.perf_counter()
+    for path in (db_file, db_file + '-wal', db_file + '-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+    ensure_file_exists(db_file)
+    init_sqlite_database(db_file)
+    role_ids = insert_roles(db_file)
+    insert_role_inheritance(db_file)
+    groups = group_count(users)
+
+    with sqlite3.connect(db_file) as conn:
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=OFF')
+        conn.executemany('INSERT INTO groups (group_id, group_name) VALUES (?, ?)',
+                         ((j, f'group-{j}') for j in range(1, groups + 1)))
+        for start in range(1, users + 1, BATCH_SIZE):
+            ids = range(start, min(start + BATCH_SIZE, users + 1))
+            conn.executemany(
+                'INSERT INTO users (id, username, email, full_name, auth_provider) VALUES (?, ?, ?, ?, ?)',
+                ((i, f'user{i}', user_email(i), f'User {i}', 'google') for i in ids))
+            conn.executemany('INSERT INTO user_roles (user_id, role_id) VALUES (?, ?)',
+                             ((i, role_ids['USER']) for i in ids))
+            conn.executemany('INSERT INTO user_roles (user_id, role_id) VALUES (?, ?)',
+                             ((i, role_ids['ADMIN']) for i in ids if i % ADMIN_EVERY == 0))
+            # user i is in groups i, i + groups/3, i + 2*groups/3 (mod groups): every group gets ~the same size
+            conn.executemany('INSERT OR IGNORE INTO user_groups (user_id, group_id) VALUES (?, ?)',
+                             ((i, (i + k * groups // GROUPS_PER_USER) % groups + 1) for i in ids for k in range(GROUPS_PER_USER)))
+            conn.commit()
+        conn.execute('ANALYZE')
+        conn.commit()
+        memberships = conn.execute('SELECT COUNT(*) FROM user_groups').fetchone()[0]
+    return {'users': users, 'groups': groups, 'memberships': memberships,
+            'seed_s': round(time.perf_counter() - started, 2)}
+
+
+def seeded_copy(users: int, work_file: str, seed_dir: str = DEFAULT_SEED_DIR) -> dict:
+    """
+    Copy the seed for ``users`` to ``work_file``, building the seed first if needed, so
+    benchmarks that write never change the seed itself.
+    """
+    os.makedirs(seed_dir, exist_ok=True)
+    seed_file = os.path.join(seed_dir, f'users-{users}.db')
+    info_file = seed_file + '.json'
+    if os.path.exists(seed_file) and os.path.exists(info_file):
+        with open(info_file) as f:
+            info = dict(json.load(f), reused=True)
+    else:
+        info = seed(seed_file, users)
+        with sqlite3.connect(seed_file) as conn:
+            # fold the WAL back in so the seed is one self-contained file
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        with open(info_file, 'w') as f:
+            json.dump(info, f)
+    shutil.copyfile(seed_file, work_file)
+    return info
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--db', default=None, help="defaults to <seed dir>/users-<N>.db")
+    args = parser.parse_args()
+    db_file = args.db or os.path.join(DEFAULT_SEED_DIR, f'users-{args.users}.db')
+    os.makedirs(os.path.dirname(os.path.abspath(db_file)), exist_ok=True)
+    with quiet():
+        info = seed(db_file, args.users)
+    print(json.dumps(info, indent=2))
@@ -0,0 +1,194 @@
+"""
+Local stand-in for Google-style OIDC and GitHub-style OAuth providers, served by uvicorn on 127.0.0.1.
+
+    python -m benchmarks.stub_provider --port 9000 --latency 0.02
+
+then start the app against it::
+
+    GOOGLE_SERVER_METADATA_URL=http://127.0.0.1:9000/.well-known/openid-configuration \\
+    GITHUB_AUTHORIZE_URL=http://127.0.0.1:9000/login/oauth/authorize \\
+    GITHUB_ACCESS_TOKEN_URL=http://127.0.0.1:9000/login/oauth/access_token \\
+    GITHUB_API_BASE_URL=http://127.0.0.1:9000/ uvicorn fastapi_sso.app.app:app
+
+Authorization is granted without a consent page: the authorize endpoints redirect straight
+back with a code. The ``login_hint`` parameter picks the user (``n`` is
+``user<n>@stub.example.com``), default 0. Codes are exchanged for the bearer token
+``stub-<n>``, plus an RS256 ID token signed by a key generated at startup when ``openid``
+was in the scope. Every response is delayed by ``latency`` seconds to stand in for the
+provider round trip.
+"""
+import argparse
+import asyncio
+import itertools
+import secrets
+import socket
+import threading
+import time
+from urllib.parse import urlencode
+
+import uvicorn
+from authlib.jose import JsonWebKey, JsonWebToken
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, RedirectResponse
+from starlette.routing import Route
+
+ID_TOKEN_TTL_SECONDS = 3600
+
+
+def _user_number(request: Request) -> str:
+    token = request.headers.get('authorization', '').removeprefix('Bearer ')
+    return token.removeprefix('stub-') or '0'
+
+
+def _issuer(request: Request) -> str:
+    # the port is only known once the server is up, so the issuer comes from the request
+    return str(request.base_url).rstrip('/')
+
+
+def create_stub_app(latency: float = 0.02) -> Starlette:
+    signing_key = JsonWebKey.generate_key('RSA', 2048, is_private=True, options={'kid': 'stub-1'})
+    jwt = JsonWebToken(['RS256'])
+    # code -> the authorize request it was issued for; each code is good for one exchange
+    grants = {}
+    code_numbers = itertools.count()
+
+    async def discovery(request: Request):
+        await asyncio.sleep(latency)
+        issuer = _issuer(request)
+        return JSONResponse({
+            'issuer': issuer,
+            'authorization_endpoint': issuer + '/authorize',
+            'token_endpoint': issuer + '/token',
+            'userinfo_endpoint': issuer + '/userinfo',
+            'jwks_uri': issuer + '/jwks',
+            'response_types_supported': ['code'],
+            'subject_types_supported': ['public'],
+            'id_token_signing_alg_values_supported': ['RS256'],
+            'scopes_supported': ['openid', 'email', 'profile'],
+        })
+
+    async def jwks(request: Request):
+        await asyncio.sleep(latency)
+        return JSONResponse({'keys': [dict(signing_key.as_dict(is_private=False), alg='RS256', use='sig')]})
+
+    async def authorize(request: Request):
+        await asyncio.sleep(latency)
+        params = request.query_params
+        code = f'code-{next(code_numbers)}-{secrets.token_urlsafe(8)}'
+        grants[code] = {
+            'user': params.get('login_hint', '0'),
+            'client_id': params.get('client_id'),
+            'nonce': params.get('nonce'),
+            'scope': params.get('scope', '').split(),
+        }
+        query = {'code': code}
+        if 'state' in params:
+            query['state'] = params['state']
+        return RedirectResponse(f"{params['redirect_uri']}?{urlencode(query)}", status_code=302)
+
+    async def token(request: Request):
+        await asyncio.sleep(latency)
+        form = await request.form()
+        grant = grants.pop(form.get('code'), None)
+        if grant is None:
+            return JSONResponse({'error': 'invalid_grant'}, status_code=400)
+        n = grant['user']
+        body = {'access_token': f'stub-{n}', 'token_type': 'Bearer', 'expires_in': 3600,
+                'scope': ' '.join(grant['scope'])}
+        if 'openid' in grant['scope']:
+            now = int(time.time())
+            claims = {
+                'iss': _issuer(request),
+                'sub': f'stub-{n}',
+                'aud': grant['client_id'],
+                'iat': now,
+                'exp': now + ID_TOKEN_TTL_SECONDS,
+                'email': f'user{n}@stub.example.com',
+                'email_verified': True,
+                'name': f'User {n}',
+            }
+            if grant['nonce']:
+                claims['nonce'] = grant['nonce']
+            header = {'alg': 'RS256', 'kid': signing_key.kid}
+            body['id_token'] = jwt.encode(header, claims, signing_key, check=False).decode()
+        return JSONResponse(body)
+
+    async def userinfo(request: Request):
+        await asyncio.sleep(latency)
+        n = _user_number(request)
+        return JSONResponse({'sub': f'stub-{n}', 'email': f'user{n}@stub.example.com', 'email_verified': True,
+                             'name': f'User {n}'})
+
+    async def user(request: Request):
+        await asyncio.sleep(latency)
+        n = _user_number(request)
+        return JSONResponse({'id': int(n) if n.isdigit() else 0, 'login': f'user{n}', 'name': f'User {n}'})
+
+    async def user_emails(request: Request):
+        await asyncio.sleep(latency)
+        n = _user_number(request)
+        return JSONResponse([
+            {'email': f'user{n}@other.example.com', 'primary': False, 'verified': True},
+            {'email': f'user{n}@stub.example.com', 'primary': True, 'verified': True},
+        ])
+
+    return Starlette(routes=[
+        # OIDC (Google-style)
+        Route('/.well-known/openid-configuration', discovery),
+        Route('/jwks', jwks),
+        Route('/authorize', authorize),
+        Route('/token', token, methods=['POST']),
+        Route('/userinfo', userinfo),
+        # GitHub-style; the API lives at the root, like api.github.com
+        Route('/login/oauth/authorize', authorize),
+        Route('/login/oauth/access_token', token, methods=['POST']),
+        Route('/user', user),
+        Route('/user/emails', user_emails),
+    ])
+
+
+def app_settings(base_url: str) -> dict:
+    """The app's config values that point both OAuth registrations at a stub served at ``base_url``."""
+    return {
+        'GOOGLE_SERVER_METADATA_URL': base_url + '.well-known/openid-configuration',
+        'GITHUB_AUTHORIZE_URL': base_url + 'login/oauth/authorize',
+        'GITHUB_ACCESS_TOKEN_URL': base_url + 'login/oauth/access_token',
+        'GITHUB_API_BASE_URL': base_url,
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class StubServer:
+    """Run ``app`` with uvicorn in a background thread; use as a context manager."""
+
+    def __init__(self, app, port: int = None) -> None:
+        self.port = port or _free_port()
+        self.url = f'http://127.0.0.1:{self.port}/'
+        self.server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=self.port, log_level='warning',
+                                                    backlog=4096, limit_concurrency=10000))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self) -> 'StubServer':
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.should_exit = True
+        self.thread.join()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--latency', type=float, default=0.02, help="seconds added to every response")
+    args = parser.parse_args()
+    uvicorn.run(create_stub_app(args.latency), host='127.0.0.1', port=args.port, log_level='warning',
+                backlog=4096, limit_concurrency=10000)
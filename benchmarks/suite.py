@@ -0,0 +1,101 @@
+"""
+Full benchmark suite: manager methods and HTTP routes at each database size, as one JSON report.
+
+    python -m benchmarks.suite --sizes 10000 100000 1000000 --output bench-1.4.json
+    python -m benchmarks.suite --sizes 10000 --baseline bench-1.3.json --output bench-1.4.json
+
+Each size runs on its own copy of the seed, so sizes don't see each other's writes. With
+``--baseline``, every p50 gets a ``p50_vs_baseline`` ratio (above 1 is slower) against the
+same entry in the earlier report, which is how releases are compared.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import tempfile
+import time
+from typing import Dict, Optional
+
+from . import http_routes, manager_methods
+from .common import quiet
+from .seed import DEFAULT_SEED_DIR, seeded_copy
+
+DEFAULT_SIZES = (10000, 100000, 1000000)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def meta() -> Dict:
+    return {
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'started_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+    }
+
+
+def run_size(users: int, ops: int, requests: int, concurrency: int, seed_dir: str) -> Dict:
+    work_dir = tempfile.mkdtemp(prefix='fastapi-sso-bench-')
+    manager_file = os.path.join(work_dir, 'manager.db')
+    http_file = os.path.join(work_dir, 'http.db')
+    started = time.perf_counter()
+    with quiet():
+        seed_info = seeded_copy(users, manager_file, seed_dir)
+        seeded_copy(users, http_file, seed_dir)
+    return {
+        'seed': seed_info,
+        'manager': manager_methods.run(manager_file, users, ops),
+        'http': asyncio.run(http_routes.run(http_file, users, requests, concurrency)),
+        'elapsed_s': round(time.perf_counter() - started, 1),
+    }
+
+
+def compare(report, baseline) -> None:
+    """Add ``p50_vs_baseline`` next to every p50 that also exists in ``baseline``."""
+    if not isinstance(report, dict) or not isinstance(baseline, dict):
+        return
+    if 'p50_ms' in report and baseline.get('p50_ms'):
+        report['p50_vs_baseline'] = round(report['p50_ms'] / baseline['p50_ms'], 2)
+    for key, value in report.items():
+        compare(value, baseline.get(key))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    parser.add_argument('--ops', type=int, default=200, help="manager calls per method and phase")
+    parser.add_argument('--requests', type=int, default=500, help="HTTP requests per route and phase")
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--seed-dir', default=DEFAULT_SEED_DIR)
+    parser.add_argument('--baseline', default=None, help="earlier report to compare against")
+    parser.add_argument('--output', default=None, help="write the report here as well as to stdout")
+    args = parser.parse_args()
+
+    report = {
+        'meta': meta(),
+        'settings': {'ops': args.ops, 'requests': args.requests, 'concurrency': args.concurrency},
+        'sizes': {},
+    }
+    for users in args.sizes:
+        report['sizes'][str(users)] = run_size(users, args.ops, args.requests, args.concurrency, args.seed_dir)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report['meta']['baseline_commit'] = baseline.get('meta', {}).get('git_commit')
+        compare(report['sizes'], baseline.get('sizes', {}))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
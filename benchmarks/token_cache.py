@@ -0,0 +1,71 @@
+"""
+Protected-endpoint throughput with the verified-token cache on and off.
+
+    python -m benchmarks.token_cache --requests 5000 --concurrency 50
+
+The cache does not buy measurable end-to-end throughput. ``speedup`` has ranged from
+0.95 to 1.4 between runs on the same machine, which is run-to-run noise. Decoding alone
+goes from about 20-30k to 240-500k ops/s, but that step is some 40us of a request that
+spends over a millisecond in the HTTP stack, middleware and dependencies. The cache is
+kept because it costs little and takes HMAC work off hot tokens under a refresh burst,
+not because it raises request throughput.
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import timedelta
+
+import httpx
+
+from .common import load_app, ops_per_second, summarize
+
+
+async def drive(app_module, token: str, requests: int, concurrency: int) -> dict:
+    transport = httpx.ASGITransport(app=app_module.app)
+    headers = {'Authorization': f'Bearer {token}'}
+    latencies = []
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        async def worker(n: int):
+            for _ in range(n):
+                started = time.perf_counter()
+                response = await client.get('/user-or-admin', headers=headers)
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200, response.text
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(requests // concurrency) for _ in range(concurrency)))
+        return summarize(latencies, time.perf_counter() - started)
+
+
+async def main(requests: int, concurrency: int) -> dict:
+    app_module = load_app()
+    from fastapi_sso.models.user import UserCreate
+    async with app_module.app.router.lifespan_context(app_module.app):
+        service = app_module.app.state.group_management_service
+        user = await service.create_user(UserCreate(id=-1, email='bench@example.com', full_name='Bench', auth_provider='google'))
+        await service.assign_roles(user.id, ['USER'])
+        token = app_module.create_access_token(
+            app_module.access_token_claims(user, await service.get_user_roles(user.id)),
+            expires_delta=timedelta(minutes=30),
+        )
+        results = {}
+        for label, enabled in (('cache_off', False), ('cache_on', True)):
+            app_module.token_cache.enabled = enabled
+            app_module.token_cache.clear()
+            await drive(app_module, token, concurrency, concurrency)  # warm up
+            results[label] = await drive(app_module, token, requests, concurrency)
+        results['speedup'] = round(results['cache_on']['throughput_rps'] / results['cache_off']['throughput_rps'], 2)
+        # the decode step on its own, without the HTTP stack around it
+        app_module.token_cache.enabled = False
+        results['decode_ops_per_s_cache_off'] = ops_per_second(lambda: app_module.decode_access_token(token), requests)
+        app_module.token_cache.enabled = True
+        results['decode_ops_per_s_cache_on'] = ops_per_second(lambda: app_module.decode_access_token(token), requests)
+        return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main(args.requests, args.concurrency)), indent=2))
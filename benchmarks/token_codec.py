@@ -0,0 +1,72 @@
+"""
+Access-token signs and verifies per second for each TokenCodec algorithm, next to the python-jose HS256 path it replaced.
+
+    python -m benchmarks.token_codec --iterations 5000
+
+python-jose is no longer a dependency; the comparison only runs where it is installed.
+"""
+import argparse
+import json
+from datetime import datetime, timedelta, timezone
+
+from fastapi_sso.utils.token_codec import SUPPORTED_ALGORITHMS, SigningKey, TokenCodec
+
+from .common import ops_per_second
+
+CLAIMS = {
+    'sub': '42',
+    'name': 'Bench User',
+    'email': 'bench@example.com',
+    'auth_provider': 'google',
+    'roles': ['USER'],
+    'is_verified': False,
+}
+
+
+def claims() -> dict:
+    return dict(CLAIMS, exp=datetime.now(timezone.utc) + timedelta(minutes=30))
+
+
+def bench_codec(alg: str, iterations: int) -> dict:
+    codec = TokenCodec([SigningKey.generate(f'bench-{alg}', alg)])
+    token = codec.encode(claims())
+    assert codec.decode(token)['sub'] == '42'
+    return {
+        'sign_ops_per_s': ops_per_second(lambda: codec.encode(claims()), iterations),
+        'verify_ops_per_s': ops_per_second(lambda: codec.decode(token), iterations),
+        'token_bytes': len(token),
+    }
+
+
+def bench_python_jose(iterations: int) -> dict:
+    from jose import jwt
+    secret = 'benchmark-secret-key-benchmark-secret-key'
+    token = jwt.encode(claims(), secret, algorithm='HS256')
+    return {
+        'sign_ops_per_s': ops_per_second(lambda: jwt.encode(claims(), secret, algorithm='HS256'), iterations),
+        'verify_ops_per_s': ops_per_second(lambda: jwt.decode(token, secret, algorithms=['HS256']), iterations),
+        'token_bytes': len(token),
+    }
+
+
+def main(iterations: int) -> dict:
+    results = {'iterations': iterations}
+    try:
+        results['python_jose_HS256'] = bench_python_jose(iterations)
+    except ImportError:
+        pass
+    for alg in SUPPORTED_ALGORITHMS:
+        results[alg] = bench_codec(alg, iterations)
+    # after a rotation, tokens signed by the retired key are found by kid, not by trying each key
+    old, new = SigningKey.generate('old', 'ES256'), SigningKey.generate('new', 'EdDSA')
+    old_token = TokenCodec([old]).encode(claims())
+    ring = TokenCodec([new, old], active_kid='new')
+    results['rotated_ring_verify_old_ES256_ops_per_s'] = ops_per_second(lambda: ring.decode(old_token), iterations)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=5000)
+    args = parser.parse_args()
+    print(json.dumps(main(args.iterations), indent=2))
@@ -2,6 +2,7 @@ from typing import List
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.security import OAuth2AuthorizationCodeBearer
 from fastapi.concurrency import asynccontextmanager
+from fastapi.responses import JSONResponse, Response
 from starlette.config import Config
 from starlette.requests import Request
 from authlib.integrations.starlette_client import OAuth,OAuthError
@@ -9,26 +10,97 @@ from authlib.integrations.starlette_client import OAuth,OAuthError
 from starlette.middleware.sessions import SessionMiddleware
 from fastapi_sso.models.user import CurrentUser
 from fastapi_sso.models.token import Token
+from fastapi_sso.managers.connection_pool import close_all_pools, pool_stats
+from fastapi_sso.managers.group_manager_sharded import shard_files
 from fastapi_sso.services.group_management_service import GroupManagementService
-from fastapi_sso.services.startup.initialize_database import ensure_file_exists, init_sqlite_database, insert_roles
+from fastapi_sso.services.async_group_management_service import AsyncGroupManagementService
+from fastapi_sso.services.permission_resolver import PermissionResolver
+from fastapi_sso.services.role_hierarchy import RoleHierarchy
+from fastapi_sso.services.refresh_token_sweeper import sweep_expired_refresh_tokens
+from fastapi_sso.services.last_seen_flusher import flush_last_seen_periodically
+from fastapi_sso.services.cache_syncer import sync_caches_periodically
+from fastapi_sso.services.startup.initialize_database import ensure_file_exists, init_sharded_database, init_sqlite_database, insert_roles, insert_role_inheritance
 from fastapi_sso.utils.auth import handleToken
+from fastapi_sso.utils.http_pool import SharedAsyncTransport, attach_transport, detach_transport
+from fastapi_sso.utils.metrics import CONTENT_TYPE, REGISTRY, MetricsMiddleware, cache_families, pool_families
+from fastapi_sso.utils.oidc_cache import CachingOAuth, prefetch_provider_metadata, refresh_provider_metadata_periodically
+from fastapi_sso.utils.token_cache import RevokedSubjects, VerifiedTokenCache
+from fastapi_sso.utils.token_codec import DEFAULT_KEY_ID, InvalidTokenError, SigningKey, TokenCodec, load_key_ring
 from datetime import datetime, timedelta,timezone
-from jose import JWTError, jwt
 import secrets
+import asyncio
+import httpx
 
 # Configuration
 config = Config('../.env')
 print(config.file_values) 
-JWT_SECRET_KEY = config.get('JWT_SECRET_KEY')
-JWT_ALGORITHM = "HS256"
+JWT_SECRET_KEY = config.get('JWT_SECRET_KEY', default=None)
+# Access tokens are signed by the active key of JWT_KEY_RING_FILE (HS256, ES256 or EdDSA, see
+# fastapi_sso.utils.token_codec.load_key_ring); without a ring, by JWT_SECRET_KEY with HS256
+JWT_KEY_RING_FILE = config.get('JWT_KEY_RING_FILE', default=None)
+# How long downstream services may cache /.well-known/jwks.json
+JWKS_MAX_AGE_SECONDS = config.get('JWKS_MAX_AGE_SECONDS', cast=int, default=300)
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 30
+# 'sqlite' (default), 'memory' for ephemeral nodes and test/benchmark runs that shouldn't touch the disk,
+# or 'sharded' to spread user data over SHARD_COUNT files next to DB_FILE (which becomes the catalog)
+STORAGE_BACKEND = config.get('STORAGE_BACKEND', default='sqlite')
+DB_FILE = config.get('DB_FILE', default='../db/user.db')
+SHARD_COUNT = config.get('SHARD_COUNT', cast=int, default=4)
+DB_WORKERS = config.get('DB_WORKERS', cast=int, default=5)
+CACHE_MAX_ENTRIES = config.get('CACHE_MAX_ENTRIES', cast=int, default=10000)
+CACHE_TTL_SECONDS = config.get('CACHE_TTL_SECONDS', cast=float, default=300.0)
+CACHE_NEGATIVE_TTL_SECONDS = config.get('CACHE_NEGATIVE_TTL_SECONDS', cast=float, default=30.0)
+# How often each worker checks the db for invalidations written by other workers
+CACHE_SYNC_INTERVAL_SECONDS = config.get('CACHE_SYNC_INTERVAL_SECONDS', cast=float, default=0.5)
+# Verified access tokens kept in memory until they expire; 0 disables the cache
+TOKEN_CACHE_MAX_ENTRIES = config.get('TOKEN_CACHE_MAX_ENTRIES', cast=int, default=50000)
+REFRESH_TOKEN_SWEEP_INTERVAL_SECONDS = config.get('REFRESH_TOKEN_SWEEP_INTERVAL_SECONDS', cast=float, default=300.0)
+REFRESH_TOKEN_SWEEP_BATCH_SIZE = config.get('REFRESH_TOKEN_SWEEP_BATCH_SIZE', cast=int, default=500)
+# last_seen updates are buffered and written every LAST_SEEN_FLUSH_INTERVAL_SECONDS,
+# or as soon as LAST_SEEN_MAX_PENDING users are waiting
+LAST_SEEN_FLUSH_INTERVAL_SECONDS = config.get('LAST_SEEN_FLUSH_INTERVAL_SECONDS', cast=float, default=5.0)
+LAST_SEEN_MAX_PENDING = config.get('LAST_SEEN_MAX_PENDING', cast=int, default=1000)
+
+# One keep-alive connection pool shared by every OAuth client
+HTTP_MAX_CONNECTIONS = config.get('HTTP_MAX_CONNECTIONS', cast=int, default=100)
+HTTP_MAX_KEEPALIVE_CONNECTIONS = config.get('HTTP_MAX_KEEPALIVE_CONNECTIONS', cast=int, default=20)
+HTTP_KEEPALIVE_EXPIRY_SECONDS = config.get('HTTP_KEEPALIVE_EXPIRY_SECONDS', cast=float, default=30.0)
+HTTP_CONNECT_TIMEOUT_SECONDS = config.get('HTTP_CONNECT_TIMEOUT_SECONDS', cast=float, default=5.0)
+HTTP_READ_TIMEOUT_SECONDS = config.get('HTTP_READ_TIMEOUT_SECONDS', cast=float, default=10.0)
+HTTP_RETRIES = config.get('HTTP_RETRIES', cast=int, default=0)
+# Provider discovery documents and signing keys are fetched at startup and refreshed in the background;
+# an ID token with an unknown kid refetches the keys at most once per OIDC_JWKS_MIN_REFETCH_SECONDS
+OIDC_METADATA_TTL_SECONDS = config.get('OIDC_METADATA_TTL_SECONDS', cast=float, default=3600.0)
+OIDC_REFRESH_INTERVAL_SECONDS = config.get('OIDC_REFRESH_INTERVAL_SECONDS', cast=float, default=900.0)
+OIDC_JWKS_MIN_REFETCH_SECONDS = config.get('OIDC_JWKS_MIN_REFETCH_SECONDS', cast=float, default=60.0)
+# Provider endpoints; point them at a local stand-in (python -m benchmarks.stub_provider) to run
+# full logins without Google or GitHub
+GOOGLE_SERVER_METADATA_URL = config.get('GOOGLE_SERVER_METADATA_URL', default='https://accounts.google.com/.well-known/openid-configuration')
+GITHUB_AUTHORIZE_URL = config.get('GITHUB_AUTHORIZE_URL', default='https://github.com/login/oauth/authorize')
+GITHUB_ACCESS_TOKEN_URL = config.get('GITHUB_ACCESS_TOKEN_URL', default='https://github.com/login/oauth/access_token')
+GITHUB_API_BASE_URL = config.get('GITHUB_API_BASE_URL', default='https://api.github.com/')
+# Prometheus metrics on /metrics: per-query, per-route and OAuth call latency, cache hit rates
+METRICS_ENABLED = config.get('METRICS_ENABLED', cast=bool, default=True)
+
+REGISTRY.enabled = METRICS_ENABLED
+
+token_cache = VerifiedTokenCache(max_entries=TOKEN_CACHE_MAX_ENTRIES)
+# users whose refresh tokens or roles were revoked; their older access tokens are refused
+revoked_subjects = RevokedSubjects(max_token_age=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+if JWT_KEY_RING_FILE:
+    token_codec = load_key_ring(JWT_KEY_RING_FILE)
+elif JWT_SECRET_KEY:
+    token_codec = TokenCodec([SigningKey.from_secret(DEFAULT_KEY_ID, JWT_SECRET_KEY)])
+else:
+    raise ValueError("Set JWT_SECRET_KEY or JWT_KEY_RING_FILE to sign access tokens")
 
 # oauth = OAuth(config)
-oauth = OAuth()
+oauth = CachingOAuth(metadata_ttl=OIDC_METADATA_TTL_SECONDS, jwks_min_refetch=OIDC_JWKS_MIN_REFETCH_SECONDS)
 oauth.register(
     name='google',
-    server_metadata_url='https://accounts.google.com/.well-known/openid-configuration',
+    server_metadata_url=GOOGLE_SERVER_METADATA_URL,
     client_id=config.file_values['GOOGLE_CLIENT_ID'],
     client_secret=config.file_values['GOOGLE_CLIENT_SECRET'],
     client_kwargs={
@@ -41,11 +113,11 @@ oauth.register(
     name='github',
     client_id=config.file_values['GITHUB_CLIENT_ID'],
     client_secret=config.file_values['GITHUB_CLIENT_SECRET'],
-    access_token_url='https://github.com/login/oauth/access_token',
+    access_token_url=GITHUB_ACCESS_TOKEN_URL,
     access_token_params=None,
-    authorize_url='https://github.com/login/oauth/authorize',
+    authorize_url=GITHUB_AUTHORIZE_URL,
     authorize_params=None,
-    api_base_url='https://api.github.com/',
+    api_base_url=GITHUB_API_BASE_URL,
     client_kwargs={'scope': 'read:user user:email'},
 )
 # OAuth2 scheme for JWT
@@ -55,75 +127,218 @@ oauth2_scheme = OAuth2AuthorizationCodeBearer(
 )
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    ensure_file_exists("../db/user.db")
-    init_sqlite_database("../db/user.db")
-    insert_roles("../db/user.db")
+    if STORAGE_BACKEND == 'sqlite':
+        ensure_file_exists(DB_FILE)
+        init_sqlite_database(DB_FILE)
+        # role id <-> name table, kept in memory by the manager to resolve roles without JOINs
+        role_ids = insert_roles(DB_FILE)
+        insert_role_inheritance(DB_FILE)
+    elif STORAGE_BACKEND == 'sharded':
+        init_sharded_database(DB_FILE, shard_files(DB_FILE, SHARD_COUNT))
+    if STORAGE_BACKEND == 'sharded':
+        backend_options = {'shard_count': SHARD_COUNT}
+    elif STORAGE_BACKEND == 'sqlite':
+        backend_options = {'role_ids': role_ids or None}
+    else:
+        backend_options = {}
+    # One service (and so one set of manager caches) for the lifetime of the app
+    # Blocking sqlite calls run on a bounded worker pool, never on the event loop
+    service = GroupManagementService(
+        DB_FILE,
+        backend=STORAGE_BACKEND,
+        cache_max_entries=CACHE_MAX_ENTRIES,
+        cache_ttl=CACHE_TTL_SECONDS,
+        cache_negative_ttl=CACHE_NEGATIVE_TTL_SECONDS,
+        cache_sync_interval=CACHE_SYNC_INTERVAL_SECONDS,
+        last_seen_max_pending=LAST_SEEN_MAX_PENDING,
+        **backend_options,
+    )
+    app.state.group_management_service = AsyncGroupManagementService(service, max_workers=DB_WORKERS)
+    # role -> permission graph compiled once, checked without DB access per request
+    app.state.permission_resolver = PermissionResolver(service)
+    app.state.permission_resolver.load()
+    app.state.role_hierarchy = RoleHierarchy(service)
+    app.state.role_hierarchy.load()
+    # access tokens issued before their user's roles or refresh tokens were revoked are refused
+    # from then on, in every worker; the cache just drops its copies
+    service.group_manager.invalidation_listeners.append(revoked_subjects.on_invalidation)
+    service.group_manager.invalidation_listeners.append(token_cache.on_invalidation)
+    sweeper = asyncio.create_task(sweep_expired_refresh_tokens(
+        app.state.group_management_service,
+        interval=REFRESH_TOKEN_SWEEP_INTERVAL_SECONDS,
+        batch_size=REFRESH_TOKEN_SWEEP_BATCH_SIZE,
+    ))
+    http_transport = SharedAsyncTransport(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        retries=HTTP_RETRIES,
+    )
+    attach_transport(oauth, http_transport, httpx.Timeout(HTTP_READ_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS))
+    # so the first login doesn't pay for discovery and JWKS round trips
+    await prefetch_provider_metadata(oauth)
+    metadata_refresher = asyncio.create_task(refresh_provider_metadata_periodically(
+        oauth,
+        interval=OIDC_REFRESH_INTERVAL_SECONDS,
+    ))
+    flusher = asyncio.create_task(flush_last_seen_periodically(
+        app.state.group_management_service,
+        interval=LAST_SEEN_FLUSH_INTERVAL_SECONDS,
+    ))
+    # other workers' changes are applied on the DB pool, so checks only read memory
+    cache_syncer = asyncio.create_task(sync_caches_periodically(
+        app.state.group_management_service,
+        interval=CACHE_SYNC_INTERVAL_SECONDS,
+    ))
     yield
+    for task in (sweeper, flusher, metadata_refresher, cache_syncer):
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    # drain presence updates recorded since the last flush
+    await app.state.group_management_service.flush_last_seen()
+    detach_transport(oauth)
+    await http_transport.close()
+    app.state.group_management_service.close()
+    close_all_pools()
 
 
 app = FastAPI(lifespan=lifespan)
 app.add_middleware(SessionMiddleware, secret_key="add any string...")
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
 
-def get_group_management_service():
-    return GroupManagementService()
+def get_group_management_service(request: Request) -> AsyncGroupManagementService:
+    return request.app.state.group_management_service
 
 # Function to create JWT token // this will need to be move to auth.py
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
+    now = datetime.now(timezone.utc)
     if expires_delta:
-        expire = datetime.now(timezone.utc) + expires_delta
+        expire = now + expires_delta
     else:
-        expire = datetime.now(timezone.utc)+ timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
+        expire = now + timedelta(minutes=15)
+    # iat is what revoked_subjects compares against
+    to_encode.update({"exp": expire, "iat": int(now.timestamp())})
+    encoded_jwt = token_codec.encode(to_encode)
     return encoded_jwt
 
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme),group_mgt_serv : GroupManagementService = Depends(get_group_management_service)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    print(token)
-    try:
-        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
-        print(payload)
-        id: str = payload.get("sub")
-        if id is None:
+def access_token_claims(user, roles) -> dict:
+    # Everything CurrentUser needs without a DB lookup goes into the token
+    return {
+        "sub": str(user.id),
+        "name": user.full_name,
+        "email": user.email,
+        "auth_provider": user.auth_provider,
+        "roles": list(roles),
+        "is_verified": user.is_verified,
+    }
+
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+def decode_access_token(token: str) -> dict:
+    payload = token_cache.get(token)
+    if payload is None:
+        try:
+            payload = token_codec.decode(token)
+        except InvalidTokenError:
             raise credentials_exception
-        user_info =  group_mgt_serv.get_user_by_id(id)
-        roles: List[str] = payload.get("roles", [])
-        current_user = CurrentUser(
-            id=user_info.id,
-            username=user_info.username,
-            background_information=user_info.background_information,
-            email=user_info.email,
-            full_name=user_info.full_name,
-            profile_picture_url=user_info.profile_picture_url,
-            status=user_info.status,
-            is_active=user_info.is_active,
-            is_verified=user_info.is_verified,
-            phone_number=user_info.phone_number,
-            auth_provider=user_info.auth_provider,
-            roles=roles
-        )
-    except JWTError:
+        if payload.get("sub") is None:
+            raise credentials_exception
+        token_cache.put(token, payload)
+    # a revoked token still has a valid signature, so this runs on cache hits too
+    if revoked_subjects.is_revoked(payload):
         raise credentials_exception
+    return payload
+
+async def get_current_user(token: str = Depends(oauth2_scheme),group_mgt_serv : AsyncGroupManagementService = Depends(get_group_management_service)):
+    """Current user hydrated from the DB; use when the endpoint needs profile fields or a live account check."""
+    payload = decode_access_token(token)
+    user_info = await group_mgt_serv.get_user_by_id(payload["sub"])
+    if user_info is None:
+        raise credentials_exception
+    group_mgt_serv.touch_last_seen(payload["sub"])
+    roles: List[str] = payload.get("roles", [])
+    current_user = CurrentUser(
+        id=user_info.id,
+        username=user_info.username,
+        background_information=user_info.background_information,
+        email=user_info.email,
+        full_name=user_info.full_name,
+        profile_picture_url=user_info.profile_picture_url,
+        status=user_info.status,
+        is_active=user_info.is_active,
+        is_verified=user_info.is_verified,
+        phone_number=user_info.phone_number,
+        auth_provider=user_info.auth_provider,
+        roles=roles
+    )
     return current_user
 
-def has_role(required_roles: List[str]):
-    async def role_checker(current_user: CurrentUser = Depends(get_current_user)):
-        for role in required_roles:
-            if role in current_user.roles:
-                return current_user
+async def get_current_user_from_claims(token: str = Depends(oauth2_scheme),group_mgt_serv : AsyncGroupManagementService = Depends(get_group_management_service)):
+    """Current user built from the signed token claims only, no DB round trip."""
+    payload = decode_access_token(token)
+    if payload.get("email") is None:
+        # token minted before the profile claims were added
+        return await get_current_user(token, group_mgt_serv)
+    group_mgt_serv.touch_last_seen(payload["sub"])
+    return CurrentUser(
+        id=payload["sub"],
+        email=payload["email"],
+        full_name=payload.get("name") or "",
+        is_verified=payload.get("is_verified", False),
+        auth_provider=payload.get("auth_provider"),
+        roles=payload.get("roles", []),
+    )
+
+def has_role(required_roles: List[str], hydrate: bool = False):
+    """
+    Dependency that requires any of ``required_roles``, directly or through role inheritance.
+    Role checks only need the token claims; pass ``hydrate=True`` when the endpoint
+    also needs the full profile from the DB.
+
+    With ``hydrate=False`` nothing but the token is consulted: the roles are the ones it was
+    issued with. Deleting a user, revoking their refresh tokens or granting roles refuses their
+    earlier tokens (see ``revoked_subjects``), but any other change made straight in the DB is
+    only seen at the token's ``exp``, up to ACCESS_TOKEN_EXPIRE_MINUTES later. ``hydrate=True``
+    also requires the account to still exist.
+    """
+    user_dependency = get_current_user if hydrate else get_current_user_from_claims
+    required = frozenset(required_roles)
+    async def role_checker(request: Request, current_user: CurrentUser = Depends(user_dependency)):
+        hierarchy: RoleHierarchy = request.app.state.role_hierarchy
+        if hierarchy.has_any_role(current_user.roles, required):
+            return current_user
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
     return role_checker
 
+def has_permission(permission: str, hydrate: bool = False):
+    """Dependency that requires ``permission`` through any of the token's roles; see ``has_role`` about ``hydrate``."""
+    user_dependency = get_current_user if hydrate else get_current_user_from_claims
+    async def permission_checker(request: Request, current_user: CurrentUser = Depends(user_dependency)):
+        resolver: PermissionResolver = request.app.state.permission_resolver
+        # inherited roles bring their permissions with them
+        roles = request.app.state.role_hierarchy.expand(current_user.roles)
+        if resolver.has_permission(roles, permission):
+            return current_user
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    return permission_checker
+
 
 @app.get('/')
 async def homepage(request: Request):
@@ -132,13 +347,27 @@ async def homepage(request: Request):
         return {'message': f'Hello, {user["name"]}!'}
     return {'message': 'Hello, anonymous user!'}
 
+@app.get('/.well-known/jwks.json')
+async def jwks():
+    # public keys of the token key ring, so other services can verify our access tokens themselves
+    return JSONResponse(token_codec.jwks(), headers={'Cache-Control': f'public, max-age={JWKS_MAX_AGE_SECONDS}'})
+
+@app.get('/metrics')
+async def metrics(group_mgt_serv : AsyncGroupManagementService = Depends(get_group_management_service)):
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    # cache and pool counters are kept anyway; they are read here rather than counted twice
+    cache_stats = await group_mgt_serv.get_cache_stats() + [token_cache.stats()]
+    body = REGISTRY.render(cache_families(cache_stats) + pool_families(pool_stats()))
+    return Response(body, media_type=CONTENT_TYPE)
+
 @app.get('/login/{provider}')
 async def login(provider: str, request: Request):
     redirect_uri = request.url_for('auth', provider=provider)
     return await oauth.create_client(provider).authorize_redirect(request, redirect_uri)
 
 @app.get('/auth/{provider}')
-async def auth(provider: str, request: Request,group_mgt_serv : GroupManagementService = Depends(get_group_management_service)):
+async def auth(provider: str, request: Request,group_mgt_serv : AsyncGroupManagementService = Depends(get_group_management_service)):
     client = oauth.create_client(provider)
     try:
         token = await client.authorize_access_token(request)
@@ -147,55 +376,48 @@ async def auth(provider: str, request: Request,group_mgt_serv : GroupManagementS
     # Normalize user 
     user = await handleToken(token,client, group_mgt_serv)
     # Get User roles
-    roles =  list(group_mgt_serv.get_user_roles(user.id))
+    roles = list(await group_mgt_serv.get_user_roles(user.id))
     # create jwt
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": str(user.id), "name": user.full_name, "roles":roles, "is_verified":user.is_verified},
+        data=access_token_claims(user, roles),
         expires_delta=access_token_expires
     )
     
-    refresh_token_info = group_mgt_serv.create_refresh_token(user.id)
+    refresh_token_info = await group_mgt_serv.create_refresh_token(user.id)
     
     return Token(access_token=access_token, token_type="bearer", refresh_token=refresh_token_info['refresh_token'])
 
 @app.post("/refresh")
-async def refresh_token(refresh_token: str,group_mgt_serv : GroupManagementService = Depends(get_group_management_service)):
-   
-    # Fetch the refresh token 
-    token_data = group_mgt_serv.get_refresh_token(refresh_token)
-    # check in db
-    if not token_data:
+async def refresh_token(refresh_token: str,group_mgt_serv : AsyncGroupManagementService = Depends(get_group_management_service)):
+    # Consume the old token and issue the next one atomically
+    rotation = await group_mgt_serv.rotate_refresh_token(refresh_token)
+    if rotation['status'] == 'invalid':
         raise HTTPException(status_code=400, detail="Invalid refresh token")
     # Will require re login
-    if datetime.now(timezone.utc) > token_data["expires"]:
-        group_mgt_serv.delete_refresh_token(refresh_token)
+    if rotation['status'] == 'expired':
         raise HTTPException(status_code=400, detail="Refresh token expired")
-    # Extract user_id from refresh token
-    user_id = token_data["user_id"]
-    user = group_mgt_serv.get_user_by_id(user_id)
-    if not user:
+    if rotation['status'] == 'reused':
+        raise HTTPException(status_code=400, detail="Refresh token already used, please log in again")
+    if rotation['status'] == 'user_not_found':
         raise HTTPException(status_code=400, detail="User not found")
-    roles = group_mgt_serv.get_user_roles(user.id)
+    user = rotation['user']
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": str(user.id), "name": user.full_name, "roles":roles, "is_verified":user.is_verified},
+        data=access_token_claims(user, rotation['roles']),
         expires_delta=access_token_expires
     )
     
-    new_refresh_token = group_mgt_serv.create_refresh_token(user.id)
-    group_mgt_serv.delete_refresh_token(refresh_token)
-    
-    return {"access_token": access_token, "token_type": "bearer", "refresh_token": new_refresh_token}
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": rotation['refresh_token']}
 
 
 
 @app.get("/admin-only")
-async def admin_only(current_user: CurrentUser = Depends(has_role(["ADMIN"]))):
+async def admin_only(current_user: CurrentUser = Depends(has_role(["ADMIN"], hydrate=True))):  # admin access is checked against the live account
     return {"message": "Welcome, admin!"}
 
 @app.get("/user-or-admin")
-async def user_or_admin(current_user: CurrentUser = Depends(has_role(["USER", "ADMIN"]))):
+async def user_or_admin(current_user: CurrentUser = Depends(has_role(["USER"]))):  # ADMIN inherits USER
     return {"message": f"Welcome, {current_user.email}!"}
 
 
@@ -0,0 +1,138 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_TTL_SECONDS = 300.0
+DEFAULT_NEGATIVE_TTL_SECONDS = 30.0
+
+
+class _Negative:
+    """Marker stored in place of a value to remember that the key does not exist."""
+
+    def __repr__(self) -> str:
+        return 'NEGATIVE'
+
+
+NEGATIVE = _Negative()
+
+
+class LRUCache:
+    """
+    Size-bounded LRU cache with per-entry TTL.
+
+    ``get`` refreshes recency, expired entries are dropped lazily when they are read, and
+    the least recently used entry is evicted once ``max_entries`` is reached. Storing
+    ``NEGATIVE`` records a known-missing key for ``negative_ttl`` seconds.
+    A ``ttl`` of ``None`` (or 0) disables expiry.
+    """
+
+    def __init__(self, name: str, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 ttl: Optional[float] = DEFAULT_TTL_SECONDS,
+                 negative_ttl: Optional[float] = DEFAULT_NEGATIVE_TTL_SECONDS) -> None:
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl or None
+        self.negative_ttl = negative_ttl or None
+        self._data: OrderedDict[Hashable, Tuple[Any, Optional[float]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            if value is NEGATIVE:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Read an entry without touching recency or the hit/miss counters."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (entry[1] is not None and entry[1] <= time.monotonic()):
+                return default
+            return entry[0]
+
+    def _store(self, key: Hashable, value: Any, ttl: Optional[float]) -> None:
+        # caller holds self._lock
+        if ttl is None:
+            ttl = self.negative_ttl if value is NEGATIVE else self.ttl
+        self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def setdefault(self, key: Hashable, value: Any) -> Any:
+        """Insert ``value`` unless a live entry exists; return whichever is cached."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+                return entry[0]
+            self._store(key, value, None)
+            return value
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def evict_if(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """Drop every entry for which ``predicate(key, value)`` is true; returns how many."""
+        with self._lock:
+            keys = [key for key, (value, _) in self._data.items() if predicate(key, value)]
+            for key in keys:
+                del self._data[key]
+        return len(keys)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and (entry[1] is None or entry[1] > time.monotonic())
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def values(self) -> List[Any]:
+        """Snapshot of cached values, skipping negative entries."""
+        with self._lock:
+            return [value for value, _ in self._data.values() if value is not NEGATIVE]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            'name': self.name,
+            'size': len(self._data),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'hit_rate': round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+        }
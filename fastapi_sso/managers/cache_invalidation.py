@@ -0,0 +1,102 @@
+import sqlite3
+import threading
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+DEFAULT_POLL_INTERVAL_SECONDS = 0.5
+DEFAULT_RETENTION_SECONDS = 3600.0
+
+
+class InvalidationLog:
+    """
+    Broker-less cache invalidation between processes sharing one SQLite file.
+
+    Writers append a row to ``cache_invalidations`` inside the same transaction as the
+    mutation (``record``). Readers call ``poll``: it runs ``PRAGMA data_version`` on a
+    private connection, which only changes after another connection committed, and only
+    then reads the new log rows. Rows written by this process are skipped because the
+    local caches were already updated in place.
+    """
+
+    def __init__(self, db_file: str, poll_interval: float = DEFAULT_POLL_INTERVAL_SECONDS,
+                 retention: float = DEFAULT_RETENTION_SECONDS) -> None:
+        self.db_file = db_file
+        self.origin = uuid.uuid4().hex
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._data_version: Optional[int] = None
+        self._last_id = 0
+        self._next_poll = 0.0
+        self._next_prune = time.monotonic() + retention
+        self.polls = 0
+        self.applied = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            self._data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+            row = self._conn.execute('SELECT MAX(id) FROM cache_invalidations').fetchone()
+            self._last_id = row[0] or 0
+        return self._conn
+
+    def record(self, conn: sqlite3.Connection, kind: str, entity_id, related_id=None) -> None:
+        # must run on the connection (and inside the transaction) that made the change
+        conn.execute(
+            'INSERT INTO cache_invalidations (origin, kind, entity_id, related_id) VALUES (?, ?, ?, ?)',
+            (self.origin, kind, str(entity_id), None if related_id is None else str(related_id)),
+        )
+
+    def record_many(self, conn: sqlite3.Connection, events: List[Tuple[str, object, object]]) -> None:
+        conn.executemany(
+            'INSERT INTO cache_invalidations (origin, kind, entity_id, related_id) VALUES (?, ?, ?, ?)',
+            [(self.origin, kind, str(entity_id), None if related_id is None else str(related_id))
+             for kind, entity_id, related_id in events],
+        )
+
+    def poll(self, force: bool = False) -> List[Tuple[str, str, Optional[str]]]:
+        """Return ``(kind, entity_id, related_id)`` events from other processes since the last poll."""
+        now = time.monotonic()
+        if not force and now < self._next_poll:
+            return []
+        if not self._lock.acquire(blocking=False):
+            # another thread is already polling
+            return []
+        try:
+            self._next_poll = now + self.poll_interval
+            conn = self._connect()
+            self.polls += 1
+            data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+            if data_version == self._data_version:
+                return []
+            self._data_version = data_version
+            rows = conn.execute(
+                'SELECT id, origin, kind, entity_id, related_id FROM cache_invalidations WHERE id > ? ORDER BY id',
+                (self._last_id,),
+            ).fetchall()
+            if rows:
+                self._last_id = rows[-1][0]
+            if now >= self._next_prune:
+                self._prune(conn)
+            events = [(kind, entity_id, related_id) for _, origin, kind, entity_id, related_id in rows if origin != self.origin]
+            self.applied += len(events)
+            return events
+        except sqlite3.Error as e:
+            print(f"An error occurred while polling cache invalidations: {e}")
+            return []
+        finally:
+            self._lock.release()
+
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        self._next_prune = time.monotonic() + self.retention
+        conn.execute("DELETE FROM cache_invalidations WHERE created_at < datetime('now', ?)",
+                     (f'-{int(self.retention)} seconds',))
+        conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
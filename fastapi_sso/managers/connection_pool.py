@@ -0,0 +1,180 @@
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+from fastapi_sso.managers.query_metrics import InstrumentedConnection
+from fastapi_sso.utils.metrics import REGISTRY
+
+DEFAULT_POOL_SIZE = 5
+DEFAULT_CHECKOUT_TIMEOUT = 10.0
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 268435456,  # 256 MiB
+    'cache_size': -16000,  # negative means KiB, so ~16 MiB per connection
+    'temp_store': 'MEMORY',
+}
+
+
+class PoolTimeoutError(sqlite3.OperationalError):
+    """Raised when no connection could be checked out before the timeout."""
+
+
+class ConnectionStats:
+    def __init__(self, conn_id: int) -> None:
+        self.conn_id = conn_id
+        self.created_at = time.time()
+        self.checkouts = 0
+        self.busy_seconds = 0.0
+        self.errors = 0
+        self.in_use = False
+
+    def as_dict(self) -> Dict:
+        return {
+            'conn_id': self.conn_id,
+            'created_at': self.created_at,
+            'checkouts': self.checkouts,
+            'busy_seconds': round(self.busy_seconds, 6),
+            'errors': self.errors,
+            'in_use': self.in_use,
+        }
+
+
+class SQLiteConnectionPool:
+    """
+    Bounded checkout pool of long-lived SQLite connections.
+
+    Connections are opened lazily up to ``max_size``, configured with the pragmas once
+    when they are created, and handed out with ``connection()``. Each connection keeps
+    its own prepared statement cache (``cached_statements``) so repeated queries are not
+    re-parsed. While metrics are enabled, connections time every statement (see
+    ``query_metrics``).
+    """
+
+    def __init__(self, db_file: str, max_size: int = DEFAULT_POOL_SIZE,
+                 timeout: float = DEFAULT_CHECKOUT_TIMEOUT,
+                 pragmas: Optional[Dict] = None, cached_statements: int = 256,
+                 row_factory: Optional[Callable] = None) -> None:
+        self.db_file = db_file
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pragmas = DEFAULT_PRAGMAS if pragmas is None else pragmas
+        self.cached_statements = cached_statements
+        self.row_factory = row_factory
+
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._all: List[sqlite3.Connection] = []
+        self._stats: Dict[int, ConnectionStats] = {}
+        self._closed = False
+        self.waits = 0
+        self.timeouts = 0
+
+    def _open(self) -> sqlite3.Connection:
+        factory = InstrumentedConnection if REGISTRY.enabled else sqlite3.Connection
+        conn = sqlite3.connect(self.db_file, timeout=self.timeout, check_same_thread=False,
+                               cached_statements=self.cached_statements, factory=factory)
+        if self.row_factory is not None:
+            conn.row_factory = self.row_factory
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _checkout(self) -> sqlite3.Connection:
+        if self._closed:
+            raise sqlite3.ProgrammingError(f"Connection pool for {self.db_file} is closed")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._all) < self.max_size:
+                conn = self._open()
+                self._all.append(conn)
+                self._stats[id(conn)] = ConnectionStats(len(self._all))
+                return conn
+            self.waits += 1
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            self.timeouts += 1
+            raise PoolTimeoutError(f"Timed out after {self.timeout}s waiting for a connection to {self.db_file}")
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Check out a connection for the duration of the block.
+
+        Mirrors ``with sqlite3.connect(...) as conn``: the transaction is committed when the
+        block exits normally and rolled back if it raises.
+        """
+        conn = self._checkout()
+        stats = self._stats[id(conn)]
+        stats.checkouts += 1
+        stats.in_use = True
+        started = time.perf_counter()
+        try:
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+        except BaseException:
+            stats.errors += 1
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            stats.busy_seconds += time.perf_counter() - started
+            stats.in_use = False
+            if self._closed:
+                conn.close()
+            else:
+                self._idle.put(conn)
+
+    def stats(self) -> Dict:
+        return {
+            'db_file': self.db_file,
+            'max_size': self.max_size,
+            'open': len(self._all),
+            'idle': self._idle.qsize(),
+            'waits': self.waits,
+            'timeouts': self.timeouts,
+            'connections': [s.as_dict() for s in self._stats.values()],
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+
+
+_pools: Dict[str, SQLiteConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_file: str, **kwargs) -> SQLiteConnectionPool:
+    """Return the process-wide pool for ``db_file``, creating it on first use."""
+    with _pools_lock:
+        pool = _pools.get(db_file)
+        if pool is None or pool._closed:
+            pool = SQLiteConnectionPool(db_file, **kwargs)
+            _pools[db_file] = pool
+        return pool
+
+
+def close_all_pools() -> None:
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+def pool_stats() -> List[Dict]:
+    with _pools_lock:
+        return [pool.stats() for pool in _pools.values()]
@@ -0,0 +1,77 @@
+from typing import Callable, Dict, List, Optional, Protocol, Set, Tuple
+
+from fastapi_sso.models.group import GroupBase
+from fastapi_sso.models.user import UserBase, UserCreate
+
+
+class GroupManager(Protocol):
+    """
+    Storage backend used by GroupManagementService.
+
+    Implementations, picked by the STORAGE_BACKEND setting: GroupManagerSQLite ('sqlite',
+    the default), GroupManagerSharded ('sharded', users split across several SQLite files)
+    and GroupManagerMemory ('memory').
+
+    Anything that keeps derived state in memory (permission resolver, role hierarchy)
+    subscribes to ``invalidation_listeners`` to hear about changes made outside this
+    process; per-user revocations (``'roles'``, ``'tokens'``) are announced to local
+    listeners as well, with the revocation time (``time.time()``) as ``related_id``.
+    """
+
+    invalidation_listeners: List[Callable[[str, str, Optional[str]], None]]
+
+    # housekeeping
+    def get_pool_stats(self) -> Dict: ...
+    def get_cache_stats(self) -> List[Dict]: ...
+    def sync_caches(self, force: bool = False) -> int: ...
+    def close(self) -> None: ...
+
+    # users and groups
+    def create_group(self, group_name: str) -> GroupBase: ...
+    def create_user(self, user: UserCreate) -> UserBase: ...
+    def get_or_create_user_with_roles(self, user: UserCreate, roles: List[str]) -> Dict: ...
+    def bulk_create_users(self, entries: List[Tuple[UserCreate, List[str], List[str]]]) -> List[Optional[str]]: ...
+    def get_group_by_id(self, group_id: str) -> Optional[GroupBase]: ...
+    def get_user_by_id(self, user_id: str) -> Optional[UserBase]: ...
+    def get_users_by_ids(self, user_ids: List[str]) -> List[UserBase]: ...
+    def get_groups_by_ids(self, group_ids: List[str]) -> List[GroupBase]: ...
+    def get_group_by_name(self, group_name: str) -> Optional[GroupBase]: ...
+    def get_user_by_username(self, username: str) -> Optional[UserBase]: ...
+    def get_user_by_email_and_provider(self, email: str, auth_provider: str) -> Optional[UserBase]: ...
+    def delete_group(self, group_id: str) -> bool: ...
+    def delete_user(self, user_id: str) -> bool: ...
+    def get_user_last_seen_online(self, user_id: str): ...
+    def set_user_last_seen_online(self, user_id: str) -> bool: ...
+    def record_last_seen(self, user_id: str) -> bool: ...  # in memory only, safe on the event loop
+    def flush_last_seen(self) -> int: ...
+
+    # memberships
+    def add_user_to_group(self, user_id: str, group_id: str) -> bool: ...
+    def remove_user_from_group(self, user_id: str, group_id: str) -> bool: ...
+    def add_users_to_group(self, group_id: str, user_ids: List[str]) -> List[str]: ...
+    def remove_users_from_group(self, group_id: str, user_ids: List[str]) -> List[str]: ...
+    def sync_group_members(self, group_id: str, user_ids: List[str]) -> Dict[str, List[str]]: ...
+    def get_user_groups(self, user_id: str, limit: Optional[int] = None, offset: int = 0) -> List[GroupBase]: ...
+    def get_group_users(self, group_id: str, limit: Optional[int] = None, offset: int = 0) -> List[UserBase]: ...
+
+    # roles and permissions
+    def create_role(self, name: str, description: Optional[str] = None) -> bool: ...
+    def assign_roles(self, user_id, roles): ...
+    def get_user_roles(self, user_id: str) -> Set[str]: ...
+    def get_roles(self, user_id) -> List[str]: ...
+    def get_role_permission_graph(self, role: Optional[str] = None) -> Dict[str, Set[str]]: ...
+    def get_permission_names(self) -> List[str]: ...
+    def create_permission(self, name: str, description: Optional[str] = None) -> bool: ...
+    def grant_permission(self, role: str, permission: str) -> bool: ...
+    def revoke_permission(self, role: str, permission: str) -> bool: ...
+    def get_role_inheritance(self) -> Dict[str, Set[str]]: ...
+    def add_role_inheritance(self, role: str, inherited_role: str) -> bool: ...
+    def remove_role_inheritance(self, role: str, inherited_role: str) -> bool: ...
+
+    # refresh tokens
+    def create_refresh_token(self, user_id: str) -> Dict: ...
+    def get_refresh_token(self, token: str) -> Dict: ...
+    def delete_refresh_token(self, token: str): ...
+    def rotate_refresh_token(self, token: str) -> Dict: ...
+    def revoke_all_refresh_tokens_for_user(self, user_id: str) -> int: ...
+    def delete_expired_refresh_tokens(self, batch_size: int = 500) -> int: ...
@@ -0,0 +1,460 @@
+from datetime import datetime, timedelta, timezone
+import secrets
+import sqlite3
+import threading
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from fastapi_sso.models.group import GroupBase
+from fastapi_sso.models.user import UserBase, UserCreate
+from .group_manager_sqlite import REFRESH_TOKEN_EXPIRE_DAYS, _key, hash_refresh_token, revocation_time
+
+# what insert_roles / insert_role_inheritance put into a fresh SQLite database
+DEFAULT_ROLES = {'USER': 'A person who uses the app', 'ADMIN': 'Has all permissions'}
+DEFAULT_ROLE_INHERITANCE = [('ADMIN', 'USER')]
+
+
+def _utc_timestamp() -> str:
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class GroupManagerMemory:
+    """
+    GroupManager that keeps everything in process memory; nothing touches the disk.
+
+    Meant for ephemeral edge nodes and for fast test and benchmark runs. Every table of
+    the SQLite schema is a dict keyed by its primary key, with a set or dict index for
+    each lookup the SQLite backend does through an index. All state is guarded by one
+    lock, so each method is atomic like a SQLite transaction. Return values match
+    GroupManagerSQLite, including the sqlite3.IntegrityError raised for duplicates, so
+    callers don't need to know which backend they talk to.
+    """
+
+    def __init__(self, db_file: Optional[str] = None, **options):
+        # db_file and the cache / pool options of the SQLite backend are accepted and ignored
+        self._lock = threading.RLock()
+        self.users: Dict[str, UserBase] = {}  # user_id -> user Model obj
+        self.users_by_identity: Dict[Tuple[str, Optional[str]], str] = {}  # (email, auth_provider) -> user_id
+        self.users_by_username: Dict[str, str] = {}
+        self.groups: Dict[str, GroupBase] = {}  # group_id -> group Model obj
+        self.groups_by_name: Dict[str, str] = {}
+        self.user_groups: Dict[str, Set[str]] = {}  # user_id -> group_ids
+        self.group_users: Dict[str, Set[str]] = {}  # group_id -> user_ids
+        self.last_seen: Dict[str, str] = {}  # user_id -> UTC timestamp, formatted like SQLite's CURRENT_TIMESTAMP
+        self.roles: Dict[str, Optional[str]] = dict(DEFAULT_ROLES)  # role name -> description
+        self.user_roles: Dict[str, Set[str]] = {}  # user_id -> role names
+        self.role_inheritance: Dict[str, Set[str]] = {role: set() for role in self.roles}
+        for role, inherited_role in DEFAULT_ROLE_INHERITANCE:
+            self.role_inheritance[role].add(inherited_role)
+        self.permissions: Dict[str, Optional[str]] = {}  # permission name -> description, in creation order
+        self.role_permissions: Dict[str, Set[str]] = {role: set() for role in self.roles}
+        self.refresh_tokens: Dict[str, Dict] = {}  # token_hash -> {'user_id', 'expires', 'family_id', 'used'}
+        self.refresh_tokens_by_user: Dict[str, Set[str]] = {}
+        self.refresh_tokens_by_family: Dict[str, Set[str]] = {}
+        self._next_user_id = 1
+        self._next_group_id = 1
+        # Nothing is shared with other processes, so listeners only hear the per-user
+        # revocations ('roles', 'tokens') that GroupManagerSQLite also announces locally
+        self.invalidation_listeners: List[Callable[[str, str, Optional[str]], None]] = []
+
+    def get_pool_stats(self) -> Dict:
+        return {}
+
+    def get_cache_stats(self) -> List[Dict]:
+        return []
+
+    def sync_caches(self, force: bool = False) -> int:
+        return 0
+
+    def close(self) -> None:
+        pass
+
+    def create_group(self, group_name: str) -> GroupBase:
+        with self._lock:
+            if group_name in self.groups_by_name:
+                raise sqlite3.IntegrityError('UNIQUE constraint failed: groups.group_name')
+            group = GroupBase(group_id=self._next_group_id, group_name=group_name)
+            self._next_group_id += 1
+            self.groups[_key(group.group_id)] = group
+            self.groups_by_name[group_name] = _key(group.group_id)
+            self.group_users[_key(group.group_id)] = set()
+            return group
+
+    def _insert_user(self, user: UserCreate) -> UserBase:
+        # caller holds self._lock
+        if (user.email, user.auth_provider) in self.users_by_identity:
+            raise sqlite3.IntegrityError('UNIQUE constraint failed: users.email, users.auth_provider')
+        if user.username is not None and user.username in self.users_by_username:
+            raise sqlite3.IntegrityError('UNIQUE constraint failed: users.username')
+        user_id = _key(self._next_user_id)
+        self._next_user_id += 1
+        stored = UserBase(
+            id=int(user_id),
+            username=user.username,
+            email=user.email,
+            full_name=user.full_name,
+            background_information=user.background_information,
+            profile_picture_url=user.profile_picture_url,
+            phone_number=user.phone_number,
+            is_active=True,
+            is_verified=False,
+            auth_provider=user.auth_provider
+        )
+        self.users[user_id] = stored
+        self.users_by_identity[(user.email, user.auth_provider)] = user_id
+        if user.username is not None:
+            self.users_by_username[user.username] = user_id
+        self.user_groups[user_id] = set()
+        self.last_seen[user_id] = _utc_timestamp()
+        return stored
+
+    def create_user(self, user: UserCreate) -> UserBase:
+        with self._lock:
+            return self._insert_user(user)
+
+    def get_or_create_user_with_roles(self, user: UserCreate, roles: List[str]) -> Dict:
+        with self._lock:
+            user_id = self.users_by_identity.get((user.email, user.auth_provider))
+            created = user_id is None
+            if created:
+                user_id = _key(self._insert_user(user).id)
+                self.user_roles[user_id] = {role for role in roles if role in self.roles}
+            return {'user': self.users[user_id], 'roles': set(self.user_roles.get(user_id, ())), 'created': created}
+
+    def add_user_to_group(self, user_id: str, group_id: str) -> bool:
+        user_id, group_id = _key(user_id), _key(group_id)
+        with self._lock:
+            if user_id not in self.users or group_id not in self.groups or group_id in self.user_groups[user_id]:
+                return False  # User already in group or user/group doesn't exist
+            self.user_groups[user_id].add(group_id)
+            self.group_users[group_id].add(user_id)
+            return True
+
+    def remove_user_from_group(self, user_id: str, group_id: str) -> bool:
+        user_id, group_id = _key(user_id), _key(group_id)
+        with self._lock:
+            if group_id not in self.user_groups.get(user_id, ()):
+                return False
+            self.user_groups[user_id].discard(group_id)
+            self.group_users[group_id].discard(user_id)
+            return True
+
+    def _change_group_members(self, group_id: str, add_ids: Iterable[str] = (), remove_ids: Iterable[str] = (),
+                              replace: bool = False) -> Tuple[List[str], List[str]]:
+        group_id = _key(group_id)
+        with self._lock:
+            if group_id not in self.groups:
+                return [], []
+            current = self.group_users[group_id]
+            wanted = {_key(user_id) for user_id in add_ids}
+            to_add = {user_id for user_id in wanted - current if user_id in self.users}
+            to_remove = (current - wanted) if replace else ({_key(user_id) for user_id in remove_ids} & current)
+            for user_id in to_add:
+                current.add(user_id)
+                self.user_groups[user_id].add(group_id)
+            for user_id in to_remove:
+                current.discard(user_id)
+                self.user_groups[user_id].discard(group_id)
+        return sorted(to_add, key=int), sorted(to_remove, key=int)
+
+    def add_users_to_group(self, group_id: str, user_ids: List[str]) -> List[str]:
+        added, _ = self._change_group_members(group_id, add_ids=user_ids)
+        return added
+
+    def remove_users_from_group(self, group_id: str, user_ids: List[str]) -> List[str]:
+        _, removed = self._change_group_members(group_id, remove_ids=user_ids)
+        return removed
+
+    def sync_group_members(self, group_id: str, user_ids: List[str]) -> Dict[str, List[str]]:
+        added, removed = self._change_group_members(group_id, add_ids=user_ids, replace=True)
+        return {'added': added, 'removed': removed}
+
+    def get_users_by_ids(self, user_ids: List[str]) -> List[UserBase]:
+        users = self.users
+        return [users[_key(user_id)] for user_id in user_ids if _key(user_id) in users]
+
+    def get_groups_by_ids(self, group_ids: List[str]) -> List[GroupBase]:
+        groups = self.groups
+        return [groups[_key(group_id)] for group_id in group_ids if _key(group_id) in groups]
+
+    def get_user_groups(self, user_id: str, limit: Optional[int] = None, offset: int = 0) -> List[GroupBase]:
+        with self._lock:
+            # same ordering as the SQLite JOIN (ORDER BY group_id)
+            group_ids = sorted(self.user_groups.get(_key(user_id), ()), key=int)
+            return [self.groups[group_id] for group_id in group_ids[offset:None if limit is None else offset + limit]]
+
+    def get_group_users(self, group_id: str, limit: Optional[int] = None, offset: int = 0) -> List[UserBase]:
+        with self._lock:
+            user_ids = sorted(self.group_users.get(_key(group_id), ()), key=int)
+            return [self.users[user_id] for user_id in user_ids[offset:None if limit is None else offset + limit]]
+
+    def get_group_by_id(self, group_id: str) -> Optional[GroupBase]:
+        return self.groups.get(_key(group_id))
+
+    def get_user_by_id(self, user_id: str) -> Optional[UserBase]:
+        return self.users.get(_key(user_id))
+
+    def get_group_by_name(self, group_name: str) -> Optional[GroupBase]:
+        with self._lock:
+            group_id = self.groups_by_name.get(group_name)
+            return None if group_id is None else self.groups[group_id]
+
+    def get_user_by_username(self, username: str) -> Optional[UserBase]:
+        with self._lock:
+            user_id = self.users_by_username.get(username)
+            return None if user_id is None else self.users[user_id]
+
+    def get_user_by_email_and_provider(self, email: str, auth_provider: str) -> Optional[UserBase]:
+        with self._lock:
+            user_id = self.users_by_identity.get((email, auth_provider))
+            return None if user_id is None else self.users[user_id]
+
+    def delete_group(self, group_id: str) -> bool:
+        group_id = _key(group_id)
+        with self._lock:
+            group = self.groups.pop(group_id, None)
+            if group is None:
+                return False
+            del self.groups_by_name[group.group_name]
+            for user_id in self.group_users.pop(group_id, ()):
+                self.user_groups[user_id].discard(group_id)
+            return True
+
+    def delete_user(self, user_id: str) -> bool:
+        user_id = _key(user_id)
+        with self._lock:
+            user = self.users.pop(user_id, None)
+            if user is None:
+                return False
+            del self.users_by_identity[(user.email, user.auth_provider)]
+            if user.username is not None:
+                self.users_by_username.pop(user.username, None)
+            for group_id in self.user_groups.pop(user_id, ()):
+                self.group_users[group_id].discard(user_id)
+            # like SQLite, roles, refresh tokens and last_seen are left behind
+        self._announce('tokens', user_id)
+        return True
+
+    def get_user_last_seen_online(self, user_id: str) -> Optional[str]:
+        last_seen = self.last_seen.get(_key(user_id))
+        if last_seen is None:
+            print(f"User with ID {user_id} not found.")
+        return last_seen
+
+    def set_user_last_seen_online(self, user_id: str) -> bool:
+        with self._lock:
+            if _key(user_id) not in self.users:
+                print(f"User with ID {user_id} not found.")
+                return False
+            self.last_seen[_key(user_id)] = _utc_timestamp()
+            return True
+
+    def record_last_seen(self, user_id: str) -> bool:
+        self.set_user_last_seen_online(user_id)
+        return False
+
+    def flush_last_seen(self) -> int:
+        # updates are applied directly, nothing is buffered
+        return 0
+
+    def get_user_roles(self, user_id: str) -> Set[str]:
+        with self._lock:
+            return set(self.user_roles.get(_key(user_id), ()))
+
+    def get_roles(self, user_id) -> List[str]:
+        with self._lock:
+            return list(self.user_roles.get(_key(user_id), ()))
+
+    def _announce(self, kind: str, user_id) -> None:
+        revoked_at = revocation_time()
+        for listener in self.invalidation_listeners:
+            listener(kind, _key(user_id), revoked_at)
+
+    def assign_roles(self, user_id, roles):
+        added = False
+        with self._lock:
+            current_roles = self.user_roles.setdefault(_key(user_id), set())
+            for role in set(roles) - current_roles:
+                if role in self.roles:
+                    current_roles.add(role)
+                    added = True
+                else:
+                    print(f"Warning: Role '{role}' not found in the database.")
+        if added:
+            self._announce('roles', user_id)
+        print(f"Successfully upserted roles for user {user_id}")
+
+    def _add_refresh_token(self, user_id: str, family_id: str) -> Tuple[str, datetime]:
+        # caller holds self._lock
+        refresh_token = secrets.token_urlsafe(32)
+        expires = datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+        token_hash = hash_refresh_token(refresh_token)
+        self.refresh_tokens[token_hash] = {'user_id': user_id, 'expires': int(expires.timestamp()),
+                                           'family_id': family_id, 'used': False}
+        self.refresh_tokens_by_user.setdefault(user_id, set()).add(token_hash)
+        self.refresh_tokens_by_family.setdefault(family_id, set()).add(token_hash)
+        return refresh_token, expires
+
+    def _remove_refresh_tokens(self, token_hashes: Iterable[str]) -> int:
+        # caller holds self._lock
+        removed = 0
+        for token_hash in list(token_hashes):
+            row = self.refresh_tokens.pop(token_hash, None)
+            if row is None:
+                continue
+            removed += 1
+            self.refresh_tokens_by_user[row['user_id']].discard(token_hash)
+            self.refresh_tokens_by_family[row['family_id']].discard(token_hash)
+            if not self.refresh_tokens_by_user[row['user_id']]:
+                del self.refresh_tokens_by_user[row['user_id']]
+            if not self.refresh_tokens_by_family[row['family_id']]:
+                del self.refresh_tokens_by_family[row['family_id']]
+        return removed
+
+    def create_refresh_token(self, user_id: str) -> Dict:
+        with self._lock:
+            refresh_token, expires = self._add_refresh_token(_key(user_id), uuid.uuid4().hex)
+        return {'refresh_token': refresh_token, 'user_id': user_id, 'expires': expires}
+
+    def get_refresh_token(self, token: str) -> Dict:
+        row = self.refresh_tokens.get(hash_refresh_token(token))
+        if row is None or row['used']:
+            return None
+        return {'user_id': row['user_id'], 'expires': datetime.fromtimestamp(row['expires'], timezone.utc)}
+
+    def delete_refresh_token(self, token: str):
+        with self._lock:
+            self._remove_refresh_tokens([hash_refresh_token(token)])
+        return token
+
+    def rotate_refresh_token(self, token: str) -> Dict:
+        """Same contract as GroupManagerSQLite.rotate_refresh_token."""
+        now = datetime.now(timezone.utc)
+        token_hash = hash_refresh_token(token)
+        # one critical section, like SQLite's BEGIN IMMEDIATE: of two concurrent rotations
+        # of the same token, the second one sees it used
+        with self._lock:
+            row = self.refresh_tokens.get(token_hash)
+            if row is None:
+                return {'status': 'invalid'}
+            if not row['used']:
+                if row['expires'] < now.timestamp():
+                    self._remove_refresh_tokens([token_hash])
+                    return {'status': 'expired'}
+                user = self.users.get(row['user_id'])
+                if user is None:
+                    self._remove_refresh_tokens(self.refresh_tokens_by_family[row['family_id']])
+                    return {'status': 'user_not_found'}
+                roles = set(self.user_roles.get(row['user_id'], ()))
+                row['used'] = True
+                new_token, expires = self._add_refresh_token(row['user_id'], row['family_id'])
+                return {'status': 'ok', 'user': user, 'roles': roles, 'refresh_token': new_token, 'expires': expires}
+            self._remove_refresh_tokens(self.refresh_tokens_by_family[row['family_id']])
+        # reused: listeners are called outside the lock
+        self._announce('tokens', row['user_id'])
+        print(f"Refresh token reuse detected for user {row['user_id']}, revoked token family {row['family_id']}")
+        return {'status': 'reused'}
+
+    def revoke_all_refresh_tokens_for_user(self, user_id: str) -> int:
+        with self._lock:
+            removed = self._remove_refresh_tokens(self.refresh_tokens_by_user.get(_key(user_id), ()))
+        self._announce('tokens', user_id)
+        return removed
+
+    def delete_expired_refresh_tokens(self, batch_size: int = 500) -> int:
+        now = int(datetime.now(timezone.utc).timestamp())
+        with self._lock:
+            expired = []
+            for token_hash, row in self.refresh_tokens.items():
+                if row['expires'] < now:
+                    expired.append(token_hash)
+                    if len(expired) >= batch_size:
+                        break
+            return self._remove_refresh_tokens(expired)
+
+    def bulk_create_users(self, entries: List[Tuple[UserCreate, List[str], List[str]]]) -> List[Optional[str]]:
+        """Same contract as GroupManagerSQLite.bulk_create_users."""
+        errors: List[Optional[str]] = [None] * len(entries)
+        with self._lock:
+            seen, imported = set(), set()
+            for index, (user, roles, group_names) in enumerate(entries):
+                identity = (user.email, user.auth_provider)
+                unknown_roles = [role for role in roles if role not in self.roles]
+                if identity in self.users_by_identity and identity not in imported:
+                    errors[index] = f"user {user.email} ({user.auth_provider}) already exists"
+                elif identity in seen:
+                    errors[index] = f"duplicate of an earlier row for {user.email} ({user.auth_provider})"
+                elif unknown_roles:
+                    errors[index] = f"unknown roles: {', '.join(unknown_roles)}"
+                elif user.username is not None and user.username in self.users_by_username:
+                    errors[index] = f"conflict inserting {user.email}, username {user.username!r} may already be taken"
+                seen.add(identity)
+                if errors[index] is not None:
+                    continue
+                user_id = _key(self._insert_user(user).id)
+                imported.add(identity)
+                self.user_roles.setdefault(user_id, set()).update(roles)
+                for name in set(group_names):
+                    group_id = self.groups_by_name.get(name)
+                    if group_id is None:
+                        group_id = _key(self.create_group(name).group_id)
+                    self.user_groups[user_id].add(group_id)
+                    self.group_users[group_id].add(user_id)
+        return errors
+
+    def get_role_permission_graph(self, role: Optional[str] = None) -> Dict[str, Set[str]]:
+        with self._lock:
+            if role is not None:
+                return {role: set(self.role_permissions[role])} if role in self.roles else {}
+            return {name: set(self.role_permissions[name]) for name in self.roles}
+
+    def get_permission_names(self) -> List[str]:
+        return list(self.permissions)
+
+    def create_permission(self, name: str, description: Optional[str] = None) -> bool:
+        with self._lock:
+            if name in self.permissions:
+                return False
+            self.permissions[name] = description
+            return True
+
+    def grant_permission(self, role: str, permission: str) -> bool:
+        with self._lock:
+            if role not in self.roles or permission not in self.permissions or permission in self.role_permissions[role]:
+                return False
+            self.role_permissions[role].add(permission)
+            return True
+
+    def revoke_permission(self, role: str, permission: str) -> bool:
+        with self._lock:
+            if permission not in self.role_permissions.get(role, ()):
+                return False
+            self.role_permissions[role].discard(permission)
+            return True
+
+    def create_role(self, name: str, description: Optional[str] = None) -> bool:
+        with self._lock:
+            if name in self.roles:
+                return False
+            self.roles[name] = description
+            self.role_permissions[name] = set()
+            self.role_inheritance[name] = set()
+            return True
+
+    def get_role_inheritance(self) -> Dict[str, Set[str]]:
+        with self._lock:
+            return {role: set(inherited) for role, inherited in self.role_inheritance.items()}
+
+    def add_role_inheritance(self, role: str, inherited_role: str) -> bool:
+        with self._lock:
+            if role not in self.roles or inherited_role not in self.roles or inherited_role in self.role_inheritance[role]:
+                return False
+            self.role_inheritance[role].add(inherited_role)
+            return True
+
+    def remove_role_inheritance(self, role: str, inherited_role: str) -> bool:
+        with self._lock:
+            if inherited_role not in self.role_inheritance.get(role, ()):
+                return False
+            self.role_inheritance[role].discard(inherited_role)
+            return True
@@ -0,0 +1,420 @@
+import os
+import sqlite3
+import zlib
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from fastapi_sso.models.group import GroupBase
+from fastapi_sso.models.user import UserBase, UserCreate
+from .group_manager_sqlite import GroupManagerSQLite, _chunks, _key, hash_refresh_token
+
+DEFAULT_SHARD_COUNT = 4
+
+# raw refresh tokens handed out by this backend look like "<user_id>.<random>"
+REFRESH_TOKEN_SEPARATOR = '.'
+
+
+def shard_file(db_file: str, index: int) -> str:
+    """``../db/user.db`` -> ``../db/user.shard0.db``"""
+    root, ext = os.path.splitext(db_file)
+    return f'{root}.shard{index}{ext}'
+
+def shard_files(db_file: str, shard_count: int) -> List[str]:
+    return [shard_file(db_file, index) for index in range(shard_count)]
+
+def shard_for(user_id, shard_count: int) -> int:
+    # crc32 rather than hash(): it must be stable across processes and restarts
+    return zlib.crc32(_key(user_id).encode()) % shard_count
+
+def stored_shard_count(db_file: str) -> Optional[int]:
+    with sqlite3.connect(db_file) as conn:
+        try:
+            row = conn.execute("SELECT value FROM shard_meta WHERE key = 'shard_count'").fetchone()
+        except sqlite3.OperationalError:
+            return None
+    return int(row[0]) if row else None
+
+def catalog_has_users(db_file: str) -> bool:
+    # users left in the catalog mean an unsharded database that was never resharded
+    with sqlite3.connect(db_file) as conn:
+        try:
+            return conn.execute('SELECT EXISTS (SELECT 1 FROM users)').fetchone()[0] == 1
+        except sqlite3.OperationalError:
+            return False
+
+
+class GroupManagerSharded:
+    """
+    GroupManager that spreads user-owned data over several SQLite files.
+
+    users, user_roles, user_groups and refresh_tokens live in shard ``crc32(user_id) % N``,
+    so logins, refreshes and membership writes for different users take different write
+    locks. A small catalog database (``db_file``) keeps groups, permissions, role
+    inheritance and user_directory, which allocates user ids and maps (email, provider)
+    and username to an id so lookups go straight to one shard. Roles are written to the
+    catalog and every shard so role JOINs stay shard-local. Each file is served by its own
+    GroupManagerSQLite, with its own pool, caches and invalidation log.
+
+    Refresh tokens carry their user id as a prefix so they can be routed without a lookup.
+    Use ``fastapi_sso.services.reshard`` to change the number of shards.
+    """
+
+    def __init__(self, db_file: str = '../db/user.db', shard_count: int = DEFAULT_SHARD_COUNT, **manager_options):
+        stored = stored_shard_count(db_file)
+        if stored is not None and stored != shard_count:
+            raise ValueError(f"{db_file} is split into {stored} shards but {shard_count} are configured; "
+                             f"run fastapi-sso-reshard to change the shard count")
+        if catalog_has_users(db_file):
+            raise ValueError(f"{db_file} still holds unsharded users; run fastapi-sso-reshard --shards {shard_count} first")
+        self.db_file = db_file
+        self.shard_count = shard_count
+        self.catalog = GroupManagerSQLite(db_file, **manager_options)
+        self.shards = [GroupManagerSQLite(path, **manager_options) for path in shard_files(db_file, shard_count)]
+        # one listener list for every file, so subscribers hear about all changes
+        self.invalidation_listeners: List[Callable[[str, str, Optional[str]], None]] = self.catalog.invalidation_listeners
+        for shard in self.shards:
+            shard.invalidation_listeners = self.invalidation_listeners
+
+    def _shard(self, user_id) -> GroupManagerSQLite:
+        return self.shards[shard_for(user_id, self.shard_count)]
+
+    def _by_shard(self, user_ids: Iterable) -> Dict[int, List[str]]:
+        grouped: Dict[int, List[str]] = {}
+        for user_id in user_ids:
+            grouped.setdefault(shard_for(user_id, self.shard_count), []).append(_key(user_id))
+        return grouped
+
+    def get_pool_stats(self) -> Dict:
+        return {'catalog': self.catalog.get_pool_stats(), 'shards': [shard.get_pool_stats() for shard in self.shards]}
+
+    def get_cache_stats(self) -> List[Dict]:
+        stats = [dict(cache, shard='catalog') for cache in self.catalog.get_cache_stats()]
+        for index, shard in enumerate(self.shards):
+            stats.extend(dict(cache, shard=index) for cache in shard.get_cache_stats())
+        return stats
+
+    def sync_caches(self, force: bool = False) -> int:
+        return self.catalog.sync_caches(force) + sum(shard.sync_caches(force) for shard in self.shards)
+
+    def close(self) -> None:
+        self.catalog.close()
+        for shard in self.shards:
+            shard.close()
+
+    # groups live in the catalog
+    def create_group(self, group_name: str) -> GroupBase:
+        return self.catalog.create_group(group_name)
+
+    def get_group_by_id(self, group_id: str) -> Optional[GroupBase]:
+        return self.catalog.get_group_by_id(group_id)
+
+    def get_groups_by_ids(self, group_ids: List[str]) -> List[GroupBase]:
+        return self.catalog.get_groups_by_ids(group_ids)
+
+    def get_group_by_name(self, group_name: str) -> Optional[GroupBase]:
+        return self.catalog.get_group_by_name(group_name)
+
+    def delete_group(self, group_id: str) -> bool:
+        if not self.catalog.delete_group(group_id):
+            return False
+        for shard in self.shards:
+            with shard.pool.connection() as conn:
+                cursor = conn.execute('DELETE FROM user_groups WHERE group_id = ?', (group_id,))
+                if cursor.rowcount > 0:
+                    shard.invalidation_log.record(conn, 'group', group_id)
+                conn.commit()
+            # drops the group from cached membership lists of this shard's users
+            shard._apply_invalidation('group', _key(group_id), None)
+        return True
+
+    # users
+    def create_user(self, user: UserCreate) -> UserBase:
+        with self.catalog.pool.connection() as conn:
+            cursor = conn.execute('INSERT INTO user_directory (email, auth_provider, username) VALUES (?, ?, ?)',
+                                  (user.email, user.auth_provider, user.username))
+            conn.commit()
+        user_id = cursor.lastrowid
+        try:
+            return self._shard(user_id).create_user(user, user_id=user_id)
+        except sqlite3.Error:
+            with self.catalog.pool.connection() as conn:
+                conn.execute('DELETE FROM user_directory WHERE id = ?', (user_id,))
+                conn.commit()
+            raise
+
+    def get_or_create_user_with_roles(self, user: UserCreate, roles: List[str]) -> Dict:
+        # the directory row is upserted first; a crash before the shard write leaves an id
+        # that the next login of the same user picks up again
+        lookup = 'SELECT id FROM user_directory WHERE email = ? AND auth_provider = ?'
+        with self.catalog.pool.connection() as conn:
+            row = conn.execute(lookup, (user.email, user.auth_provider)).fetchone()
+            if row is None:
+                conn.execute('INSERT INTO user_directory (email, auth_provider, username) VALUES (?, ?, ?) '
+                             'ON CONFLICT (email, auth_provider) DO NOTHING', (user.email, user.auth_provider, user.username))
+                row = conn.execute(lookup, (user.email, user.auth_provider)).fetchone()
+                conn.commit()
+        user_id = row[0]
+        return self._shard(user_id).get_or_create_user_with_roles(user, roles, user_id=user_id)
+
+    def _lookup_directory(self, where: str, params: Tuple) -> Optional[UserBase]:
+        with self.catalog.pool.connection() as conn:
+            row = conn.execute(f'SELECT id FROM user_directory WHERE {where}', params).fetchone()
+        return None if row is None else self._shard(row[0]).get_user_by_id(row[0])
+
+    def get_user_by_email_and_provider(self, email: str, auth_provider: str) -> Optional[UserBase]:
+        return self._lookup_directory('email = ? AND auth_provider = ?', (email, auth_provider))
+
+    def get_user_by_username(self, username: str) -> Optional[UserBase]:
+        return self._lookup_directory('username = ?', (username,))
+
+    def get_user_by_id(self, user_id: str) -> Optional[UserBase]:
+        return self._shard(user_id).get_user_by_id(user_id)
+
+    def get_users_by_ids(self, user_ids: List[str]) -> List[UserBase]:
+        found: Dict[str, UserBase] = {}
+        for index, ids in self._by_shard(dict.fromkeys(user_ids)).items():
+            for user in self.shards[index].get_users_by_ids(ids):
+                found[_key(user.id)] = user
+        return [found[_key(user_id)] for user_id in user_ids if _key(user_id) in found]
+
+    def delete_user(self, user_id: str) -> bool:
+        if not self._shard(user_id).delete_user(user_id):
+            return False
+        with self.catalog.pool.connection() as conn:
+            conn.execute('DELETE FROM user_directory WHERE id = ?', (user_id,))
+            conn.commit()
+        return True
+
+    def get_user_last_seen_online(self, user_id: str):
+        return self._shard(user_id).get_user_last_seen_online(user_id)
+
+    def set_user_last_seen_online(self, user_id: str) -> bool:
+        return self._shard(user_id).set_user_last_seen_online(user_id)
+
+    def record_last_seen(self, user_id: str) -> bool:
+        return self._shard(user_id).record_last_seen(user_id)
+
+    def flush_last_seen(self) -> int:
+        return sum(shard.flush_last_seen() for shard in self.shards)
+
+    def bulk_create_users(self, entries: List[Tuple[UserCreate, List[str], List[str]]]) -> List[Optional[str]]:
+        """
+        Same contract as GroupManagerSQLite.bulk_create_users. Ids and missing groups are
+        allocated in one catalog transaction, then each shard gets one transaction with
+        its users, role assignments and memberships.
+        """
+        errors: List[Optional[str]] = [None] * len(entries)
+        identity = lambda user: (user.email, user.auth_provider)
+        with self.catalog.pool.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            role_names = {row[0] for row in conn.execute('SELECT name FROM roles')}
+            emails = list({user.email for user, _, _ in entries})
+            existing = set()
+            for chunk in _chunks(emails):
+                placeholders = ','.join('?' * len(chunk))
+                existing.update(tuple(row) for row in conn.execute(
+                    f'SELECT email, auth_provider FROM user_directory WHERE email IN ({placeholders})', chunk))
+            seen = set()
+            for index, (user, roles, _) in enumerate(entries):
+                unknown_roles = [role for role in roles if role not in role_names]
+                if identity(user) in existing:
+                    errors[index] = f"user {user.email} ({user.auth_provider}) already exists"
+                elif identity(user) in seen:
+                    errors[index] = f"duplicate of an earlier row for {user.email} ({user.auth_provider})"
+                elif unknown_roles:
+                    errors[index] = f"unknown roles: {', '.join(unknown_roles)}"
+                seen.add(identity(user))
+            accepted = [index for index, error in enumerate(errors) if error is None]
+
+            max_id_before = conn.execute('SELECT COALESCE(MAX(id), 0) FROM user_directory').fetchone()[0]
+            conn.executemany('INSERT OR IGNORE INTO user_directory (email, auth_provider, username) VALUES (?, ?, ?)',
+                             [(user.email, user.auth_provider, user.username) for user, _, _ in (entries[index] for index in accepted)])
+            new_ids = {(row['email'], row['auth_provider']): row['id'] for row in conn.execute(
+                'SELECT id, email, auth_provider FROM user_directory WHERE id > ?', (max_id_before,))}
+
+            group_names = {name for index in accepted for name in entries[index][2]}
+            conn.executemany('INSERT OR IGNORE INTO groups (group_name) VALUES (?)', [(name,) for name in group_names])
+            group_ids = {}
+            for chunk in _chunks(list(group_names)):
+                placeholders = ','.join('?' * len(chunk))
+                group_ids.update((row['group_name'], row['group_id']) for row in conn.execute(
+                    f'SELECT group_id, group_name FROM groups WHERE group_name IN ({placeholders})', chunk))
+            conn.commit()
+
+        per_shard: Dict[int, List[int]] = {}
+        for index in accepted:
+            user_id = new_ids.get(identity(entries[index][0]))
+            if user_id is None:
+                errors[index] = f"conflict inserting {entries[index][0].email}, username {entries[index][0].username!r} may already be taken"
+                continue
+            per_shard.setdefault(shard_for(user_id, self.shard_count), []).append(index)
+        for shard_index, indexes in per_shard.items():
+            self._bulk_insert_into_shard(self.shards[shard_index], [(new_ids[identity(entries[index][0])], entries[index]) for index in indexes], group_ids)
+        return errors
+
+    def _bulk_insert_into_shard(self, shard: GroupManagerSQLite, rows: List[Tuple[int, Tuple[UserCreate, List[str], List[str]]]],
+                                group_ids: Dict[str, int]) -> None:
+        with shard.pool.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            role_ids = {name: role_id for role_id, name in conn.execute('SELECT id, name FROM roles')}
+            conn.executemany('''
+                INSERT OR IGNORE INTO users (id, username, email, password_hash, full_name, background_information, profile_picture_url, phone_number, auth_provider)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(user_id, user.username, user.email, user.password_hash, user.full_name, user.background_information,
+                   user.profile_picture_url, user.phone_number, user.auth_provider) for user_id, (user, _, _) in rows])
+            user_roles = [(user_id, role_ids[role]) for user_id, (_, roles, _) in rows for role in set(roles)]
+            memberships = [(user_id, group_ids[name]) for user_id, (_, _, groups) in rows for name in set(groups)]
+            conn.executemany('INSERT OR IGNORE INTO user_roles (user_id, role_id) VALUES (?, ?)', user_roles)
+            conn.executemany('INSERT OR IGNORE INTO user_groups (user_id, group_id) VALUES (?, ?)', memberships)
+            shard.invalidation_log.record_many(
+                conn,
+                [('user', user_id, None) for user_id, _ in rows]
+                + [('membership', user_id, group_id) for user_id, group_id in memberships],
+            )
+            conn.commit()
+        with shard._cache_lock:
+            for user_id, _ in rows:
+                shard.users_cache.pop(_key(user_id), None)
+            for group_id in {group_id for _, group_id in memberships}:
+                shard.group_users_cache.pop(_key(group_id), None)
+
+    # memberships are stored with the user
+    def add_user_to_group(self, user_id: str, group_id: str) -> bool:
+        if self.catalog.get_group_by_id(group_id) is None or self.get_user_by_id(user_id) is None:
+            return False
+        return self._shard(user_id).add_user_to_group(user_id, group_id)
+
+    def remove_user_from_group(self, user_id: str, group_id: str) -> bool:
+        return self._shard(user_id).remove_user_from_group(user_id, group_id)
+
+    def _change_group_members(self, group_id: str, add_ids: Iterable[str] = (), remove_ids: Iterable[str] = (),
+                              replace: bool = False) -> Tuple[List[str], List[str]]:
+        if self.catalog.get_group_by_id(group_id) is None:
+            return [], []
+        adds, removes = self._by_shard(add_ids), self._by_shard(remove_ids)
+        # with replace every shard has to drop members that aren't wanted, even if it gets no adds
+        indexes = range(self.shard_count) if replace else set(adds) | set(removes)
+        added, removed = [], []
+        for index in indexes:
+            shard_added, shard_removed = self.shards[index]._change_group_members(
+                group_id, adds.get(index, ()), removes.get(index, ()), replace=replace, check_group=False)
+            added.extend(shard_added)
+            removed.extend(shard_removed)
+        return sorted(added, key=int), sorted(removed, key=int)
+
+    def add_users_to_group(self, group_id: str, user_ids: List[str]) -> List[str]:
+        added, _ = self._change_group_members(group_id, add_ids=user_ids)
+        return added
+
+    def remove_users_from_group(self, group_id: str, user_ids: List[str]) -> List[str]:
+        _, removed = self._change_group_members(group_id, remove_ids=user_ids)
+        return removed
+
+    def sync_group_members(self, group_id: str, user_ids: List[str]) -> Dict[str, List[str]]:
+        added, removed = self._change_group_members(group_id, add_ids=user_ids, replace=True)
+        return {'added': added, 'removed': removed}
+
+    @staticmethod
+    def _cached_ids(shard: GroupManagerSQLite, cache, key: str, load: Callable[[str], List[str]]) -> List[str]:
+        shard.sync_caches()
+        ids = cache.get(key)
+        if ids is None:
+            ids = cache.setdefault(key, load(key))
+        return list(ids)
+
+    def get_user_groups(self, user_id: str, limit: Optional[int] = None, offset: int = 0) -> List[GroupBase]:
+        shard = self._shard(user_id)
+        group_ids = sorted(self._cached_ids(shard, shard.user_groups_cache, _key(user_id), shard._get_user_groups_from_db), key=int)
+        return self.catalog.get_groups_by_ids(group_ids[offset:None if limit is None else offset + limit])
+
+    def get_group_users(self, group_id: str, limit: Optional[int] = None, offset: int = 0) -> List[UserBase]:
+        # members are spread over every shard; each shard caches its part of the list
+        user_ids = []
+        for shard in self.shards:
+            user_ids.extend(self._cached_ids(shard, shard.group_users_cache, _key(group_id), shard._get_group_users_from_db))
+        user_ids.sort(key=int)
+        return self.get_users_by_ids(user_ids[offset:None if limit is None else offset + limit])
+
+    # roles: the catalog is authoritative, every shard keeps a copy for its user_roles JOINs
+    def create_role(self, name: str, description: Optional[str] = None) -> bool:
+        created = self.catalog.create_role(name, description)
+        for shard in self.shards:
+            shard.create_role(name, description)
+        return created
+
+    def assign_roles(self, user_id, roles):
+        return self._shard(user_id).assign_roles(user_id, roles)
+
+    def get_user_roles(self, user_id: str) -> Set[str]:
+        return self._shard(user_id).get_user_roles(user_id)
+
+    def get_roles(self, user_id) -> List[str]:
+        return self._shard(user_id).get_roles(user_id)
+
+    def get_role_permission_graph(self, role: Optional[str] = None) -> Dict[str, Set[str]]:
+        return self.catalog.get_role_permission_graph(role)
+
+    def get_permission_names(self) -> List[str]:
+        return self.catalog.get_permission_names()
+
+    def create_permission(self, name: str, description: Optional[str] = None) -> bool:
+        return self.catalog.create_permission(name, description)
+
+    def grant_permission(self, role: str, permission: str) -> bool:
+        return self.catalog.grant_permission(role, permission)
+
+    def revoke_permission(self, role: str, permission: str) -> bool:
+        return self.catalog.revoke_permission(role, permission)
+
+    def get_role_inheritance(self) -> Dict[str, Set[str]]:
+        return self.catalog.get_role_inheritance()
+
+    def add_role_inheritance(self, role: str, inherited_role: str) -> bool:
+        return self.catalog.add_role_inheritance(role, inherited_role)
+
+    def remove_role_inheritance(self, role: str, inherited_role: str) -> bool:
+        return self.catalog.remove_role_inheritance(role, inherited_role)
+
+    # refresh tokens
+    def _token_shard(self, token: str) -> Tuple[Optional[GroupManagerSQLite], str]:
+        """The shard holding ``token`` and the raw token as that shard stored it."""
+        user_id, separator, raw = token.partition(REFRESH_TOKEN_SEPARATOR)
+        if separator and user_id.isdigit():
+            return self._shard(user_id), raw
+        # tokens issued before the data was sharded have no prefix
+        token_hash = hash_refresh_token(token)
+        for shard in self.shards:
+            with shard.pool.connection() as conn:
+                if conn.execute('SELECT 1 FROM refresh_tokens WHERE token_hash = ?', (token_hash,)).fetchone():
+                    return shard, token
+        return None, token
+
+    def create_refresh_token(self, user_id: str) -> Dict:
+        result = self._shard(user_id).create_refresh_token(user_id)
+        if result:
+            result['refresh_token'] = f"{_key(user_id)}{REFRESH_TOKEN_SEPARATOR}{result['refresh_token']}"
+        return result
+
+    def get_refresh_token(self, token: str) -> Dict:
+        shard, raw = self._token_shard(token)
+        return None if shard is None else shard.get_refresh_token(raw)
+
+    def delete_refresh_token(self, token: str):
+        shard, raw = self._token_shard(token)
+        if shard is not None:
+            shard.delete_refresh_token(raw)
+        return token
+
+    def rotate_refresh_token(self, token: str) -> Dict:
+        shard, raw = self._token_shard(token)
+        if shard is None:
+            return {'status': 'invalid'}
+        result = shard.rotate_refresh_token(raw)
+        if result['status'] == 'ok':
+            result['refresh_token'] = f"{_key(result['user'].id)}{REFRESH_TOKEN_SEPARATOR}{result['refresh_token']}"
+        return result
+
+    def revoke_all_refresh_tokens_for_user(self, user_id: str) -> int:
+        return self._shard(user_id).revoke_all_refresh_tokens_for_user(user_id)
+
+    def delete_expired_refresh_tokens(self, batch_size: int = 500) -> int:
+        return sum(shard.delete_expired_refresh_tokens(batch_size) for shard in self.shards)
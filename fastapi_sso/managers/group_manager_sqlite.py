@@ -1,86 +1,225 @@
 from datetime import datetime, timedelta, timezone
+import hashlib
 import secrets
 import sqlite3
+import threading
+import time
 import uuid
-from typing import List, Optional, Dict, Set
+from typing import Callable, Iterable, List, Optional, Dict, Set, Tuple
 
 from pydantic import TypeAdapter
 
 from fastapi_sso.models.group import GroupBase
 from fastapi_sso.models.user import UserBase, UserCreate
 from ..utils.utils import generate_deci_code
+from .cache_invalidation import DEFAULT_POLL_INTERVAL_SECONDS, InvalidationLog
+from .cache import DEFAULT_MAX_ENTRIES, DEFAULT_NEGATIVE_TTL_SECONDS, DEFAULT_TTL_SECONDS, NEGATIVE, LRUCache
+from .connection_pool import SQLiteConnectionPool, get_pool
+from .last_seen_buffer import DEFAULT_MAX_PENDING, LastSeenBuffer
 
 REFRESH_TOKEN_EXPIRE_DAYS = 30
 
+# SQLite's default SQLITE_MAX_VARIABLE_NUMBER is 999 on older builds
+SQL_IN_CHUNK_SIZE = 900
+
+USER_COLUMNS = '''id, username, email, full_name, background_information, profile_picture_url,
+                status, is_active, is_verified, phone_number, password_hash,
+                last_seen, created_at, updated_at, auth_provider'''
+
+_user_adapter = TypeAdapter(UserBase)
+_group_adapter = TypeAdapter(GroupBase)
+
+def hash_refresh_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def revocation_time() -> str:
+    # sent as the related_id of 'roles' and 'tokens' events, so every worker cuts off the same tokens
+    return repr(time.time())
+
+def _key(id) -> str:
+    # ids arrive as ints from sqlite and as strings from JWT claims / path params
+    return str(id)
+
+def _chunks(items: List, size: int = SQL_IN_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _row_to_user(row: sqlite3.Row) -> UserBase:
+    user_dict = dict(row)
+    # Convert integer boolean fields to Python booleans
+    user_dict['is_active'] = bool(user_dict['is_active'])
+    user_dict['is_verified'] = bool(user_dict['is_verified'])
+    # Convert string timestamps to datetime objects
+    for field in ['last_seen', 'created_at', 'updated_at']:
+        if user_dict.get(field):
+            user_dict[field] = datetime.fromisoformat(user_dict[field])
+    return _user_adapter.validate_python(user_dict)
+
 class GroupManagerSQLite:
-    def __init__(self, db_file: str = '../db/user.db'):
+    def __init__(self, db_file: str = '../db/user.db', pool: Optional[SQLiteConnectionPool] = None,
+                 cache_max_entries: int = DEFAULT_MAX_ENTRIES, cache_ttl: Optional[float] = DEFAULT_TTL_SECONDS,
+                 cache_negative_ttl: Optional[float] = DEFAULT_NEGATIVE_TTL_SECONDS,
+                 cache_sync_interval: float = DEFAULT_POLL_INTERVAL_SECONDS,
+                 last_seen_max_pending: int = DEFAULT_MAX_PENDING, role_ids: Optional[Dict[str, int]] = None):
         self.db_file = db_file
+        # Connections are shared by every manager pointing at the same file
+        self.pool = pool or get_pool(db_file, row_factory=sqlite3.Row)
         
-        # Initialize empty caches
-        self.groups_cache: Dict[str, GroupBase] = {}  # group_id -> group Model obj
-        self.users_cache: Dict[str, UserBase] = {}  # user_id -> user Model obj
-        self.user_groups_cache: Dict[str, List[str]] = {}  # user_id -> list of group_ids
-        self.group_users_cache: Dict[str, List[str]] = {}  # group_id -> list of user_ids
+        # Initialize empty caches. The manager is shared by all requests, so every
+        # read-modify-write of a cache entry happens under this lock.
+        self._cache_lock = threading.RLock()
+        def new_cache(name: str) -> LRUCache:
+            return LRUCache(name, max_entries=cache_max_entries, ttl=cache_ttl, negative_ttl=cache_negative_ttl)
+        self.groups_cache = new_cache('groups')  # group_id -> group Model obj
+        self.users_cache = new_cache('users')  # user_id -> user Model obj, or NEGATIVE if the user doesn't exist
+        self.user_groups_cache = new_cache('user_groups')  # user_id -> list of group_ids
+        self.group_users_cache = new_cache('group_users')  # group_id -> list of user_ids
+        self.user_roles_cache = new_cache('user_roles')  # user_id -> frozenset of role names
+        # role name <-> id, as returned by insert_roles at startup; loaded from the db when not given
+        self._role_ids: Optional[Dict[str, int]] = None
+        self._role_names: Dict[int, str] = {}
+        if role_ids is not None:
+            self._set_role_table(role_ids)
+        # Mutations are also logged to the db so other worker processes can evict their copies
+        self.invalidation_log = InvalidationLog(db_file, poll_interval=cache_sync_interval)
+        # Other in-memory structures built on this data (e.g. the permission resolver)
+        # subscribe here to hear about changes made by other processes
+        self.invalidation_listeners: List[Callable[[str, str, Optional[str]], None]] = []
+        # presence updates are coalesced in memory and written in batches
+        self.last_seen_buffer = LastSeenBuffer(max_pending=last_seen_max_pending)
+
+    def get_pool_stats(self) -> Dict:
+        return self.pool.stats()
+
+    def get_cache_stats(self) -> List[Dict]:
+        return [cache.stats() for cache in (self.users_cache, self.groups_cache, self.user_groups_cache, self.group_users_cache,
+                                            self.user_roles_cache)]
+
+    def sync_caches(self, force: bool = False) -> int:
+        """Apply invalidations written by other processes; cheap no-op when nothing changed."""
+        events = self.invalidation_log.poll(force=force)
+        for kind, entity_id, related_id in events:
+            self._apply_invalidation(kind, entity_id, related_id)
+        return len(events)
+
+    def _apply_invalidation(self, kind: str, entity_id: str, related_id: Optional[str]) -> None:
+        with self._cache_lock:
+            if kind == 'user':
+                self.users_cache.pop(entity_id, None)
+                self.user_groups_cache.pop(entity_id, None)
+                self.user_roles_cache.pop(entity_id, None)
+                for group_users in self.group_users_cache.values():
+                    if entity_id in group_users:
+                        group_users.remove(entity_id)
+            elif kind == 'group':
+                self.groups_cache.pop(entity_id, None)
+                self.group_users_cache.pop(entity_id, None)
+                for user_groups in self.user_groups_cache.values():
+                    if entity_id in user_groups:
+                        user_groups.remove(entity_id)
+            elif kind == 'membership':
+                self.user_groups_cache.pop(entity_id, None)
+                self.group_users_cache.pop(related_id, None)
+            elif kind == 'roles':
+                self.user_roles_cache.pop(entity_id, None)
+            elif kind == 'role':
+                self._role_ids = None
+        for listener in self.invalidation_listeners:
+            listener(kind, entity_id, related_id)
+
+    def _announce(self, kind: str, user_id, revoked_at: str) -> None:
+        # 'roles' and 'tokens' also go to local listeners: access tokens issued to the user
+        # before ``revoked_at`` must stop working here too, not only in the other workers
+        for listener in self.invalidation_listeners:
+            listener(kind, _key(user_id), revoked_at)
+
+    def close(self) -> None:
+        self.flush_last_seen()
+        self.invalidation_log.close()
+
+    def _set_role_table(self, role_ids: Dict[str, int]) -> None:
+        self._role_names = {role_id: name for name, role_id in role_ids.items()}
+        self._role_ids = dict(role_ids)
+
+    def _role_table(self, conn: sqlite3.Connection, reload: bool = False) -> Dict[str, int]:
+        """role name -> id; roles are few and rarely change, so the whole table stays in memory."""
+        role_ids = self._role_ids
+        if role_ids is None or reload:
+            role_ids = {name: role_id for role_id, name in conn.execute('SELECT id, name FROM roles')}
+            self._set_role_table(role_ids)
+        return role_ids
+
+    def _role_name(self, role_id: int, conn: sqlite3.Connection) -> Optional[str]:
+        if role_id not in self._role_names:
+            # created by another process since the table was loaded
+            self._role_table(conn, reload=True)
+        return self._role_names.get(role_id)
+
+    def _load_user_roles(self, conn: sqlite3.Connection, user_id) -> frozenset:
+        """Role names of ``user_id``: one indexed read of user_roles, names from the in-memory role table."""
+        if self._role_ids is None:
+            self._role_table(conn)
+        role_ids = [row[0] for row in conn.execute('SELECT role_id FROM user_roles WHERE user_id = ?', (user_id,))]
+        roles = frozenset(name for name in (self._role_name(role_id, conn) for role_id in role_ids) if name is not None)
+        self.user_roles_cache.set(_key(user_id), roles)
+        return roles
+
+    # Membership lists are mutated in place, only when the list is already cached
+    def _cache_add_member(self, cache: LRUCache, key: str, member: str) -> None:
+        with self._cache_lock:
+            members = cache.peek(key)
+            if members is not None and member not in members:
+                members.append(member)
+
+    def _cache_remove_member(self, cache: LRUCache, key: str, member: str) -> None:
+        with self._cache_lock:
+            members = cache.peek(key)
+            if members is not None and member in members:
+                members.remove(member)
 
     # done
     def _get_group_from_db(self, group_id: str) -> Optional[GroupBase]:
-        with sqlite3.connect(self.db_file) as conn:
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT group_id, group_name FROM groups WHERE group_id = ?', (group_id,))
             result = cursor.fetchone()
-            print(result)
-            group_dict = dict(result)
             if result:
-                group_adapter = TypeAdapter(GroupBase)
-                return group_adapter.validate_python(group_dict)
+                return _group_adapter.validate_python(dict(result))
         return None
 
     # done
     def _get_user_from_db(self, user_id: str) -> Optional[UserBase]:
-        with sqlite3.connect(self.db_file) as conn:
-            conn.row_factory = sqlite3.Row
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                           SELECT id, username, email, full_name, background_information, profile_picture_url, 
-                       status, is_active, is_verified, phone_number, password_hash, 
-                       last_seen, created_at, updated_at
+            cursor.execute(f'''
+                SELECT {USER_COLUMNS}
                 FROM users 
                 WHERE id = ?'''
-                , (user_id))
+                , (user_id,))
             result = cursor.fetchone()
             if result:
-                user_dict = dict(result)
-                # Convert integer boolean fields to Python booleans
-                user_dict['is_active'] = bool(user_dict['is_active'])
-                user_dict['is_verified'] = bool(user_dict['is_verified'])
-                # Convert string timestamps to datetime objects
-                for field in ['last_seen', 'created_at', 'updated_at']:
-                    if user_dict[field]:
-                        user_dict[field] = datetime.fromisoformat(user_dict[field])
-                
-                # Use TypeAdapter to validate and create a User instance
-                user_adapter = TypeAdapter(UserBase)
-                return user_adapter.validate_python(user_dict)
+                return _row_to_user(result)
         return None
     # done
     def _get_user_groups_from_db(self, user_id: str) -> List[str]:
-        with sqlite3.connect(self.db_file) as conn:
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT group_id FROM user_groups WHERE user_id = ?', (user_id,))
             # extracts first column( here it is group_id) from the reulting rows that have been fetched
-            return [row[0] for row in cursor.fetchall()]
+            return [_key(row[0]) for row in cursor.fetchall()]
     # done
     def _get_group_users_from_db(self, group_id: str) -> List[str]:
-        with sqlite3.connect(self.db_file) as conn:
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT user_id FROM user_groups WHERE group_id = ?', (group_id,))
              # extracts first column ( here it is user_id) from the reulting rows that have been fetched
-            return [row[0] for row in cursor.fetchall()]
+            return [_key(row[0]) for row in cursor.fetchall()]
     # done
     def create_group(self, group_name: str) -> str:
-        with sqlite3.connect(self.db_file) as conn:
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('INSERT INTO groups group_name VALUES (?, ?)', (group_name))
+            cursor.execute('INSERT INTO groups (group_name) VALUES (?)', (group_name,))
+            self.invalidation_log.record(conn, 'group', cursor.lastrowid)
             conn.commit()
         group_id = cursor.lastrowid
         # Update cache
@@ -88,19 +227,23 @@ class GroupManagerSQLite:
             group_id=group_id,
             group_name=group_name
         )
-        self.groups_cache[group_id] = group
-        self.group_users_cache[group_id] = []
+        with self._cache_lock:
+            self.groups_cache.set(_key(group_id), group)
+            self.group_users_cache.set(_key(group_id), [])
         return group
 
     
     # done
-    def create_user(self, user: UserCreate) -> UserBase:
-        with sqlite3.connect(self.db_file) as conn:
+    def create_user(self, user: UserCreate, user_id: Optional[int] = None) -> UserBase:
+        # user_id is only passed when ids are allocated elsewhere (the sharded backend)
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                INSERT INTO users (username, email, password_hash, full_name, background_information, profile_picture_url, phone_number, auth_provider)
-                VALUES (?, ?, ?, ?, ?, ?, ?,?)
-            ''', (user.username, user.email, user.password_hash, user.full_name, user.background_information, user.profile_picture_url, user.phone_number,user.auth_provider))
+                INSERT INTO users (id, username, email, password_hash, full_name, background_information, profile_picture_url, phone_number, auth_provider)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?,?)
+            ''', (user_id, user.username, user.email, user.password_hash, user.full_name, user.background_information, user.profile_picture_url, user.phone_number,user.auth_provider))
+            # clears NEGATIVE entries other workers may hold for this id
+            self.invalidation_log.record(conn, 'user', cursor.lastrowid)
             conn.commit()
         user_id = cursor.lastrowid
         # Update cache
@@ -118,194 +261,387 @@ class GroupManagerSQLite:
             auth_provider=user.auth_provider
         )
         
-        self.users_cache[user_id] = user
-        self.user_groups_cache[user_id] = []
+        with self._cache_lock:
+            # also replaces a NEGATIVE entry left by an earlier lookup
+            self.users_cache.set(_key(user_id), user)
+            self.user_groups_cache.set(_key(user_id), [])
         
         return user
 
-    # done 
+    def get_or_create_user_with_roles(self, user: UserCreate, roles: List[str], user_id: Optional[int] = None) -> Dict:
+        """
+        Look ``user`` up by (email, auth_provider), creating it with ``roles`` if it's new.
+
+        A returning user costs one query: the row and its role names come back together.
+        A new user is upserted with its roles in one BEGIN IMMEDIATE transaction; the
+        insert does nothing on the UNIQUE (email, auth_provider) conflict, so a concurrent
+        login of the same user reads the winner's row instead of failing.
+        Returns ``{'user', 'roles', 'created'}``.
+        """
+        lookup = f'''
+            SELECT {USER_COLUMNS},
+                   (SELECT group_concat(r.name, char(31)) FROM user_roles ur JOIN roles r ON ur.role_id = r.id
+                    WHERE ur.user_id = users.id) AS role_names
+            FROM users WHERE email = ? AND auth_provider = ?'''
+        created = False
+        with self.pool.connection() as conn:
+            row = conn.execute(lookup, (user.email, user.auth_provider)).fetchone()
+            if row is None:
+                conn.execute('BEGIN IMMEDIATE')
+                cursor = conn.execute('''
+                    INSERT INTO users (id, username, email, password_hash, full_name, background_information, profile_picture_url, phone_number, auth_provider)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (email, auth_provider) DO NOTHING
+                ''', (user_id, user.username, user.email, user.password_hash, user.full_name, user.background_information,
+                      user.profile_picture_url, user.phone_number, user.auth_provider))
+                created = cursor.rowcount > 0
+                if created:
+                    new_id = cursor.lastrowid
+                    role_names = list(set(roles))
+                    if role_names:
+                        placeholders = ','.join('?' * len(role_names))
+                        conn.execute(f'INSERT OR IGNORE INTO user_roles (user_id, role_id) SELECT ?, id FROM roles WHERE name IN ({placeholders})',
+                                     (new_id, *role_names))
+                    self.invalidation_log.record(conn, 'user', new_id)
+                row = conn.execute(lookup, (user.email, user.auth_provider)).fetchone()
+                conn.commit()
+        stored = _row_to_user(row)
+        user_roles = set(row['role_names'].split(chr(31))) if row['role_names'] else set()
+        with self._cache_lock:
+            self.users_cache.set(_key(stored.id), stored)
+            self.user_roles_cache.set(_key(stored.id), frozenset(user_roles))
+            if created:
+                self.user_groups_cache.set(_key(stored.id), [])
+        return {'user': stored, 'roles': user_roles, 'created': created}
+
+    # done
     def add_user_to_group(self, user_id: str, group_id: str) -> bool:
         try:
-            with sqlite3.connect(self.db_file) as conn:
+            with self.pool.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('INSERT INTO user_groups (user_id, group_id) VALUES (?, ?)', (user_id, group_id))
+                self.invalidation_log.record(conn, 'membership', user_id, group_id)
                 conn.commit()
             
             # Update cache if the entries exist
-            if user_id in self.user_groups_cache:
-                self.user_groups_cache[user_id].append(group_id)
-            if group_id in self.group_users_cache:
-                self.group_users_cache[group_id].append(user_id)
+            self._cache_add_member(self.user_groups_cache, _key(user_id), _key(group_id))
+            self._cache_add_member(self.group_users_cache, _key(group_id), _key(user_id))
             
             return True
         except sqlite3.IntegrityError:
             return False  # User already in group or user/group doesn't exist
     # done
     def remove_user_from_group(self, user_id: str, group_id: str) -> bool:
-        with sqlite3.connect(self.db_file) as conn:
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM user_groups WHERE user_id = ? AND group_id = ?', (user_id, group_id))
+            if cursor.rowcount > 0:
+                self.invalidation_log.record(conn, 'membership', user_id, group_id)
             conn.commit()
             if cursor.rowcount > 0:
                 # Update cache if the entries exist
-                if user_id in self.user_groups_cache:
-                    self.user_groups_cache[user_id].remove(group_id)
-                if group_id in self.group_users_cache:
-                    self.group_users_cache[group_id].remove(user_id)
+                self._cache_remove_member(self.user_groups_cache, _key(user_id), _key(group_id))
+                self._cache_remove_member(self.group_users_cache, _key(group_id), _key(user_id))
                 return True
             return False
+    def _get_users_from_db(self, user_ids: List[str]) -> List[UserBase]:
+        users = []
+        with self.pool.connection() as conn:
+            for chunk in _chunks(user_ids):
+                placeholders = ','.join('?' * len(chunk))
+                cursor = conn.execute(f'SELECT {USER_COLUMNS} FROM users WHERE id IN ({placeholders})', chunk)
+                users.extend(_row_to_user(row) for row in cursor.fetchall())
+        return users
+
+    def _get_groups_from_db(self, group_ids: List[str]) -> List[GroupBase]:
+        groups = []
+        with self.pool.connection() as conn:
+            for chunk in _chunks(group_ids):
+                placeholders = ','.join('?' * len(chunk))
+                cursor = conn.execute(f'SELECT group_id, group_name FROM groups WHERE group_id IN ({placeholders})', chunk)
+                groups.extend(_group_adapter.validate_python(dict(row)) for row in cursor.fetchall())
+        return groups
+
+    def _get_group_members_from_db(self, group_id: str, limit: Optional[int], offset: int) -> List[UserBase]:
+        columns = ', '.join(f'u.{column.strip()}' for column in USER_COLUMNS.split(','))
+        with self.pool.connection() as conn:
+            cursor = conn.execute(f'''
+                SELECT {columns}
+                FROM user_groups ug
+                JOIN users u ON u.id = ug.user_id
+                WHERE ug.group_id = ?
+                ORDER BY u.id
+                LIMIT ? OFFSET ?''', (group_id, -1 if limit is None else limit, offset))
+            return [_row_to_user(row) for row in cursor.fetchall()]
+
+    def _get_member_groups_from_db(self, user_id: str, limit: Optional[int], offset: int) -> List[GroupBase]:
+        with self.pool.connection() as conn:
+            cursor = conn.execute('''
+                SELECT g.group_id, g.group_name
+                FROM user_groups ug
+                JOIN groups g ON g.group_id = ug.group_id
+                WHERE ug.user_id = ?
+                ORDER BY g.group_id
+                LIMIT ? OFFSET ?''', (user_id, -1 if limit is None else limit, offset))
+            return [_group_adapter.validate_python(dict(row)) for row in cursor.fetchall()]
+
+    def get_users_by_ids(self, user_ids: List[str]) -> List[UserBase]:
+        """Users for ``user_ids`` in the given order; cache misses are fetched in one query per 900 ids."""
+        self.sync_caches()
+        found: Dict[str, UserBase] = {}
+        missing = []
+        for user_id in dict.fromkeys(_key(user_id) for user_id in user_ids):
+            user = self.users_cache.get(user_id)
+            if user is None:
+                missing.append(user_id)
+            elif user is not NEGATIVE:
+                found[user_id] = user
+        if missing:
+            for user in self._get_users_from_db(missing):
+                found[_key(user.id)] = user
+                self.users_cache.set(_key(user.id), user)
+            for user_id in missing:
+                if user_id not in found:
+                    self.users_cache.set(user_id, NEGATIVE)
+        return [found[_key(user_id)] for user_id in user_ids if _key(user_id) in found]
+
+    def get_groups_by_ids(self, group_ids: List[str]) -> List[GroupBase]:
+        """Groups for ``group_ids`` in the given order; cache misses are fetched in one query per 900 ids."""
+        self.sync_caches()
+        found: Dict[str, GroupBase] = {}
+        missing = []
+        for group_id in dict.fromkeys(_key(group_id) for group_id in group_ids):
+            group = self.groups_cache.get(group_id)
+            if group is None:
+                missing.append(group_id)
+            else:
+                found[group_id] = group
+        if missing:
+            for group in self._get_groups_from_db(missing):
+                found[_key(group.group_id)] = group
+                self.groups_cache.set(_key(group.group_id), group)
+        return [found[_key(group_id)] for group_id in group_ids if _key(group_id) in found]
+
+    def _change_group_members(self, group_id: str, add_ids: Iterable[str] = (), remove_ids: Iterable[str] = (),
+                              replace: bool = False, check_group: bool = True) -> Tuple[List[str], List[str]]:
+        """
+        Apply a membership diff for one group in a single transaction and patch the caches
+        once at the end. With ``replace`` the group ends up with exactly ``add_ids``.
+        Ids of users that don't exist are never added. Returns ``(added, removed)``.
+        ``check_group=False`` skips the groups lookup, for shards whose groups live in a catalog db.
+        """
+        wanted = {_key(user_id) for user_id in add_ids}
+        unwanted = {_key(user_id) for user_id in remove_ids}
+        with self.pool.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            if check_group and conn.execute('SELECT 1 FROM groups WHERE group_id = ?', (group_id,)).fetchone() is None:
+                return [], []
+            current = {_key(row[0]) for row in conn.execute('SELECT user_id FROM user_groups WHERE group_id = ?', (group_id,))}
+            to_add = wanted - current
+            to_remove = (current - wanted) if replace else (unwanted & current)
+            existing = set()
+            for chunk in _chunks(list(to_add)):
+                placeholders = ','.join('?' * len(chunk))
+                existing.update(_key(row[0]) for row in conn.execute(f'SELECT id FROM users WHERE id IN ({placeholders})', chunk))
+            to_add &= existing
+            conn.executemany('INSERT OR IGNORE INTO user_groups (user_id, group_id) VALUES (?, ?)',
+                             [(user_id, group_id) for user_id in to_add])
+            conn.executemany('DELETE FROM user_groups WHERE user_id = ? AND group_id = ?',
+                             [(user_id, group_id) for user_id in to_remove])
+            self.invalidation_log.record_many(conn, [('membership', user_id, group_id) for user_id in to_add | to_remove])
+            conn.commit()
+
+        group_key = _key(group_id)
+        with self._cache_lock:
+            members = self.group_users_cache.peek(group_key)
+            if members is not None:
+                self.group_users_cache.set(group_key, [m for m in members if m not in to_remove] + sorted(to_add - set(members)))
+            for user_id in to_add:
+                self._cache_add_member(self.user_groups_cache, user_id, group_key)
+            for user_id in to_remove:
+                self._cache_remove_member(self.user_groups_cache, user_id, group_key)
+        return sorted(to_add, key=int), sorted(to_remove, key=int)
+
+    def add_users_to_group(self, group_id: str, user_ids: List[str]) -> List[str]:
+        """Add many users in one transaction; returns the ids that were actually added."""
+        added, _ = self._change_group_members(group_id, add_ids=user_ids)
+        return added
+
+    def remove_users_from_group(self, group_id: str, user_ids: List[str]) -> List[str]:
+        """Remove many users in one transaction; returns the ids that were actually removed."""
+        _, removed = self._change_group_members(group_id, remove_ids=user_ids)
+        return removed
+
+    def sync_group_members(self, group_id: str, user_ids: List[str]) -> Dict[str, List[str]]:
+        """Make ``user_ids`` the exact member list, writing only the difference."""
+        added, removed = self._change_group_members(group_id, add_ids=user_ids, replace=True)
+        return {'added': added, 'removed': removed}
+
     # done
-    def get_user_groups(self, user_id: str) -> List[dict]:
-        if user_id not in self.user_groups_cache:
-            self.user_groups_cache[user_id] = self._get_user_groups_from_db(user_id)
-        
-        return [self.get_group_by_id(group_id) for group_id in self.user_groups_cache[user_id]]
+    def get_user_groups(self, user_id: str, limit: Optional[int] = None, offset: int = 0) -> List[dict]:
+        self.sync_caches()
+        group_ids = self.user_groups_cache.get(_key(user_id))
+        if group_ids is None:
+            # cold: one JOIN for the page, and remember the full membership list when we have it
+            groups = self._get_member_groups_from_db(user_id, limit, offset)
+            for group in groups:
+                self.groups_cache.set(_key(group.group_id), group)
+            if limit is None and offset == 0:
+                self.user_groups_cache.setdefault(_key(user_id), [_key(group.group_id) for group in groups])
+            return groups
+        # iterate over a snapshot so concurrent membership changes don't break the loop
+        page = list(group_ids)[offset:None if limit is None else offset + limit]
+        return self.get_groups_by_ids(page)
     # done
-    def get_group_users(self, group_id: str) -> List[dict]:
-        if group_id not in self.group_users_cache:
-            self.group_users_cache[group_id] = self._get_group_users_from_db(group_id)
-        
-        return [self.get_user_by_id(user_id) for user_id in self.group_users_cache[group_id]]
+    def get_group_users(self, group_id: str, limit: Optional[int] = None, offset: int = 0) -> List[dict]:
+        self.sync_caches()
+        user_ids = self.group_users_cache.get(_key(group_id))
+        if user_ids is None:
+            users = self._get_group_members_from_db(group_id, limit, offset)
+            for user in users:
+                self.users_cache.set(_key(user.id), user)
+            if limit is None and offset == 0:
+                self.group_users_cache.setdefault(_key(group_id), [_key(user.id) for user in users])
+            return users
+        page = list(user_ids)[offset:None if limit is None else offset + limit]
+        return self.get_users_by_ids(page)
     # done
     def get_group_by_id(self, group_id: str) -> Optional[dict]:
-        if group_id not in self.groups_cache:
+        self.sync_caches()
+        group = self.groups_cache.get(_key(group_id))
+        if group is None:
             group = self._get_group_from_db(group_id)
             if group:
-                self.groups_cache[group_id] = group
+                self.groups_cache.set(_key(group_id), group)
             else:
                 return None
-        return self.groups_cache[group_id]
+        return group
 
     # Done
     def get_user_by_id(self, user_id: str) -> Optional[UserBase]:
-        if user_id not in self.users_cache:
+        self.sync_caches()
+        user = self.users_cache.get(_key(user_id))
+        if user is NEGATIVE:
+            return None
+        if user is None:
             user = self._get_user_from_db(user_id)
             if user:
-                self.users_cache[user_id] = user
+                self.users_cache.set(_key(user_id), user)
             else:
+                self.users_cache.set(_key(user_id), NEGATIVE)
                 return None
         return user
     # Done
     def get_group_by_name(self, group_name: str) -> Optional[GroupBase]:
+        self.sync_caches()
         # This operation requires a full DB scan if not in cache
         for group in self.groups_cache.values():
-            if group['group_name'] == group_name:
+            if group.group_name == group_name:
                 return group
         
-        with sqlite3.connect(self.db_file) as conn:
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT group_id, group_name FROM groups WHERE group_name = ?', (group_name,))
             result = cursor.fetchone()
             if result:
                 group = GroupBase(group_id=result[0],group_name=result[1])
-                self.groups_cache[group['group_id']] = group
+                self.groups_cache.set(_key(group.group_id), group)
                 return group
         return None
     # done
     def get_user_by_username(self, username: str) -> Optional[UserBase]:
+        self.sync_caches()
         # This operation requires a full DB scan if not in cache
         for user in self.users_cache.values():
-            if user['username'] == username:
+            if user.username == username:
                 return user
         
-        with sqlite3.connect(self.db_file) as conn:
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                SELECT id, username, email, full_name, bio, profile_picture_url, 
-                       status, is_active, is_verified, phone_number, password_hash, 
-                       last_seen, created_at, updated_at
+            cursor.execute(f'''
+                SELECT {USER_COLUMNS}
                 FROM users 
                 WHERE username = ?'''
-                , (username))
+                , (username,))
             result = cursor.fetchone()
             if result:
-                user_dict = dict(result)
-                # Convert integer boolean fields to Python booleans
-                user_dict['is_active'] = bool(user_dict['is_active'])
-                user_dict['is_verified'] = bool(user_dict['is_verified'])
-                # Convert string timestamps to datetime objects
-                for field in ['last_seen', 'created_at', 'updated_at']:
-                    if user_dict[field]:
-                        user_dict[field] = datetime.fromisoformat(user_dict[field])
-                
-                # Use TypeAdapter to validate and create a User instance
-                user_adapter = TypeAdapter(UserBase)
-                return user_adapter.validate_python(user_dict)
+                return _row_to_user(result)
             return None
     def get_user_by_email_and_provider(self,email:str,auth_provider:str)-> Optional[UserBase]:
-        with sqlite3.connect(self.db_file) as conn:    
-            conn.row_factory = sqlite3.Row
+        with self.pool.connection() as conn:    
             cursor = conn.cursor()
-            cursor.execute('''
-            SELECT id, username, email, full_name, background_information, profile_picture_url,
-                status, is_active, is_verified, phone_number, password_hash,
-                last_seen, created_at, updated_at
+            cursor.execute(f'''
+            SELECT {USER_COLUMNS}
             FROM users
             WHERE email = ? AND auth_provider = ? ''',
             (email,auth_provider))
             result = cursor.fetchone()
             if result:
-                user_dict = dict(result)
-                # Convert integer boolean fields to Python booleans
-                user_dict['is_active'] = bool(user_dict['is_active'])
-                user_dict['is_verified'] = bool(user_dict['is_verified'])
-                # Convert string timestamps to datetime objects
-                for field in ['last_seen', 'created_at', 'updated_at']:
-                    if user_dict[field]:
-                        user_dict[field] = datetime.fromisoformat(user_dict[field])
-                user_adapter = TypeAdapter(UserBase)
-                return user_adapter.validate_python(user_dict)
+                return _row_to_user(result)
             return None
                 
         
     
     # Done
     def delete_group(self, group_id: str) -> bool:
-        with sqlite3.connect(self.db_file) as conn:
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM user_groups WHERE group_id = ?', (group_id,))
             cursor.execute('DELETE FROM groups WHERE group_id = ?', (group_id,))
+            if cursor.rowcount > 0:
+                self.invalidation_log.record(conn, 'group', group_id)
             conn.commit()
             if cursor.rowcount > 0:
                 # Update cache
-                self.groups_cache.pop(group_id, None)
-                self.group_users_cache.pop(group_id, None)
-                for user_groups in self.user_groups_cache.values():
-                    if group_id in user_groups:
-                        user_groups.remove(group_id)
+                with self._cache_lock:
+                    self.groups_cache.pop(_key(group_id), None)
+                    self.group_users_cache.pop(_key(group_id), None)
+                    for user_groups in self.user_groups_cache.values():
+                        if _key(group_id) in user_groups:
+                            user_groups.remove(_key(group_id))
                 return True
             return False
     # Done
     def delete_user(self, user_id: str) -> bool:
-        with sqlite3.connect(self.db_file) as conn:
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM user_groups WHERE user_id = ?', (user_id,))
-            cursor.execute('DELETE FROM users WHERE user_id = ?', (user_id,))
+            cursor.execute('DELETE FROM users WHERE id = ?', (user_id,))
+            if cursor.rowcount > 0:
+                revoked_at = revocation_time()
+                self.invalidation_log.record(conn, 'user', user_id)
+                self.invalidation_log.record(conn, 'tokens', user_id, revoked_at)
             conn.commit()
             if cursor.rowcount > 0:
+                self._announce('tokens', user_id, revoked_at)
                 # Update cache
-                self.users_cache.pop(user_id, None)
-                self.user_groups_cache.pop(user_id, None)
-                for group_users in self.group_users_cache.values():
-                    if user_id in group_users:
-                        group_users.remove(user_id)
+                with self._cache_lock:
+                    self.users_cache.pop(_key(user_id), None)
+                    self.user_groups_cache.pop(_key(user_id), None)
+                    self.user_roles_cache.pop(_key(user_id), None)
+                    for group_users in self.group_users_cache.values():
+                        if _key(user_id) in group_users:
+                            group_users.remove(_key(user_id))
                 return True
             return False
-# We need to se if this need to come into play later  
     def get_user_last_seen_online(self, user_id: str) -> str:
             """
-            Get the last_seen_online timestamp for a given user_id.
+            Get the last_seen timestamp for a given user_id.
             
             :param user_id: The ID of the user
-            :return: The last seen timestamp as a string, or None if user not found
+            :return: The last seen timestamp as a string (UTC), or None if user not found
             """
-            with sqlite3.connect(self.db_file) as conn:
+            # a pending write-behind update is newer than what the db holds
+            last_seen = self.last_seen_buffer.get(_key(user_id))
+            if last_seen is not None:
+                return last_seen
+            with self.pool.connection() as conn:
                 cursor = conn.cursor()
                 try:
                     cursor.execute('''
-                    SELECT last_seen_online 
+                    SELECT last_seen 
                     FROM users 
-                    WHERE user_id = ?
+                    WHERE id = ?
                     ''', (user_id,))
                     
                     result = cursor.fetchone()
@@ -320,151 +656,391 @@ class GroupManagerSQLite:
 
     def set_user_last_seen_online(self, user_id: str) -> bool:
             """
-            Set the last_seen_online timestamp for a given user_id to the current time.
+            Set the last_seen timestamp for a given user_id to the current time.
+
+            The update is buffered and written by flush_last_seen, so calling this on every
+            request costs no db write. Updates for users that don't exist are dropped at flush.
             
             :param user_id: The ID of the user
-            :return: True if successful, False if user not found
+            :return: True once the update is recorded
             """
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                try:
-                    cursor.execute('''
-                    UPDATE users 
-                    SET last_seen_online = ? 
-                    WHERE user_id = ?
-                    ''', (datetime.now().replace(microsecond=0), user_id))
-                    
-                    if cursor.rowcount == 0:
-                        print(f"User with ID {user_id} not found.")
-                        return False
-                    
-                    return True
-                except sqlite3.Error as e:
-                    print(f"An error occurred: {e}")
-                    return False
-    
-    def get_user_roles(self,user_id:str)->Set[str]:
-        with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                try:
-                    query = """
-                    SELECT DISTINCT r.name AS role_name
-                    FROM user_roles ur
-                    JOIN roles r ON ur.role_id = r.id
-                    WHERE ur.user_id = ?
-                    """
+            if self.record_last_seen(user_id):
+                self.flush_last_seen()
+            return True
 
-                    cursor.execute(query, (user_id,))
-                    results = cursor.fetchall()
-                    roles = set()
-                    for (role,) in results:
-                        roles.add(role)
-                    return roles
-                except sqlite3.Error as e:
-                    print(f"An error occurred: {e}")
-                    return False
+    def record_last_seen(self, user_id: str) -> bool:
+        """Buffer a last_seen update without touching the db; True once a flush is due."""
+        # same format as CURRENT_TIMESTAMP, the column default
+        now = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        return self.last_seen_buffer.record(_key(user_id), now)
+
+    def flush_last_seen(self) -> int:
+        """Write all buffered last_seen updates with one executemany; returns how many."""
+        pending = self.last_seen_buffer.drain()
+        if not pending:
+            return 0
+        try:
+            with self.pool.connection() as conn:
+                conn.executemany('UPDATE users SET last_seen = ? WHERE id = ?', pending)
+                conn.commit()
+        except sqlite3.Error as e:
+            # keep them for the next flush
+            self.last_seen_buffer.restore(pending)
+            print(f"An error occurred while flushing last_seen updates: {e}")
+            return 0
+        self.last_seen_buffer.flushed += len(pending)
+        return len(pending)
+
+    def get_user_roles(self,user_id:str)->Set[str]:
+        self.sync_caches()
+        roles = self.user_roles_cache.get(_key(user_id))
+        if roles is not None:
+            return set(roles)
+        with self.pool.connection() as conn:
+            try:
+                return set(self._load_user_roles(conn, user_id))
+            except sqlite3.Error as e:
+                print(f"An error occurred: {e}")
+                return False
     def create_refresh_token(self,user_id:str)-> Dict:
         refresh_token = secrets.token_urlsafe(32)
         expires = datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
     
-        with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                expires = datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-    
+        with self.pool.connection() as conn:
                 try:
+                    # Only a digest is stored; the raw token exists on the client alone
+                    # Every login starts a new token family; rotations stay in it
                     query = """
-                        INSERT INTO refresh_tokens (token, user_id, expires) VALUES (?, ?, ?)
+                        INSERT INTO refresh_tokens (token_hash, user_id, expires, family_id) VALUES (?, ?, ?, ?)
                     """
                     cursor = conn.cursor()
-                    cursor.execute(query, (refresh_token,user_id,expires))
+                    cursor.execute(query, (hash_refresh_token(refresh_token),str(user_id),int(expires.timestamp()),uuid.uuid4().hex))
                     conn.commit()
                     return {'refresh_token':refresh_token,'user_id':user_id,'expires':expires}
                 except sqlite3.Error as e:
                     print(f"An error occurred: {e}")
                     return False
     def get_refresh_token(self,token: str)-> Dict:
-            with sqlite3.connect(self.db_file) as conn:
+            with self.pool.connection() as conn:
                 try:
                     cursor = conn.cursor()
-                    cursor.execute("SELECT user_id, expires FROM refresh_tokens WHERE token = ?", (token,))
+                    cursor.execute("SELECT user_id, expires FROM refresh_tokens WHERE token_hash = ? AND used = 0", (hash_refresh_token(token),))
                     result = cursor.fetchone()
                     if result:
-                        user_id, expires_str = result
-                        expires = datetime.fromisoformat(expires_str)
+                        user_id, expires_at = result
+                        expires = datetime.fromtimestamp(expires_at, timezone.utc)
                         return {"user_id": user_id, "expires": expires}
                     return None
                 except sqlite3.Error as e:
                     print(f"An error occurred: {e}")
                     return False
     def delete_refresh_token(self,token:str):
-        with sqlite3.connect(self.db_file) as conn:
+        with self.pool.connection() as conn:
                 try:
                     cursor = conn.cursor()
-                    cursor.execute("DELETE FROM refresh_tokens WHERE token = ?", (token,))
+                    cursor.execute("DELETE FROM refresh_tokens WHERE token_hash = ?", (hash_refresh_token(token),))
                     conn.commit()
                     return token
                 except sqlite3.Error as e:
                     print(f"An error occurred: {e}")
                     return False
 
+    def rotate_refresh_token(self, token: str) -> Dict:
+        """
+        Consume ``token`` and issue its successor in one BEGIN IMMEDIATE transaction.
+
+        Returns ``{'status': 'ok', 'user', 'roles', 'refresh_token', 'expires'}`` or a
+        status of 'invalid', 'expired', 'user_not_found' or 'reused'. A rotated token is
+        kept (marked used) until it expires; presenting it again means it leaked, so
+        the whole family is revoked. Two concurrent refreshes of the same token are
+        serialized by the write lock, so at most one of them succeeds.
+        """
+        now = datetime.now(timezone.utc)
+        token_hash = hash_refresh_token(token)
+        with self.pool.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT user_id, expires, family_id, used FROM refresh_tokens WHERE token_hash = ?',
+                               (token_hash,)).fetchone()
+            if row is None:
+                return {'status': 'invalid'}
+            if row['used']:
+                conn.execute('DELETE FROM refresh_tokens WHERE family_id = ?', (row['family_id'],))
+                # the access tokens minted from the leaked family are suspect too
+                revoked_at = revocation_time()
+                self.invalidation_log.record(conn, 'tokens', row['user_id'], revoked_at)
+                conn.commit()
+                self._announce('tokens', row['user_id'], revoked_at)
+                print(f"Refresh token reuse detected for user {row['user_id']}, revoked token family {row['family_id']}")
+                return {'status': 'reused'}
+            if row['expires'] < now.timestamp():
+                conn.execute('DELETE FROM refresh_tokens WHERE token_hash = ?', (token_hash,))
+                conn.commit()
+                return {'status': 'expired'}
+
+            user = self.users_cache.peek(_key(row['user_id']))
+            if user is None or user is NEGATIVE:
+                result = conn.execute(f'SELECT {USER_COLUMNS} FROM users WHERE id = ?', (row['user_id'],)).fetchone()
+                user = _row_to_user(result) if result else None
+            if user is None:
+                conn.execute('DELETE FROM refresh_tokens WHERE family_id = ?', (row['family_id'],))
+                conn.commit()
+                return {'status': 'user_not_found'}
+            roles = self.user_roles_cache.get(_key(user.id))
+            roles = set(roles if roles is not None else self._load_user_roles(conn, user.id))
+
+            new_token = secrets.token_urlsafe(32)
+            expires = now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+            conn.execute('UPDATE refresh_tokens SET used = 1 WHERE token_hash = ?', (token_hash,))
+            conn.execute('INSERT INTO refresh_tokens (token_hash, user_id, expires, family_id) VALUES (?, ?, ?, ?)',
+                         (hash_refresh_token(new_token), row['user_id'], int(expires.timestamp()), row['family_id']))
+            conn.commit()
+        return {'status': 'ok', 'user': user, 'roles': roles, 'refresh_token': new_token, 'expires': expires}
+
+    def revoke_all_refresh_tokens_for_user(self, user_id: str) -> int:
+        """Delete every refresh token of ``user_id`` (uses idx_refresh_tokens_user_id); returns how many."""
+        with self.pool.connection() as conn:
+            cursor = conn.execute("DELETE FROM refresh_tokens WHERE user_id = ?", (str(user_id),))
+            revoked_at = revocation_time()
+            self.invalidation_log.record(conn, 'tokens', user_id, revoked_at)
+            conn.commit()
+        self._announce('tokens', user_id, revoked_at)
+        return cursor.rowcount
+
+    def delete_expired_refresh_tokens(self, batch_size: int = 500) -> int:
+        """
+        Delete at most ``batch_size`` expired refresh tokens in one short transaction.
+        Callers loop until it returns less than ``batch_size`` so the write lock is
+        never held for long.
+        """
+        with self.pool.connection() as conn:
+            cursor = conn.execute("""
+                DELETE FROM refresh_tokens WHERE rowid IN (
+                    SELECT rowid FROM refresh_tokens WHERE expires < ? LIMIT ?
+                )""", (int(datetime.now(timezone.utc).timestamp()), batch_size))
+            conn.commit()
+            return cursor.rowcount
+
     def assign_roles(self,user_id, roles):
         # Connect to the SQLite database
-        with sqlite3.connect(self.db_file) as conn:
+        with self.pool.connection() as conn:
                 try:
                     cursor = conn.cursor()
                     # Start a transaction
                     cursor.execute("BEGIN TRANSACTION")
 
                     # Get current roles for the user
-                    cursor.execute("SELECT r.name FROM user_roles ur JOIN roles r ON ur.role_id = r.id WHERE ur.user_id = ?", (user_id,))
-                    current_roles = set(role[0] for role in cursor.fetchall())
+                    current_roles = self._load_user_roles(conn, user_id)
 
                     # Determine roles to add and remove
                     new_roles = set(roles)
                     roles_to_add = new_roles - current_roles
                     roles_to_remove = current_roles - new_roles
 
+                    # Role ids come from the in-memory table, reloaded once if a name is missing
+                    role_ids = self._role_table(conn)
+                    if not roles_to_add <= role_ids.keys():
+                        role_ids = self._role_table(conn, reload=True)
+                    for role in roles_to_add - role_ids.keys():
+                        print(f"Warning: Role '{role}' not found in the database.")
                     # Add new roles
-                    for role in roles_to_add:
-                        cursor.execute("SELECT id FROM roles WHERE name = ?", (role,))
-                        result = cursor.fetchone()
-                        if result:
-                            role_id = result[0]
-                            cursor.execute("""
-                                INSERT OR IGNORE INTO user_roles (user_id, role_id) 
-                                VALUES (?, ?)
-                            """, (user_id, role_id))
-                        else:
-                            print(f"Warning: Role '{role}' not found in the database.")
+                    cursor.executemany("""
+                        INSERT OR IGNORE INTO user_roles (user_id, role_id) 
+                        VALUES (?, ?)
+                    """, [(user_id, role_ids[role]) for role in roles_to_add if role in role_ids])
+                    if roles_to_add:
+                        revoked_at = revocation_time()
+                        self.invalidation_log.record(conn, 'roles', user_id, revoked_at)
 
                     # Commit the transaction
                     conn.commit()
+                    if roles_to_add:
+                        self._announce('roles', user_id, revoked_at)
                     print(f"Successfully upserted roles for user {user_id}")
 
                 except sqlite3.Error as e:
                     # If there's an error, roll back the changes
                     conn.rollback()
                     print(f"An error occurred: {e}")
+                finally:
+                    # re-read on next use, after the commit (or the rollback)
+                    self.user_roles_cache.pop(_key(user_id), None)
 
     def get_roles(self,user_id):
-        # Connect to the SQLite database
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
+        roles = self.get_user_roles(user_id)
+        return list(roles) if roles else []
 
-            try:
-                # Query to get user roles
-                cursor.execute("""
-                    SELECT r.name 
-                    FROM user_roles ur
-                    JOIN roles r ON ur.role_id = r.id
-                    WHERE ur.user_id = ?
-                """, (user_id,))
-                
-                # Fetch all roles
-                roles = [role[0] for role in cursor.fetchall()]
-                
-                return roles
+    def bulk_create_users(self, entries: List[Tuple[UserCreate, List[str], List[str]]]) -> List[Optional[str]]:
+        """
+        Insert ``(user, roles, group_names)`` entries in one transaction.
 
-            except sqlite3.Error as e:
-                print(f"An error occurred: {e}")
-                return []
+        Users, role assignments and memberships are written with executemany; missing groups
+        are created. Returns one item per entry: None if it was imported, else the reason
+        it was skipped. A bad row never aborts the batch.
+        """
+        errors: List[Optional[str]] = [None] * len(entries)
+        with self.pool.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            role_ids = {name: role_id for role_id, name in conn.execute('SELECT id, name FROM roles')}
+
+            # Reject rows that can't be imported before touching the users table
+            identity = lambda user: (user.email, user.auth_provider)
+            emails = list({user.email for user, _, _ in entries})
+            existing = set()
+            for chunk in _chunks(emails):
+                placeholders = ','.join('?' * len(chunk))
+                existing.update(tuple(row) for row in conn.execute(
+                    f'SELECT email, auth_provider FROM users WHERE email IN ({placeholders})', chunk))
+            seen = set()
+            for index, (user, roles, _) in enumerate(entries):
+                unknown_roles = [role for role in roles if role not in role_ids]
+                if identity(user) in existing:
+                    errors[index] = f"user {user.email} ({user.auth_provider}) already exists"
+                elif identity(user) in seen:
+                    errors[index] = f"duplicate of an earlier row for {user.email} ({user.auth_provider})"
+                elif unknown_roles:
+                    errors[index] = f"unknown roles: {', '.join(unknown_roles)}"
+                seen.add(identity(user))
+            accepted = [index for index, error in enumerate(errors) if error is None]
+
+            # BEGIN IMMEDIATE holds the write lock, so every id above this one is ours
+            max_id_before = conn.execute('SELECT COALESCE(MAX(id), 0) FROM users').fetchone()[0]
+            conn.executemany('''
+                INSERT OR IGNORE INTO users (username, email, password_hash, full_name, background_information, profile_picture_url, phone_number, auth_provider)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(user.username, user.email, user.password_hash, user.full_name, user.background_information,
+                   user.profile_picture_url, user.phone_number, user.auth_provider)
+                  for user, _, _ in (entries[index] for index in accepted)])
+            new_ids = {(row['email'], row['auth_provider']): row['id'] for row in conn.execute(
+                'SELECT id, email, auth_provider FROM users WHERE id > ?', (max_id_before,))}
+
+            group_names = {name for index in accepted for name in entries[index][2]}
+            conn.executemany('INSERT OR IGNORE INTO groups (group_name) VALUES (?)', [(name,) for name in group_names])
+            group_ids = {}
+            for chunk in _chunks(list(group_names)):
+                placeholders = ','.join('?' * len(chunk))
+                group_ids.update((row['group_name'], row['group_id']) for row in conn.execute(
+                    f'SELECT group_id, group_name FROM groups WHERE group_name IN ({placeholders})', chunk))
+
+            user_roles, memberships = [], []
+            for index in accepted:
+                user, roles, groups = entries[index]
+                user_id = new_ids.get(identity(user))
+                if user_id is None:
+                    errors[index] = f"conflict inserting {user.email}, username {user.username!r} may already be taken"
+                    continue
+                user_roles.extend((user_id, role_ids[role]) for role in set(roles))
+                memberships.extend((user_id, group_ids[name]) for name in set(groups))
+            conn.executemany('INSERT OR IGNORE INTO user_roles (user_id, role_id) VALUES (?, ?)', user_roles)
+            conn.executemany('INSERT OR IGNORE INTO user_groups (user_id, group_id) VALUES (?, ?)', memberships)
+            self.invalidation_log.record_many(
+                conn,
+                [('user', user_id, None) for user_id in new_ids.values()]
+                + [('membership', user_id, group_id) for user_id, group_id in memberships],
+            )
+            conn.commit()
+
+        # New ids may sit in the cache as NEGATIVE, and cached member lists are now short
+        with self._cache_lock:
+            for user_id in new_ids.values():
+                self.users_cache.pop(_key(user_id), None)
+                self.user_roles_cache.pop(_key(user_id), None)
+            for group_id in {group_id for _, group_id in memberships}:
+                self.group_users_cache.pop(_key(group_id), None)
+        return errors
+
+    def get_role_permission_graph(self, role: Optional[str] = None) -> Dict[str, Set[str]]:
+        """role name -> permission names, for every role (or just ``role``)."""
+        with self.pool.connection() as conn:
+            query = '''
+                SELECT r.name AS role_name, p.name AS permission_name
+                FROM roles r
+                LEFT JOIN role_permissions rp ON rp.role_id = r.id
+                LEFT JOIN permissions p ON p.id = rp.permission_id'''
+            params = ()
+            if role is not None:
+                query += ' WHERE r.name = ?'
+                params = (role,)
+            graph: Dict[str, Set[str]] = {}
+            for row in conn.execute(query, params):
+                permissions = graph.setdefault(row['role_name'], set())
+                if row['permission_name'] is not None:
+                    permissions.add(row['permission_name'])
+            return graph
+
+    def get_permission_names(self) -> List[str]:
+        with self.pool.connection() as conn:
+            return [row[0] for row in conn.execute('SELECT name FROM permissions ORDER BY id')]
+
+    def create_permission(self, name: str, description: Optional[str] = None) -> bool:
+        with self.pool.connection() as conn:
+            cursor = conn.execute('INSERT OR IGNORE INTO permissions (name, description) VALUES (?, ?)', (name, description))
+            if cursor.rowcount > 0:
+                self.invalidation_log.record(conn, 'permission', name)
+            conn.commit()
+            return cursor.rowcount > 0
+
+    def grant_permission(self, role: str, permission: str) -> bool:
+        """Give ``role`` the ``permission``; False if either doesn't exist or it was already granted."""
+        with self.pool.connection() as conn:
+            cursor = conn.execute('''
+                INSERT OR IGNORE INTO role_permissions (role_id, permission_id)
+                SELECT r.id, p.id FROM roles r, permissions p WHERE r.name = ? AND p.name = ?''', (role, permission))
+            if cursor.rowcount > 0:
+                self.invalidation_log.record(conn, 'role_permissions', role)
+            conn.commit()
+            return cursor.rowcount > 0
+
+    def revoke_permission(self, role: str, permission: str) -> bool:
+        with self.pool.connection() as conn:
+            cursor = conn.execute('''
+                DELETE FROM role_permissions
+                WHERE role_id = (SELECT id FROM roles WHERE name = ?)
+                  AND permission_id = (SELECT id FROM permissions WHERE name = ?)''', (role, permission))
+            if cursor.rowcount > 0:
+                self.invalidation_log.record(conn, 'role_permissions', role)
+            conn.commit()
+            return cursor.rowcount > 0
+
+    def create_role(self, name: str, description: Optional[str] = None) -> bool:
+        with self.pool.connection() as conn:
+            cursor = conn.execute('INSERT OR IGNORE INTO roles (name, description) VALUES (?, ?)', (name, description))
+            if cursor.rowcount > 0:
+                self.invalidation_log.record(conn, 'role', name)
+            conn.commit()
+            if cursor.rowcount > 0 and self._role_ids is not None:
+                self._set_role_table({**self._role_ids, name: cursor.lastrowid})
+            return cursor.rowcount > 0
+
+    def get_role_inheritance(self) -> Dict[str, Set[str]]:
+        """role name -> names of the roles it directly inherits, for every role."""
+        with self.pool.connection() as conn:
+            graph: Dict[str, Set[str]] = {row[0]: set() for row in conn.execute('SELECT name FROM roles')}
+            for row in conn.execute('''
+                SELECT r.name AS role_name, i.name AS inherited_name
+                FROM role_inheritance ri
+                JOIN roles r ON r.id = ri.role_id
+                JOIN roles i ON i.id = ri.inherited_role_id'''):
+                graph[row['role_name']].add(row['inherited_name'])
+            return graph
+
+    def add_role_inheritance(self, role: str, inherited_role: str) -> bool:
+        """Make ``role`` imply ``inherited_role``; False if a role is unknown or it already did."""
+        with self.pool.connection() as conn:
+            cursor = conn.execute('''
+                INSERT OR IGNORE INTO role_inheritance (role_id, inherited_role_id)
+                SELECT r.id, i.id FROM roles r, roles i WHERE r.name = ? AND i.name = ?''', (role, inherited_role))
+            if cursor.rowcount > 0:
+                self.invalidation_log.record(conn, 'role_inheritance', role, inherited_role)
+            conn.commit()
+            return cursor.rowcount > 0
+
+    def remove_role_inheritance(self, role: str, inherited_role: str) -> bool:
+        with self.pool.connection() as conn:
+            cursor = conn.execute('''
+                DELETE FROM role_inheritance
+                WHERE role_id = (SELECT id FROM roles WHERE name = ?)
+                  AND inherited_role_id = (SELECT id FROM roles WHERE name = ?)''', (role, inherited_role))
+            if cursor.rowcount > 0:
+                self.invalidation_log.record(conn, 'role_inheritance', role, inherited_role)
+            conn.commit()
+            return cursor.rowcount > 0
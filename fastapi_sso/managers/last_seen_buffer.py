@@ -0,0 +1,49 @@
+import threading
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_MAX_PENDING = 1000
+
+
+class LastSeenBuffer:
+    """
+    Write-behind buffer for presence timestamps.
+
+    ``record`` keeps only the latest timestamp per user, so any number of requests by the
+    same user between two flushes cost one row update. ``drain`` hands the pending
+    updates to the writer and starts a new buffer; ``restore`` puts them back if the write
+    failed, without overwriting newer timestamps recorded in the meantime.
+    """
+
+    def __init__(self, max_pending: int = DEFAULT_MAX_PENDING) -> None:
+        self.max_pending = max_pending
+        self._pending: Dict[str, str] = {}  # user_id -> timestamp
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.flushed = 0
+
+    def record(self, user_id: str, timestamp: str) -> bool:
+        """Remember ``timestamp``; True once ``max_pending`` users are waiting to be flushed."""
+        with self._lock:
+            self._pending[user_id] = timestamp
+            self.recorded += 1
+            return len(self._pending) >= self.max_pending
+
+    def get(self, user_id: str) -> Optional[str]:
+        return self._pending.get(user_id)
+
+    def drain(self) -> List[Tuple[str, str]]:
+        """Pending ``(timestamp, user_id)`` pairs, ready for executemany."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return [(timestamp, user_id) for user_id, timestamp in pending.items()]
+
+    def restore(self, items: List[Tuple[str, str]]) -> None:
+        with self._lock:
+            for timestamp, user_id in items:
+                self._pending.setdefault(user_id, timestamp)
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def stats(self) -> Dict:
+        return {'pending': len(self._pending), 'recorded': self.recorded, 'flushed': self.flushed}
@@ -0,0 +1,140 @@
+import os
+import re
+import sqlite3
+import time
+from typing import Dict, Tuple
+
+from fastapi_sso.utils.metrics import DB_LOCK_ERRORS, DB_QUERY_SECONDS, DB_ROWS_RETURNED, CounterChild, HistogramChild
+
+# verb and table are enough to tell statements apart on a dashboard, and keep label values bounded
+# even for SQL built at runtime (IN lists of varying length)
+_VERB = re.compile(r'\s*(\w+)(?:\s+OR\s+\w+)?(?:\s+(\w+))?')
+_TABLE = re.compile(r'\b(?:FROM|INTO|TABLE)\s+(?:IF\s+(?:NOT\s+)?EXISTS\s+)?(\w+)', re.IGNORECASE)
+# SQL text -> label; statements are fixed strings in the code, this stays small
+_labels: Dict[str, str] = {}
+_MAX_LABELS = 4096
+
+
+def statement_label(sql: str) -> str:
+    label = _labels.get(sql)
+    if label is None:
+        match = _VERB.match(sql)
+        if match is None:
+            label = 'OTHER'
+        else:
+            verb = match.group(1).upper()
+            if verb == 'UPDATE':
+                table = match.group(2)
+            else:
+                found = _TABLE.search(sql) if verb != 'PRAGMA' else None
+                table = found.group(1) if found else None
+            label = f'{verb} {table}' if table else verb
+        if len(_labels) < _MAX_LABELS:
+            _labels[sql] = label
+    return label
+
+
+def _is_lock_error(error: sqlite3.OperationalError) -> bool:
+    message = str(error)
+    return 'locked' in message or 'busy' in message
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """
+    Connection whose statements are timed into the query metrics.
+
+    The metric children for each SQL string are resolved once per connection and kept,
+    so a query only pays for two clock reads and one histogram observe.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.metrics_db = os.path.basename(args[0] if args else kwargs['database'])
+        self._children: Dict[str, Tuple[HistogramChild, CounterChild, CounterChild]] = {}
+
+    def metric_children(self, sql: str) -> Tuple[HistogramChild, CounterChild, CounterChild]:
+        children = self._children.get(sql)
+        if children is None:
+            label = statement_label(sql)
+            children = (DB_QUERY_SECONDS.labels(self.metrics_db, label),
+                        DB_ROWS_RETURNED.labels(self.metrics_db, label),
+                        DB_LOCK_ERRORS.labels(self.metrics_db, label))
+            if len(self._children) < _MAX_LABELS:
+                self._children[sql] = children
+        return children
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or InstrumentedCursor)
+
+    # sqlite3.Connection.execute* build their cursor internally, bypassing cursor()
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, parameters):
+        return self.cursor().executemany(sql, parameters)
+
+    def commit(self) -> None:
+        started = time.perf_counter()
+        duration, _, lock_errors = self.metric_children('COMMIT')
+        try:
+            super().commit()
+        except sqlite3.OperationalError as e:
+            if _is_lock_error(e):
+                lock_errors.inc()
+            raise
+        finally:
+            duration.observe(time.perf_counter() - started)
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Times ``execute``/``executemany`` and counts the rows fetched from the result."""
+
+    _rows = None
+
+    def execute(self, sql, parameters=()):
+        duration, self._rows, lock_errors = self.connection.metric_children(sql)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        except sqlite3.OperationalError as e:
+            if _is_lock_error(e):
+                lock_errors.inc()
+            raise
+        finally:
+            duration.observe(time.perf_counter() - started)
+
+    def executemany(self, sql, parameters):
+        duration, self._rows, lock_errors = self.connection.metric_children(sql)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, parameters)
+        except sqlite3.OperationalError as e:
+            if _is_lock_error(e):
+                lock_errors.inc()
+            raise
+        finally:
+            duration.observe(time.perf_counter() - started)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None and self._rows is not None:
+            self._rows.inc()
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        if rows and self._rows is not None:
+            self._rows.inc(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        if rows and self._rows is not None:
+            self._rows.inc(len(rows))
+        return rows
+
+    def __next__(self):
+        row = super().__next__()
+        if self._rows is not None:
+            self._rows.inc()
+        return row
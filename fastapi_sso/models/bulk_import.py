@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+from typing import List
+
+class ImportRowError(BaseModel):
+    row: int  # 1-based position in the input, header excluded
+    error: str
+
+class ImportReport(BaseModel):
+    total_rows: int = 0
+    imported: int = 0
+    failed: int = 0
+    elapsed_seconds: float = 0.0
+    rows_per_second: float = 0.0
+    errors: List[ImportRowError] = []
@@ -0,0 +1,148 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, List, Optional, Set
+
+from fastapi_sso.models.user import UserBase, UserCreate
+from .group_management_service import GroupManagementService
+from .single_flight import SingleFlight
+
+DEFAULT_MAX_WORKERS = 5
+
+
+class AsyncGroupManagementService:
+    """
+    Awaitable facade over GroupManagementService.
+
+    Every call is handed to a bounded thread pool so blocking sqlite3 I/O (including
+    waits on the database lock) never runs on the event loop. Keep ``max_workers`` at or
+    below the connection pool size, otherwise workers just queue for a connection.
+    """
+
+    def __init__(self, service: GroupManagementService, max_workers: int = DEFAULT_MAX_WORKERS) -> None:
+        self.service = service
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='group-mgt')
+        # concurrent logins of the same user share one lookup-or-create
+        self.login_flights = SingleFlight()
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
+        self.service.close()
+
+    async def create_group(self, group_name: str) -> str:
+        return await self._run(self.service.create_group, group_name)
+
+    async def create_user(self, user: UserCreate) -> UserBase:
+        return await self._run(self.service.create_user, user)
+
+    async def get_or_create_user_with_roles(self, user: UserCreate, roles: List[str]) -> Dict:
+        """Single-flight per (auth_provider, email): two tabs or a retry logging in at once make one DB call."""
+        return await self.login_flights.do(
+            (user.auth_provider, user.email),
+            lambda: self._run(self.service.get_or_create_user_with_roles, user, roles),
+        )
+
+    async def add_user_to_group(self, user_id: str, group_id: str) -> bool:
+        return await self._run(self.service.add_user_to_group, user_id, group_id)
+
+    async def remove_user_from_group(self, user_id: str, group_id: str) -> bool:
+        return await self._run(self.service.remove_user_from_group, user_id, group_id)
+
+    async def add_users_to_group(self, group_id: str, user_ids: List[str]) -> List[str]:
+        return await self._run(self.service.add_users_to_group, group_id, user_ids)
+
+    async def remove_users_from_group(self, group_id: str, user_ids: List[str]) -> List[str]:
+        return await self._run(self.service.remove_users_from_group, group_id, user_ids)
+
+    async def sync_group_members(self, group_id: str, user_ids: List[str]) -> Dict[str, List[str]]:
+        return await self._run(self.service.sync_group_members, group_id, user_ids)
+
+    async def get_user_groups(self, user_id: str, limit: Optional[int] = None, offset: int = 0) -> List[dict]:
+        return await self._run(self.service.get_user_groups, user_id, limit=limit, offset=offset)
+
+    async def get_group_users(self, group_id: str, limit: Optional[int] = None, offset: int = 0) -> List[dict]:
+        return await self._run(self.service.get_group_users, group_id, limit=limit, offset=offset)
+
+    async def get_users_by_ids(self, user_ids: List[str]) -> List[UserBase]:
+        return await self._run(self.service.get_users_by_ids, user_ids)
+
+    async def get_groups_by_ids(self, group_ids: List[str]) -> List[dict]:
+        return await self._run(self.service.get_groups_by_ids, group_ids)
+
+    async def get_group_by_id(self, group_id: str) -> Optional[dict]:
+        return await self._run(self.service.get_group_by_id, group_id)
+
+    async def get_user_by_id(self, user_id: str) -> Optional[UserBase]:
+        return await self._run(self.service.get_user_by_id, user_id)
+
+    async def get_group_by_name(self, group_name: str) -> Optional[dict]:
+        return await self._run(self.service.get_group_by_name, group_name)
+
+    async def get_user_by_username(self, username: str) -> Optional[dict]:
+        return await self._run(self.service.get_user_by_username, username)
+
+    async def get_user_by_email_and_provider(self, email: str, auth_provider: str) -> Optional[UserBase]:
+        return await self._run(self.service.get_user_by_email_and_provider, email, auth_provider)
+
+    async def delete_group(self, group_id: str) -> bool:
+        return await self._run(self.service.delete_group, group_id)
+
+    async def delete_user(self, user_id: str) -> bool:
+        return await self._run(self.service.delete_user, user_id)
+
+    async def set_user_last_seen_online(self, user_id: str) -> bool:
+        return await self._run(self.service.set_user_last_seen_online, user_id)
+
+    async def get_user_last_seen_online(self, user_id: str) -> bool:
+        return await self._run(self.service.get_user_last_seen_online, user_id)
+
+    async def flush_last_seen(self) -> int:
+        return await self._run(self.service.flush_last_seen)
+
+    def touch_last_seen(self, user_id: str) -> None:
+        """
+        Record activity without waiting. The update only goes into the in-memory buffer;
+        a DB worker is used only when the buffer is full, otherwise the periodic flusher writes it.
+        """
+        if self.service.record_last_seen(user_id):
+            self.executor.submit(self.service.flush_last_seen)
+
+    async def get_user_roles(self, user_id: str) -> Set[str]:
+        return await self._run(self.service.get_user_roles, user_id)
+
+    async def create_refresh_token(self, user_id: str) -> Dict:
+        return await self._run(self.service.create_refresh_token, user_id)
+
+    async def get_refresh_token(self, token: str) -> Dict:
+        return await self._run(self.service.get_refresh_token, token)
+
+    async def delete_refresh_token(self, token: str):
+        return await self._run(self.service.delete_refresh_token, token)
+
+    async def rotate_refresh_token(self, token: str) -> Dict:
+        return await self._run(self.service.rotate_refresh_token, token)
+
+    async def revoke_all_refresh_tokens_for_user(self, user_id: str) -> int:
+        return await self._run(self.service.revoke_all_refresh_tokens_for_user, user_id)
+
+    async def delete_expired_refresh_tokens(self, batch_size: int = 500) -> int:
+        return await self._run(self.service.delete_expired_refresh_tokens, batch_size)
+
+    async def assign_roles(self, user_id: str, roles: List[str]):
+        return await self._run(self.service.assign_roles, user_id, roles)
+
+    async def get_roles(self, user_id: str) -> List[str]:
+        return await self._run(self.service.get_roles, user_id)
+
+    async def get_pool_stats(self) -> Dict:
+        return await self._run(self.service.get_pool_stats)
+
+    async def get_cache_stats(self) -> List[Dict]:
+        return await self._run(self.service.get_cache_stats)
+
+    async def sync_caches(self, force: bool = False) -> int:
+        return await self._run(self.service.sync_caches, force)
@@ -0,0 +1,89 @@
+import argparse
+import csv
+import json
+import os
+import sys
+from typing import Dict, Iterator, Optional
+
+from fastapi_sso.managers.group_manager_sharded import stored_shard_count
+from fastapi_sso.services.group_management_service import GroupManagementService
+
+# CSV cells holding several values, e.g. roles "USER;ADMIN"
+CSV_LIST_SEPARATOR = ';'
+
+
+def _split(value) -> list:
+    if value is None or value == '':
+        return []
+    if isinstance(value, list):
+        return value
+    return [item.strip() for item in str(value).split(CSV_LIST_SEPARATOR) if item.strip()]
+
+
+def read_rows(path: str, format: Optional[str] = None) -> Iterator[Dict]:
+    """
+    Stream user rows from a JSONL or CSV file (picked from the extension unless ``format``
+    is given). ``roles`` and ``groups`` may be lists (JSONL) or ';'-separated (CSV).
+    A line that is not valid JSON is yielded as ``{'_error': ...}`` so it is reported, not fatal.
+    """
+    format = format or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+    with open(path, newline='') as f:
+        if format == 'csv':
+            for row in csv.DictReader(f):
+                row = {key: value for key, value in row.items() if value != ''}
+                row['roles'] = _split(row.get('roles'))
+                row['groups'] = _split(row.get('groups'))
+                yield row
+        else:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield {'_error': f"invalid JSON: {e}"}
+                    continue
+                row['roles'] = _split(row.get('roles'))
+                row['groups'] = _split(row.get('groups'))
+                yield row
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk import users from a JSONL or CSV file.")
+    parser.add_argument('path', help="input file, .jsonl or .csv")
+    parser.add_argument('--db', default=os.environ.get('DB_FILE', '../db/user.db'), help="SQLite database file")
+    parser.add_argument('--backend', choices=['sqlite', 'sharded'], default=os.environ.get('STORAGE_BACKEND', 'sqlite'),
+                        help="storage backend, as STORAGE_BACKEND for the app")
+    parser.add_argument('--shards', type=int, default=int(os.environ.get('SHARD_COUNT', 4)),
+                        help="shard count of a sharded database, as SHARD_COUNT for the app")
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help="override format detection")
+    parser.add_argument('--chunk-size', type=int, default=1000, help="rows per transaction")
+    parser.add_argument('--default-role', action='append', default=None,
+                        help="role given to rows without roles (repeatable, default USER)")
+    parser.add_argument('--errors', help="write per-row errors as JSONL to this file")
+    args = parser.parse_args(argv)
+    # users written straight into a sharded catalog would stop GroupManagerSharded from starting
+    if args.backend == 'sqlite' and stored_shard_count(args.db) is not None:
+        parser.error(f"{args.db} is a sharded catalog; pass --backend sharded (or set STORAGE_BACKEND=sharded)")
+
+    def progress(report):
+        print(f"{report.total_rows} rows, {report.imported} imported, {report.failed} failed, "
+              f"{report.rows_per_second:.0f} rows/s", file=sys.stderr)
+
+    backend_options = {'shard_count': args.shards} if args.backend == 'sharded' else {}
+    service = GroupManagementService(args.db, backend=args.backend, **backend_options)
+    try:
+        report = service.import_users(read_rows(args.path, args.format), chunk_size=args.chunk_size,
+                                      default_roles=args.default_role or ['USER'], progress=progress)
+    finally:
+        service.close()
+    if args.errors:
+        with open(args.errors, 'w') as f:
+            for error in report.errors:
+                f.write(error.model_dump_json() + '\n')
+    print(report.model_dump_json(exclude={'errors'}))
+    return 0 if report.failed == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,20 @@
+import asyncio
+
+from .async_group_management_service import AsyncGroupManagementService
+
+DEFAULT_SYNC_INTERVAL_SECONDS = 0.5
+
+
+async def sync_caches_periodically(service: AsyncGroupManagementService,
+                                   interval: float = DEFAULT_SYNC_INTERVAL_SECONDS) -> None:
+    """
+    Background task: every ``interval`` seconds, apply invalidations written by other
+    processes on the service's worker pool, invalidation listeners included, so request
+    handlers never poll the database themselves.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await service.sync_caches(force=True)
+        except Exception as e:
+            print(f"An error occurred while syncing caches: {e}")
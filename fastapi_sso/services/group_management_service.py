@@ -1,10 +1,29 @@
-from typing import Dict, List, Optional, Set
+import time
+from itertools import islice
+from typing import Callable, Dict, Iterable, List, Optional, Set
 
+from pydantic import ValidationError
+
+from fastapi_sso.models.bulk_import import ImportReport, ImportRowError
 from fastapi_sso.models.user import UserBase, UserCreate
+from ..managers.group_manager_base import GroupManager
+from ..managers.group_manager_memory import GroupManagerMemory
+from ..managers.group_manager_sharded import GroupManagerSharded
 from ..managers.group_manager_sqlite import GroupManagerSQLite
+
+STORAGE_BACKENDS = ('sqlite', 'memory', 'sharded')
+
 class GroupManagementService:
-    def __init__(self) -> None:
-        self.group_manager = GroupManagerSQLite() # this implementation can be swapped for oother implementations out based on env var, use if statements
+    def __init__(self, db_file: str = '../db/user.db', backend: str = 'sqlite', **manager_options) -> None:
+        # backend comes from the STORAGE_BACKEND setting
+        if backend == 'sqlite':
+            self.group_manager: GroupManager = GroupManagerSQLite(db_file, **manager_options)
+        elif backend == 'memory':
+            self.group_manager: GroupManager = GroupManagerMemory(db_file, **manager_options)
+        elif backend == 'sharded':
+            self.group_manager: GroupManager = GroupManagerSharded(db_file, **manager_options)
+        else:
+            raise ValueError(f"Unknown storage backend {backend!r}, expected one of {', '.join(STORAGE_BACKENDS)}")
         # any other house keeping can be done here too
 
     def create_group(self, group_name: str) -> str:
@@ -13,17 +32,35 @@ class GroupManagementService:
     def create_user(self,user: UserCreate) -> UserBase:
         return self.group_manager.create_user(user)
 
+    def get_or_create_user_with_roles(self, user: UserCreate, roles: List[str]) -> Dict:
+        return self.group_manager.get_or_create_user_with_roles(user, roles)
+
     def add_user_to_group(self, user_id: str, group_id: str) -> bool:
         return self.group_manager.add_user_to_group(user_id=user_id,group_id=group_id)
 
     def remove_user_from_group(self, user_id: str, group_id: str) -> bool:
         return self.group_manager.remove_user_from_group(user_id=user_id,group_id=group_id)
 
-    def get_user_groups(self, user_id: str) -> List[dict]:
-        return self.group_manager.get_user_groups(user_id)
+    def add_users_to_group(self, group_id: str, user_ids: List[str]) -> List[str]:
+        return self.group_manager.add_users_to_group(group_id, user_ids)
+
+    def remove_users_from_group(self, group_id: str, user_ids: List[str]) -> List[str]:
+        return self.group_manager.remove_users_from_group(group_id, user_ids)
+
+    def sync_group_members(self, group_id: str, user_ids: List[str]) -> Dict[str, List[str]]:
+        return self.group_manager.sync_group_members(group_id, user_ids)
+
+    def get_user_groups(self, user_id: str, limit: Optional[int] = None, offset: int = 0) -> List[dict]:
+        return self.group_manager.get_user_groups(user_id, limit=limit, offset=offset)
+
+    def get_group_users(self, group_id: str, limit: Optional[int] = None, offset: int = 0) -> List[dict]:
+        return self.group_manager.get_group_users(group_id, limit=limit, offset=offset)
 
-    def get_group_users(self, group_id: str) -> List[dict]:
-        return self.group_manager.get_group_users(group_id)
+    def get_users_by_ids(self, user_ids: List[str]) -> List[UserBase]:
+        return self.group_manager.get_users_by_ids(user_ids)
+
+    def get_groups_by_ids(self, group_ids: List[str]) -> List[dict]:
+        return self.group_manager.get_groups_by_ids(group_ids)
 
     def get_group_by_id(self, group_id: str) -> Optional[dict]:
         return self.group_manager.get_group_by_id(group_id)
@@ -35,7 +72,7 @@ class GroupManagementService:
         return self.group_manager.get_group_by_name(group_name)
     
     def get_user_by_username(self, username: str) -> Optional[dict]:
-        return self.get_user_by_username(username)
+        return self.group_manager.get_user_by_username(username)
     
     def get_user_by_email_and_provider(self,email:str,auth_provider:str) -> Optional[UserBase]:
         return self.group_manager.get_user_by_email_and_provider(email,auth_provider)
@@ -51,6 +88,12 @@ class GroupManagementService:
     
     def get_user_last_seen_online(self,user_id:str)-> bool:
         return self.group_manager.get_user_last_seen_online(user_id)
+
+    def record_last_seen(self, user_id: str) -> bool:
+        return self.group_manager.record_last_seen(user_id)
+
+    def flush_last_seen(self) -> int:
+        return self.group_manager.flush_last_seen()
     
     def get_user_roles(self,user_id:str)->Set[str]:
         return self.group_manager.get_user_roles(user_id)
@@ -64,8 +107,103 @@ class GroupManagementService:
     def delete_refresh_token(self,token:str):
         return self.group_manager.delete_refresh_token(token)
     
+    def rotate_refresh_token(self, token: str) -> Dict:
+        return self.group_manager.rotate_refresh_token(token)
+
+    def revoke_all_refresh_tokens_for_user(self, user_id: str) -> int:
+        return self.group_manager.revoke_all_refresh_tokens_for_user(user_id)
+
+    def delete_expired_refresh_tokens(self, batch_size: int = 500) -> int:
+        return self.group_manager.delete_expired_refresh_tokens(batch_size)
+
     def assign_roles(self,user_id:str,roles:List[str]):
         return self.group_manager.assign_roles(user_id,roles)
        
     def get_roles(self,user_id:str)-> List[str]:
-        return self.group_manager.get_roles(user_id=user_id)
\ No newline at end of file
+        return self.group_manager.get_roles(user_id=user_id)
+
+    def import_users(self, rows: Iterable[Dict], chunk_size: int = 1000, default_roles: Optional[List[str]] = None,
+                     progress: Optional[Callable[[ImportReport], None]] = None) -> ImportReport:
+        """
+        Stream ``rows`` (UserCreate fields plus optional ``roles`` and ``groups`` lists) into the
+        store, one transaction per ``chunk_size`` rows. Invalid rows are collected in the
+        report instead of stopping the import.
+        """
+        report = ImportReport()
+        default_roles = ["USER"] if default_roles is None else default_roles
+        started = time.perf_counter()
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            entries, positions = [], []
+            for row in chunk:
+                report.total_rows += 1
+                try:
+                    if '_error' in row:
+                        raise ValueError(row['_error'])
+                    fields = {key: value for key, value in row.items() if key not in ('roles', 'groups')}
+                    fields.setdefault('id', -1)
+                    user = UserCreate(**fields)
+                except (ValidationError, ValueError, TypeError) as e:
+                    report.errors.append(ImportRowError(row=report.total_rows, error=str(e)))
+                    continue
+                entries.append((user, list(row.get('roles') or default_roles), list(row.get('groups') or [])))
+                positions.append(report.total_rows)
+            if entries:
+                for position, error in zip(positions, self.group_manager.bulk_create_users(entries)):
+                    if error is None:
+                        report.imported += 1
+                    else:
+                        report.errors.append(ImportRowError(row=position, error=error))
+            report.failed = len(report.errors)
+            report.elapsed_seconds = round(time.perf_counter() - started, 3)
+            report.rows_per_second = round(report.total_rows / report.elapsed_seconds, 1) if report.elapsed_seconds else 0.0
+            if progress:
+                progress(report)
+        report.errors.sort(key=lambda error: error.row)
+        return report
+
+    def import_users_from_file(self, path: str, format: Optional[str] = None, **options) -> ImportReport:
+        from .bulk_import import read_rows
+        return self.import_users(read_rows(path, format), **options)
+
+    def get_role_permission_graph(self, role: Optional[str] = None) -> Dict[str, Set[str]]:
+        return self.group_manager.get_role_permission_graph(role)
+
+    def get_permission_names(self) -> List[str]:
+        return self.group_manager.get_permission_names()
+
+    def create_permission(self, name: str, description: Optional[str] = None) -> bool:
+        return self.group_manager.create_permission(name, description)
+
+    def grant_permission(self, role: str, permission: str) -> bool:
+        return self.group_manager.grant_permission(role, permission)
+
+    def revoke_permission(self, role: str, permission: str) -> bool:
+        return self.group_manager.revoke_permission(role, permission)
+
+    def create_role(self, name: str, description: Optional[str] = None) -> bool:
+        return self.group_manager.create_role(name, description)
+
+    def get_role_inheritance(self) -> Dict[str, Set[str]]:
+        return self.group_manager.get_role_inheritance()
+
+    def add_role_inheritance(self, role: str, inherited_role: str) -> bool:
+        return self.group_manager.add_role_inheritance(role, inherited_role)
+
+    def remove_role_inheritance(self, role: str, inherited_role: str) -> bool:
+        return self.group_manager.remove_role_inheritance(role, inherited_role)
+
+    def get_pool_stats(self) -> Dict:
+        return self.group_manager.get_pool_stats()
+
+    def get_cache_stats(self) -> List[Dict]:
+        return self.group_manager.get_cache_stats()
+
+    def sync_caches(self, force: bool = False) -> int:
+        return self.group_manager.sync_caches(force)
+
+    def close(self) -> None:
+        self.group_manager.close()
@@ -0,0 +1,16 @@
+import asyncio
+
+from .async_group_management_service import AsyncGroupManagementService
+
+DEFAULT_FLUSH_INTERVAL_SECONDS = 5.0
+
+
+async def flush_last_seen_periodically(service: AsyncGroupManagementService,
+                                       interval: float = DEFAULT_FLUSH_INTERVAL_SECONDS) -> None:
+    """Background task: every ``interval`` seconds, write the buffered last_seen updates in one batch."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await service.flush_last_seen()
+        except Exception as e:
+            print(f"An error occurred while flushing last_seen updates: {e}")
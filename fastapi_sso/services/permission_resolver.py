@@ -0,0 +1,99 @@
+import threading
+from typing import Dict, FrozenSet, Iterable, Optional
+
+from .group_management_service import GroupManagementService
+
+
+class PermissionResolver:
+    """
+    In-memory view of the roles -> permissions graph for per-request authorization.
+
+    Every permission gets a bit; every role is compiled to the OR of its permission bits
+    (plus a frozenset of names for listing). A check is a dict lookup and a bitwise AND
+    per role in the token, with no DB access. Changes made through this resolver update
+    only the affected role, and changes made by other processes arrive through the
+    manager's invalidation listeners, applied by the ``sync_caches_periodically`` task.
+    """
+
+    def __init__(self, service: GroupManagementService) -> None:
+        self.service = service
+        self._lock = threading.Lock()
+        self._bits: Dict[str, int] = {}  # permission name -> bit
+        self._role_masks: Dict[str, int] = {}  # role name -> OR of permission bits
+        self._role_permissions: Dict[str, FrozenSet[str]] = {}
+        service.group_manager.invalidation_listeners.append(self._on_invalidation)
+
+    def load(self) -> None:
+        """Compile the whole graph; call once at startup."""
+        permissions = self.service.get_permission_names()
+        graph = self.service.get_role_permission_graph()
+        with self._lock:
+            self._bits = {}
+            for name in permissions:
+                self._bit(name)
+            self._role_masks = {}
+            self._role_permissions = {}
+            for role, names in graph.items():
+                self._compile_role(role, names)
+
+    def _bit(self, permission: str) -> int:
+        # caller holds self._lock
+        bit = self._bits.get(permission)
+        if bit is None:
+            bit = 1 << len(self._bits)
+            self._bits[permission] = bit
+        return bit
+
+    def _compile_role(self, role: str, permissions: Iterable[str]) -> None:
+        # caller holds self._lock
+        permissions = frozenset(permissions)
+        mask = 0
+        for permission in permissions:
+            mask |= self._bit(permission)
+        self._role_permissions[role] = permissions
+        self._role_masks[role] = mask
+
+    def _reload_role(self, role: str) -> None:
+        permissions = self.service.get_role_permission_graph(role).get(role, set())
+        with self._lock:
+            self._compile_role(role, permissions)
+
+    def _on_invalidation(self, kind: str, entity_id: str, related_id: Optional[str]) -> None:
+        if kind == 'role_permissions':
+            self._reload_role(entity_id)
+
+    def has_permission(self, roles: Iterable[str], permission: str) -> bool:
+        bit = self._bits.get(permission)
+        if bit is None:
+            return False
+        role_masks = self._role_masks
+        for role in roles:
+            if role_masks.get(role, 0) & bit:
+                return True
+        return False
+
+    def permissions_for(self, roles: Iterable[str]) -> FrozenSet[str]:
+        permissions = frozenset()
+        for role in roles:
+            permissions |= self._role_permissions.get(role, frozenset())
+        return permissions
+
+    def create_permission(self, name: str, description: Optional[str] = None) -> bool:
+        created = self.service.create_permission(name, description)
+        with self._lock:
+            self._bit(name)
+        return created
+
+    def grant(self, role: str, permission: str) -> bool:
+        granted = self.service.grant_permission(role, permission)
+        if granted:
+            with self._lock:
+                self._compile_role(role, self._role_permissions.get(role, frozenset()) | {permission})
+        return granted
+
+    def revoke(self, role: str, permission: str) -> bool:
+        revoked = self.service.revoke_permission(role, permission)
+        if revoked:
+            with self._lock:
+                self._compile_role(role, self._role_permissions.get(role, frozenset()) - {permission})
+        return revoked
@@ -0,0 +1,21 @@
+import asyncio
+
+from .async_group_management_service import AsyncGroupManagementService
+
+DEFAULT_SWEEP_INTERVAL_SECONDS = 300.0
+DEFAULT_SWEEP_BATCH_SIZE = 500
+# gap between batches so request writers can take the SQLite write lock
+BATCH_PAUSE_SECONDS = 0.05
+
+
+async def sweep_expired_refresh_tokens(service: AsyncGroupManagementService,
+                                       interval: float = DEFAULT_SWEEP_INTERVAL_SECONDS,
+                                       batch_size: int = DEFAULT_SWEEP_BATCH_SIZE) -> None:
+    """Background task: every ``interval`` seconds, delete expired refresh tokens in small batches."""
+    while True:
+        try:
+            while await service.delete_expired_refresh_tokens(batch_size) >= batch_size:
+                await asyncio.sleep(BATCH_PAUSE_SECONDS)
+        except Exception as e:
+            print(f"An error occurred while sweeping refresh tokens: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,131 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from typing import Callable, Dict, List, Optional
+
+from fastapi_sso.managers.group_manager_sharded import shard_files, shard_for, stored_shard_count
+from fastapi_sso.services.startup.initialize_database import (ensure_file_exists, init_shard_catalog, init_sqlite_database,
+                                                              insert_role_inheritance, insert_roles)
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> str:
+    return ', '.join(row[1] for row in conn.execute(f'PRAGMA main.table_info({table})'))
+
+
+def _move_users(source: str, target: str, user_ids: List[int]) -> None:
+    """Copy the rows owned by ``user_ids`` from ``source`` to ``target`` and delete them from ``source``, in one transaction."""
+    placeholders = ','.join('?' * len(user_ids))
+    text_ids = [str(user_id) for user_id in user_ids]
+    conn = sqlite3.connect(target)
+    try:
+        conn.execute('ATTACH DATABASE ? AS src', (source,))
+        conn.execute('BEGIN IMMEDIATE')
+        for table, where in (('users', f'id IN ({placeholders})'), ('user_groups', f'user_id IN ({placeholders})')):
+            columns = _columns(conn, table)
+            conn.execute(f'INSERT OR REPLACE INTO main.{table} ({columns}) SELECT {columns} FROM src.{table} WHERE {where}', user_ids)
+        columns = _columns(conn, 'refresh_tokens')
+        conn.execute(f'INSERT OR REPLACE INTO main.refresh_tokens ({columns}) SELECT {columns} FROM src.refresh_tokens '
+                     f'WHERE user_id IN ({placeholders})', text_ids)
+        # role ids may differ between files, so user_roles is translated through the role name
+        conn.execute(f'''
+            INSERT OR IGNORE INTO main.user_roles (user_id, role_id)
+            SELECT ur.user_id, r.id
+            FROM src.user_roles ur
+            JOIN src.roles sr ON sr.id = ur.role_id
+            JOIN main.roles r ON r.name = sr.name
+            WHERE ur.user_id IN ({placeholders})''', user_ids)
+        for table, where, params in (('users', f'id IN ({placeholders})', user_ids),
+                                     ('user_groups', f'user_id IN ({placeholders})', user_ids),
+                                     ('user_roles', f'user_id IN ({placeholders})', user_ids),
+                                     ('refresh_tokens', f'user_id IN ({placeholders})', text_ids)):
+            conn.execute(f'DELETE FROM src.{table} WHERE {where}', params)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def reshard(db_file: str, shard_count: int, batch_size: int = DEFAULT_BATCH_SIZE,
+            progress: Optional[Callable[[str, int], None]] = None) -> Dict[str, int]:
+    """
+    Redistribute user-owned rows of ``db_file`` over ``shard_count`` shards.
+
+    Works from an unsharded database (the users move out of ``db_file``, which becomes
+    the catalog) or from any other shard count. Users are moved in batches of
+    ``batch_size``, each batch in one transaction, so an interrupted run can simply be
+    started again. Run it with the app stopped: the workers' caches are not told about
+    the moves.
+    """
+    old_count = stored_shard_count(db_file)
+    sources = [db_file] if old_count is None else shard_files(db_file, old_count)
+    targets = shard_files(db_file, shard_count)
+    for path in targets:
+        ensure_file_exists(path)
+        init_sqlite_database(path)
+        insert_roles(path)
+        insert_role_inheritance(path)
+    # the new count is only recorded once every user has moved, so an interrupted run can be repeated
+    init_shard_catalog(db_file, None)
+
+    with sqlite3.connect(db_file) as catalog:
+        roles = catalog.execute('SELECT name, description FROM roles').fetchall()
+        if old_count is None:
+            # the unsharded users table becomes the directory, keeping every id
+            catalog.execute('''
+                INSERT OR IGNORE INTO user_directory (id, email, auth_provider, username)
+                SELECT id, email, auth_provider, username FROM users''')
+        catalog.commit()
+    # roles created at runtime exist in the catalog and the old shards; new shards need them too
+    for path in targets:
+        with sqlite3.connect(path) as conn:
+            conn.executemany('INSERT OR IGNORE INTO roles (name, description) VALUES (?, ?)', roles)
+            conn.commit()
+
+    moved = 0
+    for source in sources:
+        if not os.path.exists(source):
+            continue
+        with sqlite3.connect(source) as conn:
+            user_ids = [row[0] for row in conn.execute('SELECT id FROM users ORDER BY id')]
+        by_target: Dict[str, List[int]] = {}
+        for user_id in user_ids:
+            target = targets[shard_for(user_id, shard_count)]
+            if target != source:
+                by_target.setdefault(target, []).append(user_id)
+        for target, ids in by_target.items():
+            for start in range(0, len(ids), batch_size):
+                _move_users(source, target, ids[start:start + batch_size])
+                moved += len(ids[start:start + batch_size])
+                if progress:
+                    progress(source, moved)
+
+    with sqlite3.connect(db_file) as catalog:
+        catalog.execute("INSERT OR REPLACE INTO shard_meta (key, value) VALUES ('shard_count', ?)", (str(shard_count),))
+        catalog.commit()
+    for source in sources:
+        if source != db_file and source not in targets:
+            print(f"{source} is no longer used and can be deleted.", file=sys.stderr)
+    return {'previous_shard_count': old_count or 0, 'shard_count': shard_count, 'users_moved': moved}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Change the number of shards user data is spread over.")
+    parser.add_argument('--db', default=os.environ.get('DB_FILE', '../db/user.db'), help="catalog SQLite database file")
+    parser.add_argument('--shards', type=int, required=True, help="new number of shards")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="users moved per transaction")
+    args = parser.parse_args(argv)
+    if args.shards < 1:
+        parser.error("--shards must be at least 1")
+
+    def progress(source, moved):
+        print(f"{moved} users moved (reading {source})", file=sys.stderr)
+
+    print(json.dumps(reshard(args.db, args.shards, batch_size=args.batch_size, progress=progress)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+import threading
+from typing import Dict, FrozenSet, Iterable, Optional, Set
+
+from .group_management_service import GroupManagementService
+
+# distinct role combinations remembered by expand(); tokens carry only a handful in practice
+MAX_EXPANDED_COMBINATIONS = 4096
+
+
+class RoleHierarchy:
+    """
+    Role inheritance with a precomputed transitive closure.
+
+    ``closure[role]`` holds the role itself and every role it implies, directly or through
+    a chain. It is rebuilt at startup and whenever an inheritance edge changes (other
+    processes' edits arrive on a DB worker through ``sync_caches_periodically``), so checking
+    a user's roles is one set intersection against their expanded role set.
+    """
+
+    def __init__(self, service: GroupManagementService) -> None:
+        self.service = service
+        self._lock = threading.Lock()
+        self.closure: Dict[str, FrozenSet[str]] = {}
+        self._expanded: Dict[tuple, FrozenSet[str]] = {}
+        service.group_manager.invalidation_listeners.append(self._on_invalidation)
+
+    @staticmethod
+    def compute_closure(graph: Dict[str, Set[str]]) -> Dict[str, FrozenSet[str]]:
+        closure: Dict[str, FrozenSet[str]] = {}
+        for role in graph:
+            seen = {role}
+            stack = [role]
+            while stack:
+                for inherited in graph.get(stack.pop(), ()):
+                    if inherited not in seen:
+                        seen.add(inherited)
+                        stack.append(inherited)
+            closure[role] = frozenset(seen)
+        return closure
+
+    def load(self) -> None:
+        closure = self.compute_closure(self.service.get_role_inheritance())
+        with self._lock:
+            # closure first: expand() reads the memo before the closure, so it never
+            # stores an old expansion in the new memo
+            self.closure = closure
+            self._expanded = {}
+
+    def _on_invalidation(self, kind: str, entity_id: str, related_id: Optional[str]) -> None:
+        if kind == 'role_inheritance':
+            self.load()
+
+    def expand(self, roles: Iterable[str]) -> FrozenSet[str]:
+        key = tuple(roles)
+        memo = self._expanded
+        expanded = memo.get(key)
+        if expanded is None:
+            closure = self.closure
+            expanded = frozenset().union(*(closure.get(role, (role,)) for role in key))
+            if len(memo) >= MAX_EXPANDED_COMBINATIONS:
+                self._expanded = memo = {}
+            memo[key] = expanded
+        return expanded
+
+    def has_any_role(self, roles: Iterable[str], required_roles: FrozenSet[str]) -> bool:
+        return not self.expand(roles).isdisjoint(required_roles)
+
+    def add_inheritance(self, role: str, inherited_role: str) -> bool:
+        """Make ``role`` imply ``inherited_role``; refuses edges that would create a cycle."""
+        if role in self.closure.get(inherited_role, frozenset()):
+            print(f"Refusing to let {role} inherit {inherited_role}: it would create a cycle.")
+            return False
+        added = self.service.add_role_inheritance(role, inherited_role)
+        if added:
+            self.load()
+        return added
+
+    def remove_inheritance(self, role: str, inherited_role: str) -> bool:
+        removed = self.service.remove_role_inheritance(role, inherited_role)
+        if removed:
+            self.load()
+        return removed
@@ -0,0 +1,32 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one.
+
+    The first caller for a key starts the work; callers that arrive while it's running
+    await the same result (or exception) instead of starting their own. The key is
+    forgotten as soon as the work finishes, so nothing is cached. A caller that gets
+    cancelled doesn't cancel the shared work for the others.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.started = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable]):
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(func())
+            self._calls[key] = future
+            future.add_done_callback(lambda _: self._calls.pop(key, None))
+            self.started += 1
+        else:
+            self.shared += 1
+        return await asyncio.shield(future)
+
+    def __len__(self) -> int:
+        return len(self._calls)
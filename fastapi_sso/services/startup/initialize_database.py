@@ -1,6 +1,8 @@
+import hashlib
 import sqlite3
 import os
-from typing import List, Tuple
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
 
 def create_table(cursor: sqlite3.Cursor, table_name: str, columns: List[str]) -> None:
     """Create a table if it doesn't exist."""
@@ -16,6 +18,30 @@ def create_index(cursor: sqlite3.Cursor, index_name: str, table_name: str, colum
     query = f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} ({column})"
     cursor.execute(query)
 
+def migrate_refresh_tokens(cursor: sqlite3.Cursor) -> None:
+    """Bring an older refresh_tokens table up to the hashed, family-tracking layout."""
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(refresh_tokens)")]
+    if columns and 'family_id' not in columns and 'token' not in columns:
+        # tokens issued before rotation tracking each become their own family
+        cursor.execute("ALTER TABLE refresh_tokens ADD COLUMN family_id TEXT")
+        cursor.execute("ALTER TABLE refresh_tokens ADD COLUMN used INTEGER NOT NULL DEFAULT 0")
+        cursor.execute("UPDATE refresh_tokens SET family_id = token_hash")
+    if 'token' not in columns:
+        return
+    rows = cursor.execute("SELECT token, user_id, expires FROM refresh_tokens").fetchall()
+    cursor.execute("DROP TABLE refresh_tokens")
+    create_table(cursor, 'refresh_tokens', ['token_hash TEXT PRIMARY KEY', 'user_id TEXT NOT NULL', 'expires INTEGER NOT NULL',
+                                            'family_id TEXT', 'used INTEGER NOT NULL DEFAULT 0'])
+    migrated = []
+    for token, user_id, expires in rows:
+        expires_at = datetime.fromisoformat(expires)
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        token_hash = hashlib.sha256(token.encode()).hexdigest()
+        migrated.append((token_hash, user_id, int(expires_at.timestamp()), token_hash))
+    cursor.executemany("INSERT OR IGNORE INTO refresh_tokens (token_hash, user_id, expires, family_id) VALUES (?, ?, ?, ?)", migrated)
+    print(f"Migrated {len(migrated)} refresh tokens to hashed storage.")
+
 def init_sqlite_database(db_file: str) -> None:
     """Initialize the SQLite database with necessary tables and indexes for RBAC."""
     tables = {
@@ -63,6 +89,14 @@ def init_sqlite_database(db_file: str) -> None:
             'FOREIGN KEY (role_id) REFERENCES roles (id)',
             'PRIMARY KEY (user_id, role_id)'
         ],
+        # role_id implies inherited_role_id, e.g. ADMIN -> USER
+        'role_inheritance': [
+            'role_id INTEGER NOT NULL',
+            'inherited_role_id INTEGER NOT NULL',
+            'FOREIGN KEY (role_id) REFERENCES roles (id)',
+            'FOREIGN KEY (inherited_role_id) REFERENCES roles (id)',
+            'PRIMARY KEY (role_id, inherited_role_id)'
+        ],
         'groups': [
             'group_id INTEGER PRIMARY KEY AUTOINCREMENT',
             'group_name TEXT NOT NULL UNIQUE'
@@ -77,10 +111,23 @@ def init_sqlite_database(db_file: str) -> None:
             'FOREIGN KEY (group_id) REFERENCES groups(id)'
 
         ],
+        # token_hash is the SHA-256 hex digest of the token, expires is unix seconds.
+        # Rotated tokens stay as used = 1 until they expire so reuse can be detected.
         'refresh_tokens':[
-            'token TEXT PRIMARY KEY',
+            'token_hash TEXT PRIMARY KEY',
             'user_id TEXT NOT NULL',
-            'expires TIMESTAMP NOT NULL'
+            'expires INTEGER NOT NULL',
+            'family_id TEXT',
+            'used INTEGER NOT NULL DEFAULT 0'
+        ],
+        # change log polled by every worker process to evict stale cache entries
+        'cache_invalidations': [
+            'id INTEGER PRIMARY KEY AUTOINCREMENT',
+            'origin TEXT NOT NULL',
+            'kind TEXT NOT NULL',
+            'entity_id TEXT NOT NULL',
+            'related_id TEXT',
+            'created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
         ]
     }
     
@@ -96,12 +143,17 @@ def init_sqlite_database(db_file: str) -> None:
         ('idx_user_roles_role_id', 'user_roles', 'role_id'),
         ('idx_user_groups_user_id', 'user_groups', 'user_id'),
         ('idx_user_groups_group_id', 'user_groups', 'group_id'),
-        ('idx_groups_name', 'groups','group_name')
+        ('idx_groups_name', 'groups','group_name'),
+        ('idx_cache_invalidations_created_at', 'cache_invalidations', 'created_at'),
+        ('idx_refresh_tokens_user_id', 'refresh_tokens', 'user_id'),
+        ('idx_refresh_tokens_expires', 'refresh_tokens', 'expires'),
+        ('idx_refresh_tokens_family_id', 'refresh_tokens', 'family_id')
     ]
 
     try:
         with sqlite3.connect(db_file) as conn:
             cursor = conn.cursor()
+            migrate_refresh_tokens(cursor)
             
             for table_name, columns in tables.items():
                 create_table(cursor, table_name, columns)
@@ -134,8 +186,8 @@ def ensure_file_exists(file_path: str) -> bool:
             print(f"Error creating file {file_path}: {e}")
             return False
 
-def insert_roles(db_file: str) -> None:
-    """Insert predefined roles into the roles table."""
+def insert_roles(db_file: str) -> Dict[str, int]:
+    """Insert predefined roles into the roles table; returns every role name -> id, for the managers' in-memory role table."""
     roles = [
         ('USER', 'A person who uses the app'),
         ('ADMIN', 'Has all permissions')
@@ -150,8 +202,59 @@ def insert_roles(db_file: str) -> None:
             """, roles)
             conn.commit()
             print(f"Successfully inserted or updated {len(roles)} roles.")
+            return {name: role_id for role_id, name in cursor.execute("SELECT id, name FROM roles")}
     except sqlite3.Error as e:
         print(f"An error occurred while inserting roles: {e}")
+        return {}
+def insert_role_inheritance(db_file: str) -> None:
+    """Insert the predefined role hierarchy (ADMIN implies USER)."""
+    inheritance = [
+        ('ADMIN', 'USER')
+    ]
+
+    try:
+        with sqlite3.connect(db_file) as conn:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT OR IGNORE INTO role_inheritance (role_id, inherited_role_id)
+                SELECT r.id, i.id FROM roles r, roles i WHERE r.name = ? AND i.name = ?
+            """, inheritance)
+            conn.commit()
+    except sqlite3.Error as e:
+        print(f"An error occurred while inserting role inheritance: {e}")
+def init_shard_catalog(db_file: str, shard_count: Optional[int]) -> None:
+    """
+    Add the tables only the catalog of a sharded deployment has: user_directory, which
+    allocates user ids and resolves (email, auth_provider) and username to an id, and
+    shard_meta, which remembers how many shards the user data is spread over (left
+    unset when ``shard_count`` is None).
+    """
+    try:
+        with sqlite3.connect(db_file) as conn:
+            cursor = conn.cursor()
+            create_table(cursor, 'user_directory', [
+                'id INTEGER PRIMARY KEY AUTOINCREMENT',
+                'email TEXT NOT NULL',
+                'auth_provider TEXT',
+                'username TEXT UNIQUE',
+                'UNIQUE (email, auth_provider)'
+            ])
+            create_table(cursor, 'shard_meta', ['key TEXT PRIMARY KEY', 'value TEXT NOT NULL'])
+            if shard_count is not None:
+                cursor.execute("INSERT OR IGNORE INTO shard_meta (key, value) VALUES ('shard_count', ?)", (str(shard_count),))
+            conn.commit()
+    except sqlite3.Error as e:
+        print(f"An error occurred while initializing the shard catalog: {e}")
+
+def init_sharded_database(db_file: str, shard_files: List[str]) -> None:
+    """Initialize the catalog ``db_file`` and every shard; all of them get the full schema and the predefined roles."""
+    for path in [db_file] + list(shard_files):
+        ensure_file_exists(path)
+        init_sqlite_database(path)
+        insert_roles(path)
+        insert_role_inheritance(path)
+    init_shard_catalog(db_file, len(shard_files))
+
 # Example usage
 if __name__ == "__main__":
     db_file = "path/to/your/database.db"
@@ -0,0 +1,65 @@
+import time
+
+import httpx
+from authlib.integrations.starlette_client import OAuth
+
+from fastapi_sso.utils.metrics import OAUTH_CALL_SECONDS, REGISTRY
+
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 20
+DEFAULT_KEEPALIVE_EXPIRY_SECONDS = 30.0
+DEFAULT_CONNECT_TIMEOUT_SECONDS = 5.0
+DEFAULT_READ_TIMEOUT_SECONDS = 10.0
+
+
+class SharedAsyncTransport(httpx.AsyncBaseTransport):
+    """
+    One keep-alive connection pool for every outgoing OAuth call.
+
+    Authlib builds a new httpx client for each provider call and closes it right after,
+    which would throw away the connection (and its TLS session) every time. Clients
+    built on this transport only borrow the pool: their ``aclose`` is a no-op, and the
+    pool itself is closed once, by ``close`` at shutdown.
+    """
+
+    def __init__(self, max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 max_keepalive_connections: int = DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+                 keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY_SECONDS, retries: int = 0) -> None:
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_keepalive_connections,
+                                   keepalive_expiry=keepalive_expiry)
+        self._transport = httpx.AsyncHTTPTransport(limits=self.limits, retries=retries)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if not REGISTRY.enabled:
+            return await self._transport.handle_async_request(request)
+        # time to the response headers; authlib reads the (small) body right after
+        status = 'error'
+        started = time.perf_counter()
+        try:
+            response = await self._transport.handle_async_request(request)
+            status = response.status_code
+            return response
+        finally:
+            OAUTH_CALL_SECONDS.labels(request.url.host, status).observe(time.perf_counter() - started)
+
+    async def aclose(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        await self._transport.aclose()
+
+
+def attach_transport(oauth: OAuth, transport: httpx.AsyncBaseTransport, timeout: httpx.Timeout) -> None:
+    """Route every client registered on ``oauth`` through ``transport``."""
+    for name in oauth._registry:
+        client = oauth.create_client(name)
+        client.client_kwargs['transport'] = transport
+        client.client_kwargs['timeout'] = timeout
+
+
+def detach_transport(oauth: OAuth) -> None:
+    for name in oauth._registry:
+        client = oauth.create_client(name)
+        client.client_kwargs.pop('transport', None)
+        client.client_kwargs.pop('timeout', None)
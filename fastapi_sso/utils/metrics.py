@@ -0,0 +1,288 @@
+import math
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# seconds; from a cached SQLite read (~20us) up to a slow provider round trip
+DEFAULT_LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class HistogramChild:
+    """
+    Fixed buckets, chosen when the metric is declared: ``observe`` is a bisect and two
+    additions, and the cumulative counts Prometheus expects are only summed at scrape time.
+    """
+    __slots__ = ('_upper_bounds', 'counts', 'sum', '_lock')
+
+    def __init__(self, upper_bounds: Tuple[float, ...]) -> None:
+        self._upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self._upper_bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class _Metric:
+    type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """The child for one label combination; hot paths should look it up once and keep it."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def _new_child(self) -> CounterChild:
+        return CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        for values, child in list(self._children.items()):
+            yield self.name + '_total', _format_labels(self.labelnames, values), child.value
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.upper_bounds = tuple(sorted(buckets))
+
+    def _new_child(self) -> HistogramChild:
+        return HistogramChild(self.upper_bounds)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        for values, child in list(self._children.items()):
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for upper_bound, count in zip(self.upper_bounds + (math.inf,), counts):
+                cumulative += count
+                le = 'le="' + _format_value(upper_bound) + '"'
+                yield self.name + '_bucket', _format_labels(self.labelnames, values, le), cumulative
+            labels = _format_labels(self.labelnames, values)
+            yield self.name + '_sum', labels, total
+            yield self.name + '_count', labels, cumulative
+
+
+class MetricFamily:
+    """Values read at scrape time from stats the app already keeps (cache counters, pool waits)."""
+
+    def __init__(self, name: str, metric_type: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.type = metric_type
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._samples: List[Tuple[Tuple[str, ...], float]] = []
+
+    def add(self, values: Sequence[str], value: float) -> 'MetricFamily':
+        self._samples.append((tuple(values), value))
+        return self
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        suffix = '_total' if self.type == 'counter' else ''
+        for values, value in self._samples:
+            yield self.name + suffix, _format_labels(self.labelnames, values), value
+
+
+class Registry:
+    """
+    Process-wide metrics in the Prometheus text format. With ``enabled`` false, nothing
+    is instrumented in the first place (see the SQLite pool, the OAuth transport and
+    ``MetricsMiddleware``), so disabled metrics cost nothing.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = True
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self, extra: Iterable[MetricFamily] = ()) -> str:
+        lines = []
+        for metric in list(self._metrics.values()) + list(extra):
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    'fastapi_sso_db_query_duration_seconds', 'SQLite statement execution time.', ('db', 'statement'))
+DB_ROWS_RETURNED = REGISTRY.counter(
+    'fastapi_sso_db_rows_returned', 'Rows fetched from SQLite query results.', ('db', 'statement'))
+DB_LOCK_ERRORS = REGISTRY.counter(
+    'fastapi_sso_db_lock_errors', 'Statements that failed because the database stayed locked past the busy timeout.',
+    ('db', 'statement'))
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'fastapi_sso_http_request_duration_seconds', 'Time to serve a request, by route template.',
+    ('method', 'route', 'status'))
+OAUTH_CALL_SECONDS = REGISTRY.histogram(
+    'fastapi_sso_oauth_provider_call_duration_seconds', 'Outgoing OAuth provider calls, by host.',
+    ('host', 'status'))
+
+
+class _StatusRecorder:
+    """The ``send`` handed to the app: forwards messages and keeps the response status."""
+    __slots__ = ('send', 'status')
+
+    def __init__(self, send) -> None:
+        self.send = send
+        self.status = 500
+
+    async def __call__(self, message) -> None:
+        if message['type'] == 'http.response.start':
+            self.status = message['status']
+        await self.send(message)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request into ``HTTP_REQUEST_SECONDS``.
+
+    Requests are labelled with the route template (``/auth/{provider}``), not the raw
+    path, so label values stay bounded; anything no route matched is ``<unmatched>``.
+    The histogram child of each (route, method, status) is looked up once and kept.
+    """
+
+    max_children = 4096
+
+    def __init__(self, app, histogram: Histogram = HTTP_REQUEST_SECONDS) -> None:
+        self.app = app
+        self.histogram = histogram
+        self._children: Dict[Tuple[str, str, int], HistogramChild] = {}
+
+    def _child(self, route: str, method: str, status: int) -> HistogramChild:
+        child = self._children.get((route, method, status))
+        if child is None:
+            child = self.histogram.labels(method, route, status)
+            # methods come from the client; don't let junk ones grow this without bound
+            if len(self._children) < self.max_children:
+                self._children[(route, method, status)] = child
+        return child
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        recorder = _StatusRecorder(send)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, recorder)
+        finally:
+            elapsed = time.perf_counter() - started
+            route = scope.get('route')
+            self._child(route.path if route is not None else '<unmatched>', scope['method'],
+                        recorder.status).observe(elapsed)
+
+
+def cache_families(cache_stats: List[Dict]) -> List[MetricFamily]:
+    """Hit, miss and size metrics from ``LRUCache.stats()`` dicts (sharded ones carry a ``shard`` key)."""
+    labelnames = ('cache', 'shard')
+    hits = MetricFamily('fastapi_sso_cache_hits', 'counter', 'Cache lookups that found a value.', labelnames)
+    negative_hits = MetricFamily('fastapi_sso_cache_negative_hits', 'counter',
+                                 'Cache lookups that found a known-missing key.', labelnames)
+    misses = MetricFamily('fastapi_sso_cache_misses', 'counter', 'Cache lookups that found nothing.', labelnames)
+    evictions = MetricFamily('fastapi_sso_cache_evictions', 'counter', 'Entries evicted to stay under max_entries.', labelnames)
+    size = MetricFamily('fastapi_sso_cache_entries', 'gauge', 'Entries currently cached.', labelnames)
+    for stats in cache_stats:
+        values = (stats['name'], str(stats.get('shard', '')))
+        hits.add(values, stats['hits'])
+        negative_hits.add(values, stats['negative_hits'])
+        misses.add(values, stats['misses'])
+        evictions.add(values, stats['evictions'])
+        size.add(values, stats['size'])
+    return [hits, negative_hits, misses, evictions, size]
+
+
+def pool_families(pool_stats: List[Dict]) -> List[MetricFamily]:
+    """Checkout waits and timeouts from ``SQLiteConnectionPool.stats()`` dicts."""
+    waits = MetricFamily('fastapi_sso_db_pool_waits', 'counter', 'Checkouts that had to wait for a free connection.', ('db',))
+    timeouts = MetricFamily('fastapi_sso_db_pool_timeouts', 'counter', 'Checkouts that gave up waiting.', ('db',))
+    in_use = MetricFamily('fastapi_sso_db_pool_connections_in_use', 'gauge', 'Connections checked out right now.', ('db',))
+    for stats in pool_stats:
+        db = stats['db_file'].rsplit('/', 1)[-1]
+        waits.add((db,), stats['waits'])
+        timeouts.add((db,), stats['timeouts'])
+        in_use.add((db,), sum(1 for conn in stats['connections'] if conn['in_use']))
+    return [waits, timeouts, in_use]
@@ -0,0 +1,201 @@
+import asyncio
+import json
+import time
+from typing import Dict, Optional
+
+from authlib.common.encoding import urlsafe_b64decode
+from authlib.integrations.starlette_client import OAuth, StarletteOAuth2App
+from authlib.jose import JsonWebKey, JsonWebToken
+from authlib.oidc.core import CodeIDToken, ImplicitIDToken, UserInfo
+
+DEFAULT_METADATA_TTL_SECONDS = 3600.0
+DEFAULT_REFRESH_INTERVAL_SECONDS = 900.0
+# An unknown kid triggers at most one JWKS refetch per interval, so tokens
+# signed with made-up kids can't be used to hammer the provider
+DEFAULT_JWKS_MIN_REFETCH_SECONDS = 60.0
+
+
+def _token_kid(id_token: str) -> Optional[str]:
+    try:
+        header = json.loads(urlsafe_b64decode(id_token.split('.', 1)[0].encode()))
+    except ValueError:
+        return None
+    return header.get('kid') if isinstance(header, dict) else None
+
+
+class CachedOIDCApp(StarletteOAuth2App):
+    """
+    OAuth client whose discovery document and signing keys are cached for ``metadata_ttl``.
+
+    Authlib loads both lazily on the first login and keeps them forever, re-parsing the
+    key set for every ID token. Here ``refresh`` fetches them ahead of time (at startup
+    and from a background task), the key set is parsed once per fetch, and ID tokens are
+    verified locally against it. Expired metadata is still served while a refresh runs
+    in the background, so a login never waits on the provider for it.
+    """
+
+    metadata_ttl = DEFAULT_METADATA_TTL_SECONDS
+    jwks_min_refetch = DEFAULT_JWKS_MIN_REFETCH_SECONDS
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._key_set = None
+        self._kids = frozenset()
+        self._jwt = None
+        self._jwks_fetched_at = 0.0
+        self._refresh_lock = asyncio.Lock()
+        self._background_refresh = None
+        self.refreshes = 0
+        self.kid_refetches = 0
+
+    @property
+    def discoverable(self) -> bool:
+        return bool(self._server_metadata_url)
+
+    def is_stale(self) -> bool:
+        loaded_at = self.server_metadata.get('_loaded_at')
+        return loaded_at is None or time.time() - loaded_at >= self.metadata_ttl
+
+    async def _get_json(self, url: str) -> Dict:
+        async with self.client_cls(**self.client_kwargs) as client:
+            resp = await client.request('GET', url, withhold_token=True)
+            resp.raise_for_status()
+            return resp.json()
+
+    def _use_key_set(self, jwk_set: Dict) -> None:
+        key_set = JsonWebKey.import_key_set(jwk_set)
+        self._key_set = key_set
+        self._kids = frozenset(key.kid for key in key_set.keys if key.kid)
+        self._jwks_fetched_at = time.time()
+        self.server_metadata['jwks'] = jwk_set
+
+    async def refresh(self) -> None:
+        """Fetch the discovery document and JWKS now, replacing the cached copies."""
+        if not self.discoverable:
+            return
+        async with self._refresh_lock:
+            await self._refresh()
+
+    async def _refresh(self) -> None:
+        metadata = await self._get_json(self._server_metadata_url)
+        jwk_set = await self._get_json(metadata['jwks_uri']) if metadata.get('jwks_uri') else None
+        metadata['_loaded_at'] = time.time()
+        self.server_metadata.update(metadata)
+        self._jwt = JsonWebToken(metadata.get('id_token_signing_alg_values_supported') or ['RS256'])
+        if jwk_set is not None:
+            self._use_key_set(jwk_set)
+        self.refreshes += 1
+
+    async def _refresh_quietly(self) -> None:
+        try:
+            await self.refresh()
+        except Exception as e:
+            print(f"An error occurred while refreshing the {self.name} provider metadata: {e}")
+
+    async def load_server_metadata(self) -> Dict:
+        if not self.discoverable:
+            return self.server_metadata
+        if '_loaded_at' not in self.server_metadata:
+            # startup prefetch failed or was skipped: nothing to serve yet, so load it once
+            async with self._refresh_lock:
+                if '_loaded_at' not in self.server_metadata:
+                    await self._refresh()
+        elif self.is_stale() and (self._background_refresh is None or self._background_refresh.done()):
+            self._background_refresh = asyncio.create_task(self._refresh_quietly())
+        return self.server_metadata
+
+    async def fetch_jwk_set(self, force: bool = False) -> Dict:
+        metadata = await self.load_server_metadata()
+        jwk_set = metadata.get('jwks')
+        if jwk_set and not force:
+            return jwk_set
+        if jwk_set and time.time() - self._jwks_fetched_at < self.jwks_min_refetch:
+            return jwk_set
+        uri = metadata.get('jwks_uri')
+        if not uri:
+            raise RuntimeError('Missing "jwks_uri" in metadata')
+        async with self._refresh_lock:
+            if not force or time.time() - self._jwks_fetched_at >= self.jwks_min_refetch:
+                self._use_key_set(await self._get_json(uri))
+                if force:
+                    self.kid_refetches += 1
+        return self.server_metadata['jwks']
+
+    async def parse_id_token(self, token, nonce, claims_options=None) -> UserInfo:
+        """Verify ``token['id_token']`` against the cached keys; refetch them only for an unknown kid."""
+        metadata = await self.load_server_metadata()
+        if self._key_set is None:
+            await self.fetch_jwk_set()
+        if _token_kid(token['id_token']) not in self._kids:
+            # the provider may have rotated its keys since the last fetch
+            await self.fetch_jwk_set(force=True)
+        if self._jwt is None:
+            self._jwt = JsonWebToken(metadata.get('id_token_signing_alg_values_supported') or ['RS256'])
+
+        claims_params = {'nonce': nonce, 'client_id': self.client_id}
+        if 'access_token' in token:
+            claims_params['access_token'] = token['access_token']
+            claims_cls = CodeIDToken
+        else:
+            claims_cls = ImplicitIDToken
+        if claims_options is None and 'issuer' in metadata:
+            claims_options = {'iss': {'values': [metadata['issuer']]}}
+
+        claims = self._jwt.decode(
+            token['id_token'],
+            key=self._key_set,
+            claims_cls=claims_cls,
+            claims_options=claims_options,
+            claims_params=claims_params,
+        )
+        # https://github.com/lepture/authlib/issues/259
+        if claims.get('nonce_supported') is False:
+            claims.params['nonce'] = None
+        claims.validate(leeway=120)
+        return UserInfo(claims)
+
+    def stats(self) -> Dict:
+        loaded_at = self.server_metadata.get('_loaded_at')
+        return {
+            'loaded': loaded_at is not None,
+            'age_seconds': round(time.time() - loaded_at, 1) if loaded_at else None,
+            'kids': sorted(self._kids),
+            'refreshes': self.refreshes,
+            'kid_refetches': self.kid_refetches,
+        }
+
+
+class CachingOAuth(OAuth):
+    """OAuth registry whose OAuth2 clients cache provider metadata and keys, see ``CachedOIDCApp``."""
+
+    oauth2_client_cls = CachedOIDCApp
+
+    def __init__(self, *args, metadata_ttl: float = DEFAULT_METADATA_TTL_SECONDS,
+                 jwks_min_refetch: float = DEFAULT_JWKS_MIN_REFETCH_SECONDS, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.metadata_ttl = metadata_ttl
+        self.jwks_min_refetch = jwks_min_refetch
+
+    def create_client(self, name):
+        client = super().create_client(name)
+        if isinstance(client, CachedOIDCApp):
+            client.metadata_ttl = self.metadata_ttl
+            client.jwks_min_refetch = self.jwks_min_refetch
+        return client
+
+    def cached_clients(self):
+        clients = (self.create_client(name) for name in self._registry)
+        return [client for client in clients if isinstance(client, CachedOIDCApp) and client.discoverable]
+
+
+async def prefetch_provider_metadata(oauth: CachingOAuth) -> None:
+    """Load every provider's metadata and keys before the first login; failures fall back to lazy loading."""
+    await asyncio.gather(*(client._refresh_quietly() for client in oauth.cached_clients()))
+
+
+async def refresh_provider_metadata_periodically(oauth: CachingOAuth,
+                                                 interval: float = DEFAULT_REFRESH_INTERVAL_SECONDS) -> None:
+    """Background task: re-fetch provider metadata and keys every ``interval`` seconds."""
+    while True:
+        await asyncio.sleep(interval)
+        await prefetch_provider_metadata(oauth)
@@ -0,0 +1,110 @@
+import hashlib
+import threading
+import time
+from typing import Dict, Optional
+
+from fastapi_sso.managers.cache import LRUCache
+
+DEFAULT_MAX_ENTRIES = 50000
+
+
+class VerifiedTokenCache:
+    """
+    Remembers the payload of access tokens that already passed signature and expiry
+    checks, keyed by a SHA-256 digest of the raw token so bearer tokens are never
+    kept in memory. Entries live until the token's ``exp`` claim.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        self.enabled = max_entries > 0
+        self.cache = LRUCache('verified_tokens', max_entries=max(max_entries, 1), ttl=None, negative_ttl=None)
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+        key = self._digest(token)
+        payload = self.cache.get(key)
+        if payload is None:
+            return None
+        if payload["exp"] <= time.time():
+            self.cache.pop(key)
+            return None
+        return payload
+
+    def put(self, token: str, payload: Dict) -> None:
+        exp = payload.get("exp")
+        if not self.enabled or exp is None:
+            return
+        ttl = exp - time.time()
+        if ttl > 0:
+            self.cache.set(self._digest(token), payload, ttl=ttl)
+
+    def revoke(self, token: str) -> None:
+        self.cache.pop(self._digest(token))
+
+    def revoke_subject(self, sub: str) -> int:
+        """Forget every cached token issued to ``sub``, e.g. after logout or role changes."""
+        return self.cache.evict_if(lambda _, payload: payload.get("sub") == str(sub))
+
+    def on_invalidation(self, kind: str, entity_id: str, related_id: Optional[str]) -> None:
+        """
+        Group manager invalidation listener: forget a user's tokens when their roles or refresh
+        tokens are revoked. That only frees memory; ``RevokedSubjects`` is what rejects them.
+        """
+        if kind in ('roles', 'tokens'):
+            self.revoke_subject(entity_id)
+
+    def clear(self) -> None:
+        self.cache.clear()
+
+    def stats(self) -> Dict:
+        return self.cache.stats()
+
+
+class RevokedSubjects:
+    """
+    Per-user "not before" times for access tokens.
+
+    A signed token stays valid until ``exp`` whatever happens to its user, so when a user's
+    refresh tokens or roles are revoked we remember when, and ``is_revoked`` rejects their
+    tokens issued earlier. Times are whole seconds, like ``iat``: a token issued in the same
+    second as the revocation is kept, so a fresh login right after it works. Tokens without
+    ``iat`` predate this check and count as issued before any revocation. An entry is dropped
+    once every token it could reject has expired.
+    """
+
+    def __init__(self, max_token_age: float) -> None:
+        self.max_token_age = max_token_age
+        self._not_before: Dict[str, int] = {}  # sub -> earliest iat still accepted
+        self._lock = threading.Lock()
+        self._next_prune = time.time() + max_token_age
+
+    def revoke(self, sub: str, revoked_at: Optional[float] = None) -> None:
+        now = time.time()
+        not_before = int(now if revoked_at is None else revoked_at)
+        with self._lock:
+            if not_before > self._not_before.get(str(sub), 0):
+                self._not_before[str(sub)] = not_before
+            if now >= self._next_prune:
+                oldest = now - self.max_token_age
+                self._not_before = {key: value for key, value in self._not_before.items() if value > oldest}
+                self._next_prune = now + self.max_token_age
+
+    def is_revoked(self, payload: Dict) -> bool:
+        not_before = self._not_before.get(payload["sub"])
+        if not_before is None:
+            return False
+        iat = payload.get("iat")
+        return iat is None or iat < not_before
+
+    def on_invalidation(self, kind: str, entity_id: str, related_id: Optional[str]) -> None:
+        """Group manager invalidation listener; ``related_id`` of 'roles' and 'tokens' events is the revocation time."""
+        if kind in ('roles', 'tokens'):
+            self.revoke(entity_id, float(related_id) if related_id is not None else None)
+
+    def __len__(self) -> int:
+        return len(self._not_before)
@@ -0,0 +1,141 @@
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+from authlib.jose import ECKey, JsonWebKey, JsonWebToken, OctKey, OKPKey
+from authlib.jose.errors import JoseError
+
+SUPPORTED_ALGORITHMS = ('HS256', 'ES256', 'EdDSA')
+DEFAULT_KEY_ID = 'default'
+
+
+class InvalidTokenError(ValueError):
+    """Raised by ``TokenCodec.decode`` for a malformed, tampered, expired or unknown-key token."""
+
+
+class SigningKey:
+    """
+    One key of the ring. The authlib key object is built here, once, and reused for every
+    sign and verify. Keys loaded from a public key only can verify but not sign, which is
+    how retired keys stay usable until the tokens they signed have expired.
+    """
+
+    def __init__(self, kid: str, alg: str, key) -> None:
+        if alg not in SUPPORTED_ALGORITHMS:
+            raise ValueError(f"Unsupported JWT algorithm {alg!r}, expected one of {', '.join(SUPPORTED_ALGORITHMS)}")
+        self.kid = kid
+        self.alg = alg
+        self.key = key
+
+    @classmethod
+    def from_secret(cls, kid: str, secret: str) -> 'SigningKey':
+        return cls(kid, 'HS256', OctKey.import_key(secret))
+
+    @classmethod
+    def from_pem(cls, kid: str, alg: str, pem: bytes) -> 'SigningKey':
+        if alg == 'ES256':
+            key, curve = ECKey.import_key(pem), 'P-256'
+        elif alg == 'EdDSA':
+            key, curve = OKPKey.import_key(pem), 'Ed25519'
+        else:
+            raise ValueError(f"{alg} keys are not loaded from PEM")
+        key_curve = key.as_dict(is_private=False)['crv']
+        if key_curve != curve:
+            raise ValueError(f"{alg} needs a {curve} key, key {kid!r} is {key_curve}")
+        return cls(kid, alg, key)
+
+    @classmethod
+    def generate(cls, kid: str, alg: str) -> 'SigningKey':
+        """A fresh random key, for development and benchmarks."""
+        if alg == 'HS256':
+            return cls(kid, alg, OctKey.generate_key(256, is_private=True))
+        if alg == 'ES256':
+            return cls(kid, alg, JsonWebKey.generate_key('EC', 'P-256', is_private=True))
+        return cls(kid, alg, JsonWebKey.generate_key('OKP', 'Ed25519', is_private=True))
+
+    @property
+    def can_sign(self) -> bool:
+        return self.alg == 'HS256' or self.key.private_key is not None
+
+    def public_jwk(self) -> Optional[Dict]:
+        # a shared secret is never published
+        if self.alg == 'HS256':
+            return None
+        return dict(self.key.as_dict(is_private=False), kid=self.kid, alg=self.alg, use='sig')
+
+
+class TokenCodec:
+    """
+    Signs access tokens with the active key of a key ring and verifies them with any key in it.
+
+    Every token carries the ``kid`` of the key that signed it. To rotate without downtime,
+    add the new key to the ring and make it active while keeping the old one: tokens signed
+    by either key verify until the old ones expire, then the old key can go. Tokens without
+    a ``kid`` (minted before the key ring existed) are checked against the ``default`` key,
+    or the active key if the ring has none.
+    The token's ``alg`` header must match its key, so an HS256 token can't be forged with a
+    published EC or Ed25519 public key.
+    """
+
+    def __init__(self, keys: List[SigningKey], active_kid: Optional[str] = None, leeway: int = 0) -> None:
+        if not keys:
+            raise ValueError("The key ring is empty")
+        self.keys: Dict[str, SigningKey] = {key.kid: key for key in keys}
+        self.active = self.keys[active_kid] if active_kid is not None else keys[0]
+        if not self.active.can_sign:
+            raise ValueError(f"Active key {self.active.kid!r} has no private part")
+        self.leeway = leeway
+        self._jwt = JsonWebToken(list(SUPPORTED_ALGORITHMS))
+        self._header = {'alg': self.active.alg, 'typ': 'JWT', 'kid': self.active.kid}
+        self._jwks = {'keys': [jwk for jwk in (key.public_jwk() for key in keys) if jwk is not None]}
+
+    def encode(self, claims: Dict) -> str:
+        # claims are built by us, so skip authlib's scan of every value for sensitive-looking data
+        return self._jwt.encode(self._header, claims, self.active.key, check=False).decode()
+
+    def _resolve_key(self, header: Dict, payload) -> object:
+        kid = header.get('kid')
+        key = self.keys.get(DEFAULT_KEY_ID, self.active) if kid is None else self.keys.get(kid)
+        if key is None:
+            raise InvalidTokenError(f"Unknown key id {kid!r}")
+        if header.get('alg') != key.alg:
+            raise InvalidTokenError(f"Key {key.kid!r} is not used with {header.get('alg')!r}")
+        return key.key
+
+    def decode(self, token: str) -> Dict:
+        """Claims of a token with a valid signature and unexpired ``exp``; InvalidTokenError otherwise."""
+        try:
+            claims = self._jwt.decode(token, self._resolve_key)
+            claims.validate(now=int(time.time()), leeway=self.leeway)
+        except (JoseError, ValueError) as e:
+            raise InvalidTokenError(str(e)) from e
+        return dict(claims)
+
+    def jwks(self) -> Dict:
+        """Public keys of the ring as a JWK Set; empty when only HS256 keys are configured."""
+        return self._jwks
+
+
+def load_key_ring(path: str) -> TokenCodec:
+    """
+    Build a codec from a JSON key ring file::
+
+        {"active": "2024-06",
+         "keys": [{"kid": "2024-06", "alg": "EdDSA", "private_key_file": "keys/2024-06.pem"},
+                  {"kid": "2024-01", "alg": "ES256", "public_key_file": "keys/2024-01.pub.pem"},
+                  {"kid": "legacy", "alg": "HS256", "secret": "..."}]}
+
+    Key file paths are relative to the ring file.
+    """
+    with open(path) as f:
+        ring = json.load(f)
+    keys = []
+    for entry in ring['keys']:
+        if entry['alg'] == 'HS256':
+            keys.append(SigningKey.from_secret(entry['kid'], entry['secret']))
+            continue
+        key_file = entry.get('private_key_file') or entry['public_key_file']
+        with open(os.path.join(os.path.dirname(path), key_file), 'rb') as f:
+            keys.append(SigningKey.from_pem(entry['kid'], entry['alg'], f.read()))
+    return TokenCodec(keys, active_kid=ring.get('active'))
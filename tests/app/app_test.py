@@ -0,0 +1,129 @@
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from fastapi_sso.managers.group_manager_sqlite import GroupManagerSQLite
+from fastapi_sso.models.user import UserCreate
+
+PACKAGE_DIR = Path(__file__).resolve().parents[2] / 'fastapi_sso'
+
+
+@pytest.fixture(scope='module')
+def app_module(tmp_path_factory):
+    os.environ.update({
+        'DB_FILE': str(tmp_path_factory.mktemp('app') / 'user.db'),
+        'JWT_SECRET_KEY': 'test-secret-key-test-secret-key-test',
+        # nothing listens there: provider metadata prefetch fails fast and falls back to lazy loading
+        'GOOGLE_SERVER_METADATA_URL': 'http://127.0.0.1:9/.well-known/openid-configuration',
+        'CACHE_SYNC_INTERVAL_SECONDS': '0.05',
+    })
+    # the app reads ../.env relative to the working directory, like under uvicorn
+    cwd = os.getcwd()
+    os.chdir(PACKAGE_DIR)
+    try:
+        from fastapi_sso.app import app as app_module
+    finally:
+        os.chdir(cwd)
+    return app_module
+
+
+@pytest.fixture
+def client(app_module):
+    with TestClient(app_module.app) as client:
+        yield client
+
+
+def service(app_module):
+    return app_module.app.state.group_management_service.service
+
+
+def new_user(app_module, name: str, roles=('USER',)):
+    user = service(app_module).create_user(UserCreate(id=-1, username=name, email=f'{name}@example.com',
+                                                      full_name=name, auth_provider='google'))
+    service(app_module).assign_roles(user.id, list(roles))
+    return user
+
+
+def fresh_token(app_module, user, roles) -> dict:
+    return {'Authorization': f'Bearer {app_module.create_access_token(app_module.access_token_claims(user, roles))}'}
+
+
+def earlier_token(app_module, user, roles) -> dict:
+    """A token, then a wait for the next second: revocations are compared with iat in whole seconds."""
+    headers = fresh_token(app_module, user, roles)
+    time.sleep(1.01 - time.time() % 1)
+    return headers
+
+
+def test_revoking_refresh_tokens_refuses_earlier_access_tokens(app_module, client):
+    user = new_user(app_module, 'revoked')
+    headers = earlier_token(app_module, user, ['USER'])
+    assert client.get('/user-or-admin', headers=headers).status_code == 200
+
+    service(app_module).revoke_all_refresh_tokens_for_user(str(user.id))
+    # refused on the cache hit path as well as after a fresh decode
+    assert client.get('/user-or-admin', headers=headers).status_code == 401
+    app_module.token_cache.clear()
+    assert client.get('/user-or-admin', headers=headers).status_code == 401
+    # logging in again right away works
+    assert client.get('/user-or-admin', headers=fresh_token(app_module, user, ['USER'])).status_code == 200
+
+
+def test_deleted_user_is_refused(app_module, client):
+    user = new_user(app_module, 'deleted')
+    headers = earlier_token(app_module, user, ['USER'])
+    assert client.get('/user-or-admin', headers=headers).status_code == 200
+
+    service(app_module).delete_user(str(user.id))
+    assert client.get('/user-or-admin', headers=headers).status_code == 401
+
+
+def test_role_change_refuses_tokens_with_the_old_roles(app_module, client):
+    user = new_user(app_module, 'promoted')
+    headers = earlier_token(app_module, user, ['USER'])
+    assert client.get('/user-or-admin', headers=headers).status_code == 200
+
+    service(app_module).assign_roles(user.id, ['ADMIN'])
+    assert client.get('/user-or-admin', headers=headers).status_code == 401
+
+
+def test_refresh_token_reuse_refuses_the_leaked_access_tokens(app_module, client):
+    user = new_user(app_module, 'leaked')
+    headers = earlier_token(app_module, user, ['USER'])
+    refresh_token = service(app_module).create_refresh_token(user.id)['refresh_token']
+    assert client.post('/refresh', params={'refresh_token': refresh_token}).status_code == 200
+    assert client.get('/user-or-admin', headers=headers).status_code == 200
+
+    assert client.post('/refresh', params={'refresh_token': refresh_token}).status_code == 400
+    assert client.get('/user-or-admin', headers=headers).status_code == 401
+
+
+def test_revocation_by_another_worker_is_applied(app_module, client):
+    user = new_user(app_module, 'remote')
+    headers = earlier_token(app_module, user, ['USER'])
+    assert client.get('/user-or-admin', headers=headers).status_code == 200
+
+    # a second manager on the same file stands in for another worker process
+    GroupManagerSQLite(app_module.DB_FILE).revoke_all_refresh_tokens_for_user(str(user.id))
+    for _ in range(100):
+        if client.get('/user-or-admin', headers=headers).status_code == 401:
+            break
+        time.sleep(0.02)
+    assert client.get('/user-or-admin', headers=headers).status_code == 401
+
+
+def test_admin_only_checks_the_live_account(app_module, client):
+    user = new_user(app_module, 'admin', roles=['ADMIN'])
+    headers = fresh_token(app_module, user, ['ADMIN'])
+    assert client.get('/admin-only', headers=headers).status_code == 200
+    assert client.get('/admin-only', headers=fresh_token(app_module, user, ['USER'])).status_code == 403
+
+    # removed behind the app's back: no invalidation is logged, only the lookup notices
+    with sqlite3.connect(app_module.DB_FILE) as conn:
+        conn.execute('DELETE FROM users WHERE id = ?', (user.id,))
+    service(app_module).group_manager.users_cache.clear()
+    assert client.get('/admin-only', headers=headers).status_code == 401
@@ -0,0 +1,57 @@
+import itertools
+
+import pytest
+
+from fastapi_sso.managers.connection_pool import close_all_pools
+from fastapi_sso.managers.group_manager_memory import GroupManagerMemory
+from fastapi_sso.managers.group_manager_sqlite import GroupManagerSQLite
+from fastapi_sso.models.user import UserCreate
+from fastapi_sso.services.startup.initialize_database import (ensure_file_exists, init_sqlite_database, insert_roles,
+                                                              insert_role_inheritance)
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    """A fresh SQLite database with the schema, the predefined roles and their hierarchy."""
+    path = str(tmp_path / 'user.db')
+    ensure_file_exists(path)
+    init_sqlite_database(path)
+    insert_roles(path)
+    insert_role_inheritance(path)
+    yield path
+    close_all_pools()
+
+
+@pytest.fixture
+def new_user():
+    def make(n: int) -> UserCreate:
+        return UserCreate(id=-1, username=f'user{n}', email=f'user{n}@example.com', full_name=f'User {n}',
+                          auth_provider='google')
+    return make
+
+
+@pytest.fixture(params=['sqlite', 'memory'])
+def open_manager(request, tmp_path, db_file):
+    """
+    Opens GroupManager instances of each backend in turn.
+
+    ``open_manager()`` returns a manager on the test's store: SQLite managers on ``db_file``
+    share its data like two workers would, while the memory backend keeps one store per
+    process and so always hands back the same instance. ``open_manager(fresh=True)``
+    returns a manager on a new, separate store.
+    """
+    shared = GroupManagerMemory()
+    stores = itertools.count()
+
+    def open_(fresh: bool = False):
+        if request.param == 'memory':
+            return GroupManagerMemory() if fresh else shared
+        path = db_file
+        if fresh:
+            path = str(tmp_path / f'fresh{next(stores)}.db')
+            ensure_file_exists(path)
+            init_sqlite_database(path)
+            insert_roles(path)
+            insert_role_inheritance(path)
+        return GroupManagerSQLite(path)
+    return open_
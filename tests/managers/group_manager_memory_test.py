@@ -0,0 +1,42 @@
+import threading
+import time
+
+from fastapi_sso.managers.group_manager_memory import GroupManagerMemory
+
+
+class YieldingLock:
+    """RLock that lets other threads run right after every release, to widen race windows."""
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+
+    def __enter__(self) -> None:
+        self._lock.acquire()
+
+    def __exit__(self, *exc) -> None:
+        self._lock.release()
+        time.sleep(0.005)
+
+
+def test_concurrent_rotations_of_one_token_let_exactly_one_through(new_user):
+    manager = GroupManagerMemory()
+    manager._lock = YieldingLock()
+    user = manager.create_user(new_user(1))
+    for _ in range(20):
+        token = manager.create_refresh_token(user.id)['refresh_token']
+        start = threading.Barrier(2)
+        results = []
+
+        def rotate() -> None:
+            start.wait()
+            results.append(manager.rotate_refresh_token(token))
+
+        threads = [threading.Thread(target=rotate) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sorted(result['status'] for result in results) == ['ok', 'reused']
+        # the reuse revoked the successor the winner was given
+        successor = next(result['refresh_token'] for result in results if result['status'] == 'ok')
+        assert manager.rotate_refresh_token(successor) == {'status': 'invalid'}
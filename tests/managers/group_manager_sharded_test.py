@@ -0,0 +1,50 @@
+import pytest
+
+from fastapi_sso.managers.connection_pool import close_all_pools
+from fastapi_sso.managers.group_manager_sharded import REFRESH_TOKEN_SEPARATOR, GroupManagerSharded, shard_files
+from fastapi_sso.services.startup.initialize_database import init_sharded_database
+
+SHARD_COUNT = 3
+
+
+@pytest.fixture
+def manager(tmp_path):
+    db_file = str(tmp_path / 'user.db')
+    init_sharded_database(db_file, shard_files(db_file, SHARD_COUNT))
+    yield GroupManagerSharded(db_file, shard_count=SHARD_COUNT)
+    close_all_pools()
+
+
+def test_tokens_carry_their_user_id_and_rotate_on_its_shard(manager, new_user):
+    user = manager.create_user(new_user(1))
+    token = manager.create_refresh_token(user.id)['refresh_token']
+    assert token.startswith(f'{user.id}{REFRESH_TOKEN_SEPARATOR}')
+
+    result = manager.rotate_refresh_token(token)
+    assert result['status'] == 'ok'
+    assert result['refresh_token'].startswith(f'{user.id}{REFRESH_TOKEN_SEPARATOR}')
+    assert manager.rotate_refresh_token(token) == {'status': 'reused'}
+    assert manager.rotate_refresh_token(result['refresh_token']) == {'status': 'invalid'}
+
+
+def test_unprefixed_token_from_before_sharding_is_found_by_probing(manager, new_user):
+    users = [manager.create_user(new_user(n)) for n in range(SHARD_COUNT * 2)]
+    # a shard other than the first, so the probe has to look past a miss
+    user = next(u for u in users if manager._shard(u.id) is not manager.shards[0])
+    # issued by the shard directly, as an unsharded deployment did
+    legacy = manager._shard(user.id).create_refresh_token(user.id)['refresh_token']
+    assert REFRESH_TOKEN_SEPARATOR not in legacy
+
+    result = manager.rotate_refresh_token(legacy)
+    assert result['status'] == 'ok'
+    assert result['user'].id == user.id
+    # its successor is prefixed, so later refreshes are routed without probing
+    assert result['refresh_token'].startswith(f'{user.id}{REFRESH_TOKEN_SEPARATOR}')
+    assert manager.rotate_refresh_token(result['refresh_token'])['status'] == 'ok'
+    assert manager.rotate_refresh_token(legacy) == {'status': 'reused'}
+
+
+def test_tokens_no_shard_knows_are_invalid(manager, new_user):
+    user = manager.create_user(new_user(1))
+    assert manager.rotate_refresh_token('legacy-but-unknown') == {'status': 'invalid'}
+    assert manager.rotate_refresh_token(f'{user.id}{REFRESH_TOKEN_SEPARATOR}forged') == {'status': 'invalid'}
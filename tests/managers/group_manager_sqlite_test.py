@@ -0,0 +1,264 @@
+import sqlite3
+import threading
+import time
+
+from fastapi_sso.managers.group_manager_memory import GroupManagerMemory
+from fastapi_sso.managers.group_manager_sqlite import GroupManagerSQLite, hash_refresh_token
+from fastapi_sso.services.startup.initialize_database import (ensure_file_exists, init_sqlite_database, insert_roles,
+                                                              insert_role_inheritance)
+
+
+def stored_tokens(db_file: str) -> dict:
+    with sqlite3.connect(db_file) as conn:
+        return {row[0]: row[1:] for row in conn.execute('SELECT token_hash, family_id, used FROM refresh_tokens')}
+
+
+def test_rotation_issues_a_successor_in_the_same_family(db_file, new_user):
+    manager = GroupManagerSQLite(db_file)
+    user = manager.create_user(new_user(1))
+    manager.assign_roles(user.id, ['USER'])
+    first = manager.create_refresh_token(user.id)['refresh_token']
+
+    result = manager.rotate_refresh_token(first)
+    assert result['status'] == 'ok'
+    assert result['user'].id == user.id
+    assert result['roles'] == {'USER'}
+    second = result['refresh_token']
+    assert second != first
+    tokens = stored_tokens(db_file)
+    # only digests are stored; the used token is kept to detect reuse
+    assert first not in tokens and second not in tokens
+    assert tokens[hash_refresh_token(first)] == (tokens[hash_refresh_token(second)][0], 1)
+    assert tokens[hash_refresh_token(second)][1] == 0
+
+
+def test_reusing_a_rotated_token_revokes_the_whole_family(open_manager, new_user):
+    manager = open_manager()
+    user = manager.create_user(new_user(1))
+    first = manager.create_refresh_token(user.id)['refresh_token']
+    second = manager.rotate_refresh_token(first)['refresh_token']
+    third = manager.rotate_refresh_token(second)['refresh_token']
+    other_login = manager.create_refresh_token(user.id)['refresh_token']
+
+    assert manager.rotate_refresh_token(first) == {'status': 'reused'}
+    assert manager.rotate_refresh_token(third) == {'status': 'invalid'}
+    assert manager.rotate_refresh_token(second) == {'status': 'invalid'}
+    # other sessions of the same user are a different family
+    assert manager.rotate_refresh_token(other_login)['status'] == 'ok'
+
+
+def test_expired_token_is_rejected_and_removed(db_file, new_user):
+    manager = GroupManagerSQLite(db_file)
+    user = manager.create_user(new_user(1))
+    token = manager.create_refresh_token(user.id)['refresh_token']
+    with sqlite3.connect(db_file) as conn:
+        conn.execute('UPDATE refresh_tokens SET expires = ?', (int(time.time()) - 1,))
+
+    assert manager.rotate_refresh_token(token) == {'status': 'expired'}
+    assert stored_tokens(db_file) == {}
+    assert manager.rotate_refresh_token(token) == {'status': 'invalid'}
+
+
+def test_token_of_a_deleted_user_revokes_its_family(db_file, new_user):
+    manager = GroupManagerSQLite(db_file)
+    user = manager.create_user(new_user(1))
+    token = manager.create_refresh_token(user.id)['refresh_token']
+    with sqlite3.connect(db_file) as conn:
+        # delete_user leaves refresh tokens behind
+        conn.execute('DELETE FROM users WHERE id = ?', (user.id,))
+    manager.users_cache.clear()
+
+    assert manager.rotate_refresh_token(token) == {'status': 'user_not_found'}
+    assert stored_tokens(db_file) == {}
+
+
+def test_unknown_token_is_invalid(open_manager):
+    assert open_manager().rotate_refresh_token('not-a-token') == {'status': 'invalid'}
+
+
+def test_raw_token_from_before_the_hash_migration_still_rotates(tmp_path, new_user):
+    db_file = str(tmp_path / 'old.db')
+    with sqlite3.connect(db_file) as conn:
+        # the layout that stored bearer tokens as they were issued
+        conn.execute('CREATE TABLE refresh_tokens (token TEXT PRIMARY KEY, user_id TEXT NOT NULL, expires TEXT NOT NULL)')
+        conn.execute('INSERT INTO refresh_tokens VALUES (?, ?, ?)', ('old-raw-token', '1', '2999-01-01 00:00:00'))
+        conn.execute('INSERT INTO refresh_tokens VALUES (?, ?, ?)', ('old-expired-token', '1', '2000-01-01 00:00:00'))
+    ensure_file_exists(db_file)
+    init_sqlite_database(db_file)
+    insert_roles(db_file)
+    insert_role_inheritance(db_file)
+    assert set(stored_tokens(db_file)) == {hash_refresh_token('old-raw-token'), hash_refresh_token('old-expired-token')}
+
+    manager = GroupManagerSQLite(db_file)
+    user = manager.create_user(new_user(1))
+    assert user.id == 1
+    result = manager.rotate_refresh_token('old-raw-token')
+    assert result['status'] == 'ok'
+    assert result['user'].id == 1
+    assert manager.rotate_refresh_token('old-expired-token') == {'status': 'expired'}
+    # each migrated token is its own family, so reuse detection covers it too
+    assert manager.rotate_refresh_token('old-raw-token') == {'status': 'reused'}
+    assert manager.rotate_refresh_token(result['refresh_token']) == {'status': 'invalid'}
+
+
+def stored_emails(manager) -> list:
+    if isinstance(manager, GroupManagerMemory):
+        return [user.email for user in manager.users.values()]
+    with sqlite3.connect(manager.db_file) as conn:
+        return [row[0] for row in conn.execute('SELECT email FROM users')]
+
+
+def test_concurrent_first_logins_of_one_user_create_one_row(open_manager, new_user):
+    manager = open_manager()
+    callers = 8
+    barrier = threading.Barrier(callers)
+    results = []
+
+    def login():
+        barrier.wait()
+        results.append(manager.get_or_create_user_with_roles(new_user(1), ['USER']))
+
+    threads = [threading.Thread(target=login) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == callers
+    assert len({result['user'].id for result in results}) == 1
+    assert sum(result['created'] for result in results) == 1
+    assert all(result['roles'] == {'USER'} for result in results)
+    assert stored_emails(manager).count('user1@example.com') == 1
+
+
+def seed_memberships(manager, new_user, users: int = 12, groups: int = 4) -> tuple:
+    """Users and groups where user n belongs to every group whose index divides n + 1."""
+    user_ids = [str(manager.create_user(new_user(n)).id) for n in range(users)]
+    group_ids = [str(manager.create_group(f'group{g}').group_id) for g in range(groups)]
+    for n, user_id in enumerate(user_ids):
+        for g, group_id in enumerate(group_ids):
+            if (n + 1) % (g + 1) == 0:
+                manager.add_user_to_group(user_id, group_id)
+    return user_ids, group_ids
+
+
+def stored_memberships(manager) -> set:
+    """(user_id, group_id) pairs as the backend stores them, bypassing any cache."""
+    if isinstance(manager, GroupManagerMemory):
+        return {(user_id, group_id) for user_id, group_ids in manager.user_groups.items() for group_id in group_ids}
+    with sqlite3.connect(manager.db_file) as conn:
+        return {(str(user_id), str(group_id)) for user_id, group_id in conn.execute('SELECT user_id, group_id FROM user_groups')}
+
+
+def test_bulk_fetches_match_single_row_lookups(open_manager, new_user):
+    user_ids, group_ids = seed_memberships(open_manager(), new_user)
+    wanted_users = [user_ids[5], '999', user_ids[0], user_ids[5], user_ids[11]]
+    wanted_groups = [group_ids[3], '999', group_ids[1]]
+    # a fresh manager starts with empty caches; the second round reads what the first one filled
+    manager = open_manager()
+    for _ in ('cold', 'warm'):
+        assert manager.get_users_by_ids(wanted_users) == [
+            user for user in (open_manager().get_user_by_id(user_id) for user_id in wanted_users) if user]
+        assert manager.get_groups_by_ids(wanted_groups) == [
+            group for group in (open_manager().get_group_by_id(group_id) for group_id in wanted_groups) if group]
+    assert manager.get_users_by_ids([]) == [] and manager.get_groups_by_ids([]) == []
+
+
+def test_join_paging_matches_single_row_lookups(open_manager, new_user):
+    user_ids, group_ids = seed_memberships(open_manager(), new_user)
+    memberships = stored_memberships(open_manager())
+    pages = [(None, 0), (3, 0), (3, 3), (5, 4), (2, 100)]
+    for warm in (False, True):
+        manager = open_manager()
+        if warm:
+            for user_id in user_ids:
+                manager.get_user_groups(user_id)
+            for group_id in group_ids:
+                manager.get_group_users(group_id)
+        for group_id in group_ids:
+            members = sorted((u for u, g in memberships if g == group_id), key=int)
+            for limit, offset in pages:
+                expected = [manager.get_user_by_id(u) for u in members][offset:None if limit is None else offset + limit]
+                assert manager.get_group_users(group_id, limit=limit, offset=offset) == expected
+        for user_id in user_ids:
+            groups = sorted((g for u, g in memberships if u == user_id), key=int)
+            for limit, offset in pages:
+                expected = [manager.get_group_by_id(g) for g in groups][offset:None if limit is None else offset + limit]
+                assert manager.get_user_groups(user_id, limit=limit, offset=offset) == expected
+
+
+def test_batch_membership_changes_match_single_row_changes(open_manager, new_user):
+    # the same seed in two stores: one changed in batches, the other one pair at a time
+    batched, single = open_manager(), open_manager(fresh=True)
+    user_ids, group_ids = seed_memberships(batched, new_user)
+    assert seed_memberships(single, new_user) == (user_ids, group_ids)
+    for manager in (batched, single):  # warm the caches the batch path patches
+        for group_id in group_ids:
+            manager.get_group_users(group_id)
+        for user_id in user_ids:
+            manager.get_user_groups(user_id)
+
+    group_id = group_ids[2]
+    add = [user_ids[0], user_ids[2], user_ids[2], '999']  # a duplicate, a current member and an unknown user
+    assert batched.add_users_to_group(group_id, add) == [user_ids[0]]
+    # SQLite's single-row insert doesn't check that the user exists, so the reference skips unknown ids itself
+    assert [u for u in dict.fromkeys(add) if single.get_user_by_id(u) and single.add_user_to_group(u, group_id)] == [user_ids[0]]
+
+    remove = [user_ids[5], user_ids[1], user_ids[8]]  # user 1 is not a member
+    assert batched.remove_users_from_group(group_id, remove) == [user_ids[5], user_ids[8]]
+    assert [u for u in remove if single.remove_user_from_group(u, group_id)] == [user_ids[5], user_ids[8]]
+
+    group_id = group_ids[1]
+    target = [user_ids[0], user_ids[1], user_ids[3], '999']
+    current = {u for u, g in stored_memberships(single) if g == group_id}
+    result = batched.sync_group_members(group_id, target)
+    expected_added = sorted({user_ids[0], user_ids[1]} - current, key=int)
+    expected_removed = sorted(current - set(target), key=int)
+    assert result == {'added': expected_added, 'removed': expected_removed}
+    for user_id in expected_added:
+        assert single.add_user_to_group(user_id, group_id)
+    for user_id in expected_removed:
+        assert single.remove_user_from_group(user_id, group_id)
+
+    assert batched.add_users_to_group('999', [user_ids[0]]) == []
+    assert stored_memberships(batched) == stored_memberships(single)
+    for group_id in group_ids:
+        assert sorted(u.id for u in batched.get_group_users(group_id)) == sorted(u.id for u in single.get_group_users(group_id))
+    for user_id in user_ids:
+        assert sorted(g.group_id for g in batched.get_user_groups(user_id)) == \
+            sorted(g.group_id for g in single.get_user_groups(user_id))
+
+
+def roles_by_join(manager, user_id: str) -> set:
+    """Role names of ``user_id`` as the backend stores them, bypassing any cache."""
+    if isinstance(manager, GroupManagerMemory):
+        return set(manager.user_roles.get(user_id, ()))
+    with sqlite3.connect(manager.db_file) as conn:
+        return {row[0] for row in conn.execute(
+            'SELECT r.name FROM user_roles ur JOIN roles r ON ur.role_id = r.id WHERE ur.user_id = ?', (user_id,))}
+
+
+def test_cached_role_sets_match_the_role_join(open_manager, new_user):
+    manager = open_manager()
+    user_ids, _ = seed_memberships(manager, new_user, users=4, groups=1)
+    for n, user_id in enumerate(user_ids):
+        manager.assign_roles(user_id, [['USER'], ['ADMIN'], ['USER', 'ADMIN'], []][n])
+
+    def check(manager):
+        for user_id in user_ids + ['999']:
+            expected = roles_by_join(manager, user_id)
+            assert manager.get_user_roles(user_id) == expected
+            assert sorted(manager.get_roles(user_id)) == sorted(expected)
+
+    check(manager)  # warm after assign_roles
+    check(open_manager())  # cold
+
+    # a role created and granted by another worker after this one loaded its role table
+    manager.sync_caches(force=True)
+    other = open_manager()
+    assert other.create_role('AUDITOR')
+    other.assign_roles(user_ids[3], ['AUDITOR', 'NO_SUCH_ROLE'])
+    manager.sync_caches(force=True)
+    assert roles_by_join(other, user_ids[3]) == {'AUDITOR'}
+    check(manager)
+    check(other)
@@ -0,0 +1,47 @@
+import asyncio
+
+from fastapi_sso.services.async_group_management_service import AsyncGroupManagementService
+from fastapi_sso.services.group_management_service import GroupManagementService
+
+
+def test_touch_last_seen_buffers_until_a_flush_is_due(db_file, new_user):
+    service = GroupManagementService(db_file, last_seen_max_pending=3)
+    manager = service.group_manager
+    user_ids = [service.create_user(new_user(n)).id for n in range(3)]
+    async_service = AsyncGroupManagementService(service, max_workers=1)
+    submitted = []
+    submit = async_service.executor.submit
+    async_service.executor.submit = lambda *args: submitted.append(args) or submit(*args)
+
+    async_service.touch_last_seen(user_ids[0])
+    async_service.touch_last_seen(user_ids[1])
+    async_service.touch_last_seen(user_ids[1])
+    assert submitted == []
+    assert len(manager.last_seen_buffer) == 2
+
+    async_service.touch_last_seen(user_ids[2])
+    assert submitted == [(service.flush_last_seen,)]
+    async_service.close()
+    assert len(manager.last_seen_buffer) == 0
+    assert manager.last_seen_buffer.flushed == 3
+
+
+def test_concurrent_logins_of_one_user_share_one_call(db_file, new_user):
+    service = GroupManagementService(db_file)
+    async_service = AsyncGroupManagementService(service, max_workers=4)
+    calls = []
+    get_or_create = service.get_or_create_user_with_roles
+    service.get_or_create_user_with_roles = lambda *args: calls.append(args) or get_or_create(*args)
+
+    async def login_many():
+        return await asyncio.gather(*(async_service.get_or_create_user_with_roles(new_user(1), ['USER'])
+                                      for _ in range(10)))
+
+    results = asyncio.run(login_many())
+    async_service.close()
+
+    assert len(calls) == 1
+    assert async_service.login_flights.shared == 9
+    assert len({result['user'].id for result in results}) == 1
+    assert len(service.get_users_by_ids([str(results[0]['user'].id)])) == 1
+    assert len(async_service.login_flights) == 0
@@ -0,0 +1,96 @@
+import json
+import sqlite3
+
+import pytest
+
+from fastapi_sso.managers.connection_pool import close_all_pools
+from fastapi_sso.managers.group_manager_sharded import shard_files
+from fastapi_sso.services.bulk_import import main, read_rows
+from fastapi_sso.services.group_management_service import GroupManagementService
+from fastapi_sso.services.startup.initialize_database import init_sharded_database
+
+
+def user_row(n: int, **extra) -> dict:
+    return dict({'username': f'user{n}', 'email': f'user{n}@example.com', 'full_name': f'User {n}',
+                 'auth_provider': 'google'}, **extra)
+
+
+def write_jsonl(path, rows) -> str:
+    with open(path, 'w') as f:
+        for row in rows:
+            f.write((row if isinstance(row, str) else json.dumps(row)) + '\n')
+    return str(path)
+
+
+def test_read_rows_csv_splits_lists_and_drops_empty_cells(tmp_path):
+    path = tmp_path / 'users.csv'
+    path.write_text('username,email,full_name,roles,groups,phone_number\n'
+                    'ann,ann@example.com,Ann,USER;ADMIN, staff ; ,\n'
+                    'bob,bob@example.com,Bob,,,\n')
+    rows = list(read_rows(str(path)))
+    assert rows == [
+        {'username': 'ann', 'email': 'ann@example.com', 'full_name': 'Ann', 'roles': ['USER', 'ADMIN'], 'groups': ['staff']},
+        {'username': 'bob', 'email': 'bob@example.com', 'full_name': 'Bob', 'roles': [], 'groups': []},
+    ]
+
+
+def test_read_rows_jsonl_reports_bad_lines_and_skips_blank_ones(tmp_path):
+    path = write_jsonl(tmp_path / 'users.txt', [user_row(1, roles=['ADMIN'], groups='a;b'), '', '{not json', user_row(2)])
+    rows = list(read_rows(path, format='jsonl'))
+    assert len(rows) == 3
+    assert rows[0]['roles'] == ['ADMIN'] and rows[0]['groups'] == ['a', 'b']
+    assert rows[1]['_error'].startswith('invalid JSON')
+    assert rows[2]['roles'] == [] and rows[2]['groups'] == []
+
+
+def test_import_users_reports_bad_rows_and_keeps_going(db_file):
+    service = GroupManagementService(db_file)
+    rows = [
+        dict(user_row(1), roles=[], groups=['staff']),
+        dict(user_row(2, email='not-an-email'), roles=[], groups=[]),
+        dict(user_row(3), roles=['ADMIN'], groups=['staff']),
+        dict(user_row(4, username='user4b', email='user1@example.com'), roles=[], groups=[]),  # same identity as row 1
+        dict(user_row(5), roles=['NO_SUCH_ROLE'], groups=[]),
+        {'_error': 'invalid JSON: boom'},
+        dict(user_row(7), roles=[], groups=[]),
+    ]
+    reports = []
+    report = service.import_users(iter(rows), chunk_size=3, progress=lambda r: reports.append(r.total_rows))
+
+    assert (report.total_rows, report.imported, report.failed) == (7, 3, 4)
+    assert [error.row for error in report.errors] == [2, 4, 5, 6]
+    assert 'unknown roles: NO_SUCH_ROLE' in report.errors[2].error
+    assert report.errors[3].error == 'invalid JSON: boom'
+    # one progress report per chunk
+    assert reports == [3, 6, 7]
+
+    user1 = service.get_user_by_email_and_provider('user1@example.com', 'google')
+    user3 = service.get_user_by_email_and_provider('user3@example.com', 'google')
+    assert service.get_user_roles(user1.id) == {'USER'}  # rows without roles get the default
+    assert service.get_user_roles(user3.id) == {'ADMIN'}
+    staff = service.get_group_by_name('staff')
+    assert sorted(int(user.id) for user in service.get_group_users(staff.group_id)) == sorted([user1.id, user3.id])
+
+
+def test_main_imports_into_the_shards_of_a_sharded_database(tmp_path, capsys):
+    db_file = str(tmp_path / 'user.db')
+    files = shard_files(db_file, 3)
+    init_sharded_database(db_file, files)
+    path = write_jsonl(tmp_path / 'users.jsonl', [user_row(n) for n in range(6)])
+    try:
+        assert main([path, '--db', db_file, '--backend', 'sharded', '--shards', '3']) == 0
+    finally:
+        close_all_pools()
+    assert json.loads(capsys.readouterr().out.splitlines()[-1])['imported'] == 6
+
+    def users_in(path):
+        with sqlite3.connect(path) as conn:
+            return conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+
+    assert users_in(db_file) == 0
+    assert sum(users_in(path) for path in files) == 6
+
+    # the plain SQLite import would write into the catalog, so it refuses
+    with pytest.raises(SystemExit):
+        main([path, '--db', db_file, '--backend', 'sqlite'])
+    assert 'sharded catalog' in capsys.readouterr().err
@@ -0,0 +1,53 @@
+import asyncio
+import threading
+
+from fastapi_sso.services.async_group_management_service import AsyncGroupManagementService
+from fastapi_sso.services.cache_syncer import sync_caches_periodically
+from fastapi_sso.services.group_management_service import GroupManagementService
+from fastapi_sso.services.permission_resolver import PermissionResolver
+from fastapi_sso.services.role_hierarchy import RoleHierarchy
+
+
+async def sync_until(service: GroupManagementService, done) -> None:
+    """Run the syncer task until ``done()`` holds or a second has passed."""
+    async_service = AsyncGroupManagementService(service, max_workers=1)
+    task = asyncio.create_task(sync_caches_periodically(async_service, interval=0.01))
+    for _ in range(100):
+        await asyncio.sleep(0.01)
+        if done():
+            break
+    task.cancel()
+    async_service.executor.shutdown(wait=True)
+
+
+def test_remote_grants_reach_the_resolver_off_the_event_loop(db_file):
+    # two services on one file stand in for two worker processes
+    writer = GroupManagementService(db_file)
+    reader = GroupManagementService(db_file)
+    resolver = PermissionResolver(reader)
+    resolver.load()
+    reader.sync_caches(force=True)
+    listener_threads = []
+    reader.group_manager.invalidation_listeners.append(
+        lambda *event: listener_threads.append(threading.current_thread().name))
+    writer.create_permission('reports:read')
+    writer.grant_permission('USER', 'reports:read')
+    assert not resolver.has_permission(['USER'], 'reports:read')
+
+    asyncio.run(sync_until(reader, lambda: resolver.has_permission(['USER'], 'reports:read')))
+    assert resolver.has_permission(['USER'], 'reports:read')
+    assert listener_threads and all(name.startswith('group-mgt') for name in listener_threads)
+
+
+def test_remote_inheritance_reaches_the_hierarchy(db_file):
+    writer = GroupManagementService(db_file)
+    reader = GroupManagementService(db_file)
+    hierarchy = RoleHierarchy(reader)
+    hierarchy.load()
+    reader.sync_caches(force=True)
+    writer.create_role('AUDITOR')
+    writer.add_role_inheritance('AUDITOR', 'USER')
+    assert hierarchy.expand(['AUDITOR']) == frozenset({'AUDITOR'})
+
+    asyncio.run(sync_until(reader, lambda: 'USER' in hierarchy.expand(['AUDITOR'])))
+    assert hierarchy.expand(['AUDITOR']) == frozenset({'AUDITOR', 'USER'})
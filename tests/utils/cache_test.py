@@ -0,0 +1,112 @@
+import pytest
+
+from fastapi_sso.managers import cache as cache_module
+from fastapi_sso.managers.cache import NEGATIVE, LRUCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache_module.time, 'monotonic', clock)
+    return clock
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = LRUCache('test', ttl=10)
+    cache.set('a', 1)
+    cache.set('b', 2, ttl=30)
+    clock.now += 9.9
+    assert cache.get('a') == 1
+    clock.now += 0.1
+    assert 'a' not in cache
+    assert cache.get('a', 'missing') == 'missing'
+    assert cache.get('b') == 2
+    assert len(cache) == 1
+    assert cache.expirations == 1
+
+
+def test_zero_ttl_never_expires(clock):
+    cache = LRUCache('test', ttl=0)
+    cache.set('a', 1)
+    clock.now += 10 ** 9
+    assert cache.get('a') == 1
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = LRUCache('test', max_entries=3)
+    for key in 'abc':
+        cache.set(key, key.upper())
+    assert cache.get('a') == 'A'  # 'b' is now the oldest
+    assert cache.peek('b') == 'B'  # peek does not refresh it
+    cache.set('d', 'D')
+    assert len(cache) == 3
+    assert 'b' not in cache
+    assert [cache.peek(key) for key in 'acd'] == ['A', 'C', 'D']
+    cache.set('a', 'A2')  # overwriting refreshes recency without evicting
+    cache.set('e', 'E')
+    assert 'c' not in cache and cache.peek('a') == 'A2'
+    assert cache.evictions == 2
+
+
+def test_negative_entries_use_negative_ttl(clock):
+    cache = LRUCache('test', ttl=300, negative_ttl=5)
+    cache.set('missing', NEGATIVE)
+    cache.set('present', 1)
+    assert cache.get('missing') is NEGATIVE
+    assert cache.values() == [1]
+    clock.now += 5
+    assert cache.get('missing') is None
+    assert cache.get('present') == 1
+    assert (cache.hits, cache.negative_hits, cache.misses) == (1, 1, 1)
+
+
+def test_setdefault_keeps_a_live_entry(clock):
+    cache = LRUCache('test', ttl=10)
+    assert cache.setdefault('a', 1) == 1
+    assert cache.setdefault('a', 2) == 1
+    clock.now += 10
+    assert cache.setdefault('a', 3) == 3
+
+
+def test_evict_if_drops_matching_entries(clock):
+    cache = LRUCache('test')
+    for n in range(6):
+        cache.set(('user', n), {'id': n})
+    cache.set(('group', 1), NEGATIVE)
+    dropped = cache.evict_if(lambda key, value: key[0] == 'user' and value['id'] % 2 == 0)
+    assert dropped == 3
+    assert sorted(key[1] for key in cache._data if key[0] == 'user') == [1, 3, 5]
+    assert ('group', 1) in cache
+    assert cache.evict_if(lambda key, value: False) == 0
+
+
+def test_stats(clock):
+    cache = LRUCache('users', max_entries=2, ttl=10)
+    assert cache.stats()['hit_rate'] == 0.0
+    cache.set('a', 1)
+    cache.set('b', NEGATIVE)
+    cache.set('c', 3)  # evicts 'a'
+    cache.get('a')
+    cache.get('b')
+    cache.get('c')
+    clock.now += 10
+    cache.get('c')
+    assert cache.stats() == {
+        'name': 'users',
+        'size': 1,
+        'max_entries': 2,
+        'hits': 1,
+        'negative_hits': 1,
+        'misses': 2,
+        'evictions': 1,
+        'expirations': 1,
+        'hit_rate': 0.5,
+    }
@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+from fastapi_sso.utils.metrics import Histogram, MetricsMiddleware
+
+
+class Route:
+    path = '/auth/{provider}'
+
+
+def serve(middleware: MetricsMiddleware, scope: dict) -> list:
+    sent = []
+
+    async def send(message) -> None:
+        sent.append(message)
+
+    asyncio.run(middleware(dict(scope, type='http'), None, send))
+    return sent
+
+
+def counts(histogram: Histogram) -> dict:
+    return {labels: value for name, labels, value in histogram.samples() if name.endswith('_count')}
+
+
+def test_requests_are_timed_by_route_template_and_status():
+    histogram = Histogram('requests', 'test', ('method', 'route', 'status'))
+
+    async def app(scope, receive, send) -> None:
+        scope['route'] = Route()
+        await send({'type': 'http.response.start', 'status': 302})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    middleware = MetricsMiddleware(app, histogram)
+    for _ in range(3):
+        assert [message['type'] for message in serve(middleware, {'method': 'GET'})] == [
+            'http.response.start', 'http.response.body']
+    assert counts(histogram) == {'{method="GET",route="/auth/{provider}",status="302"}': 3}
+    # one child per label combination, looked up once
+    assert list(middleware._children) == [('/auth/{provider}', 'GET', 302)]
+
+
+def test_failed_and_unmatched_requests_count_as_500():
+    histogram = Histogram('requests', 'test', ('method', 'route', 'status'))
+
+    async def app(scope, receive, send) -> None:
+        raise RuntimeError('boom')
+
+    with pytest.raises(RuntimeError):
+        serve(MetricsMiddleware(app, histogram), {'method': 'POST'})
+    assert counts(histogram) == {'{method="POST",route="<unmatched>",status="500"}': 1}
@@ -0,0 +1,121 @@
+import time
+
+from fastapi_sso.managers.group_manager_memory import GroupManagerMemory
+from fastapi_sso.managers.group_manager_sqlite import GroupManagerSQLite
+from fastapi_sso.utils.token_cache import RevokedSubjects, VerifiedTokenCache
+
+
+def cached_tokens(cache: VerifiedTokenCache, *subjects) -> VerifiedTokenCache:
+    for sub in subjects:
+        cache.put(f'token-{sub}', {'sub': str(sub), 'exp': time.time() + 600})
+    return cache
+
+
+def test_on_invalidation_only_drops_revocations():
+    cache = cached_tokens(VerifiedTokenCache(), 1, 2)
+    cache.on_invalidation('user', '1', None)
+    cache.on_invalidation('membership', '1', '7')
+    assert cache.get('token-1') is not None
+    cache.on_invalidation('tokens', '1', None)
+    assert cache.get('token-1') is None
+    cache.on_invalidation('roles', '2', None)
+    assert cache.get('token-2') is None
+
+
+def test_revoking_refresh_tokens_drops_cached_access_tokens(db_file, new_user):
+    manager = GroupManagerSQLite(db_file)
+    cache = cached_tokens(VerifiedTokenCache(), 1, 2)
+    manager.invalidation_listeners.append(cache.on_invalidation)
+    user = manager.create_user(new_user(1))
+    other = manager.create_user(new_user(2))
+    assert (user.id, other.id) == (1, 2)
+
+    manager.revoke_all_refresh_tokens_for_user(str(user.id))
+    assert cache.get('token-1') is None
+    assert cache.get('token-2') is not None
+
+
+def test_refresh_token_reuse_drops_cached_access_tokens(db_file, new_user):
+    manager = GroupManagerSQLite(db_file)
+    cache = cached_tokens(VerifiedTokenCache(), 1)
+    manager.invalidation_listeners.append(cache.on_invalidation)
+    user = manager.create_user(new_user(1))
+    token = manager.create_refresh_token(user.id)['refresh_token']
+    assert manager.rotate_refresh_token(token)['status'] == 'ok'
+    assert cache.get('token-1') is not None
+
+    assert manager.rotate_refresh_token(token)['status'] == 'reused'
+    assert cache.get('token-1') is None
+
+
+def test_role_change_and_delete_drop_cached_access_tokens(db_file, new_user):
+    manager = GroupManagerSQLite(db_file)
+    cache = cached_tokens(VerifiedTokenCache(), 1)
+    manager.invalidation_listeners.append(cache.on_invalidation)
+    user = manager.create_user(new_user(1))
+
+    manager.assign_roles(user.id, ['ADMIN'])
+    assert cache.get('token-1') is None
+
+    cached_tokens(cache, 1)
+    manager.delete_user(str(user.id))
+    assert cache.get('token-1') is None
+
+
+def test_revocation_in_another_process_reaches_the_cache(db_file, new_user):
+    # two managers on one file stand in for two worker processes
+    writer = GroupManagerSQLite(db_file)
+    reader = GroupManagerSQLite(db_file)
+    cache = cached_tokens(VerifiedTokenCache(), 1)
+    reader.invalidation_listeners.append(cache.on_invalidation)
+    user = writer.create_user(new_user(1))
+    reader.sync_caches(force=True)  # a running worker has been polling all along
+
+    writer.revoke_all_refresh_tokens_for_user(str(user.id))
+    assert cache.get('token-1') is not None
+    reader.sync_caches(force=True)
+    assert cache.get('token-1') is None
+
+
+def test_memory_backend_announces_revocations(new_user):
+    manager = GroupManagerMemory()
+    cache = cached_tokens(VerifiedTokenCache(), 1, 2)
+    manager.invalidation_listeners.append(cache.on_invalidation)
+    user = manager.create_user(new_user(1))
+    other = manager.create_user(new_user(2))
+
+    manager.revoke_all_refresh_tokens_for_user(str(user.id))
+    assert cache.get(f'token-{user.id}') is None
+    manager.assign_roles(other.id, ['USER'])
+    assert cache.get(f'token-{other.id}') is None
+
+
+def test_revoked_subjects_refuse_tokens_issued_before_the_revocation():
+    revoked = RevokedSubjects(max_token_age=600)
+    revoked.on_invalidation('tokens', '1', '1000.75')
+    assert revoked.is_revoked({'sub': '1', 'iat': 999})
+    # same second as the revocation: a login right after it must work
+    assert not revoked.is_revoked({'sub': '1', 'iat': 1000})
+    assert not revoked.is_revoked({'sub': '1', 'iat': 1001})
+    # tokens from before iat was issued can't prove they are newer
+    assert revoked.is_revoked({'sub': '1'})
+    assert not revoked.is_revoked({'sub': '2', 'iat': 999})
+
+
+def test_revoked_subjects_keep_the_latest_revocation_and_ignore_other_events():
+    revoked = RevokedSubjects(max_token_age=600)
+    revoked.on_invalidation('roles', '1', '2000.0')
+    revoked.on_invalidation('tokens', '1', '1000.0')  # an older event arriving late
+    revoked.on_invalidation('user', '2', None)
+    revoked.on_invalidation('membership', '2', '7')
+    assert revoked.is_revoked({'sub': '1', 'iat': 1500})
+    assert len(revoked) == 1
+
+
+def test_revoked_subjects_forget_revocations_older_than_any_token():
+    revoked = RevokedSubjects(max_token_age=60)
+    revoked.revoke('1', time.time() - 120)
+    revoked._next_prune = 0
+    revoked.revoke('2')
+    assert len(revoked) == 1
+    assert not revoked.is_revoked({'sub': '1', 'iat': 0})
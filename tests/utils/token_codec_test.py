@@ -0,0 +1,92 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+import pytest
+from authlib.jose import JsonWebToken, OctKey
+
+from fastapi_sso.utils.token_codec import DEFAULT_KEY_ID, InvalidTokenError, SigningKey, TokenCodec
+
+
+def claims(**extra) -> dict:
+    return dict({'sub': '1', 'exp': int(time.time()) + 600}, **extra)
+
+
+def sign(header: dict, key, payload: dict) -> str:
+    return JsonWebToken(['HS256', 'ES256', 'EdDSA']).encode(header, payload, key, check=False).decode()
+
+
+def b64(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b'=')
+
+
+def forge_hs256(header: dict, payload: dict, secret: bytes) -> str:
+    signing_input = b64(json.dumps(header).encode()) + b'.' + b64(json.dumps(payload).encode())
+    return (signing_input + b'.' + b64(hmac.new(secret, signing_input, hashlib.sha256).digest())).decode()
+
+
+def test_round_trip_for_every_algorithm():
+    for alg in ('HS256', 'ES256', 'EdDSA'):
+        codec = TokenCodec([SigningKey.generate('k1', alg)])
+        assert codec.decode(codec.encode(claims(roles=['USER']))) == claims(roles=['USER'])
+
+
+def test_hs256_token_signed_with_the_published_public_key_is_rejected():
+    codec = TokenCodec([SigningKey.generate('ec', 'ES256')])
+    # the classic confusion attack: use the public key as an HMAC secret
+    for secret in (codec.keys['ec'].key.as_pem(is_private=False), json.dumps(codec.jwks()['keys'][0]).encode()):
+        for header in ({'alg': 'HS256', 'kid': 'ec'}, {'alg': 'HS256'}):
+            with pytest.raises(InvalidTokenError, match='is not used with'):
+                codec.decode(forge_hs256(header, claims(), secret))
+
+
+def test_unknown_kid_is_rejected():
+    codec = TokenCodec([SigningKey.generate('current', 'EdDSA')])
+    stranger = SigningKey.generate('stranger', 'EdDSA')
+    with pytest.raises(InvalidTokenError, match='Unknown key id'):
+        codec.decode(TokenCodec([stranger]).encode(claims()))
+
+
+def test_token_without_kid_is_checked_against_the_default_key():
+    default = SigningKey.from_secret(DEFAULT_KEY_ID, 'the-secret-from-before-the-key-ring')
+    codec = TokenCodec([SigningKey.generate('2024-06', 'ES256'), default], active_kid='2024-06')
+    old_token = sign({'alg': 'HS256', 'typ': 'JWT'}, default.key, claims())
+    assert codec.decode(old_token) == claims()
+
+    other_secret = OctKey.import_key('some-other-secret')
+    with pytest.raises(InvalidTokenError):
+        codec.decode(sign({'alg': 'HS256', 'typ': 'JWT'}, other_secret, claims()))
+
+
+def test_token_without_kid_falls_back_to_the_active_key():
+    codec = TokenCodec([SigningKey.from_secret('only', 'a-single-shared-secret')])
+    assert codec.decode(sign({'alg': 'HS256'}, codec.active.key, claims())) == claims()
+
+
+def test_expired_token_is_rejected():
+    codec = TokenCodec([SigningKey.generate('k1', 'EdDSA')])
+    with pytest.raises(InvalidTokenError):
+        codec.decode(codec.encode(claims(exp=int(time.time()) - 10)))
+
+
+def test_jwks_publishes_public_keys_only():
+    codec = TokenCodec([SigningKey.generate('ec', 'ES256'), SigningKey.generate('ed', 'EdDSA'),
+                        SigningKey.from_secret('hmac', 'never-published')])
+    keys = codec.jwks()['keys']
+    assert {key['kid'] for key in keys} == {'ec', 'ed'}
+    for key in keys:
+        assert 'd' not in key and 'k' not in key
+        assert key['use'] == 'sig'
+    assert {key['alg'] for key in keys} == {'ES256', 'EdDSA'}
+
+
+def test_retired_public_key_still_verifies_but_cannot_sign():
+    old = SigningKey.generate('old', 'ES256')
+    old_token = TokenCodec([old]).encode(claims())
+    retired = SigningKey.from_pem('old', 'ES256', old.key.as_pem(is_private=False))
+    codec = TokenCodec([SigningKey.generate('new', 'EdDSA'), retired], active_kid='new')
+    assert codec.decode(old_token) == claims()
+    with pytest.raises(ValueError):
+        TokenCodec([retired])